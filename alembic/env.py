@@ -0,0 +1,58 @@
+# Third-party
+from alembic import context
+from sqlalchemy.engine import Connection
+
+# Standard
+from logging.config import fileConfig
+import asyncio
+
+# Project
+from database import db
+from database.models import base
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+
+def run_migrations_offline():
+    """
+    Emit the migration SQL to the output without connecting to the database.
+    """
+    context.configure(
+        url=db.engine.url.render_as_string(hide_password=False),
+        target_metadata=base.metadata,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection):
+    """
+    Run the migrations on a synchronous connection.
+
+    Args:
+    connection (Connection): The connection of the application engine.
+    """
+    # Batch mode lets SQLite apply ALTER operations by recreating the table
+    context.configure(connection=connection, target_metadata=base.metadata, render_as_batch=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    """
+    Run the migrations through the application engine.
+    """
+    async with db.engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await db.engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,109 @@
+"""
+Initial schema with indexes for settings lookups and the admin panel.
+
+Databases created by the former `create_all` at startup are adopted: missing tables are created,
+existing ones are kept and only receive the indexes. User IDs are 64 bit, Telegram IDs exceed 32 bits,
+so the 32 bit user ID columns of adopted PostgreSQL tables are widened.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-05-20 12:00:00
+"""
+# Third-party
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (table, index name, columns, unique)
+INDEXES = [
+    ('Users', 'ix_Users_name', ['name'], False),
+    ('Users', 'ix_Users_joined_date', ['joined_date'], False),
+    ('Settings', 'ix_Settings_user_id', ['user_id'], True),
+    ('Settings', 'ix_Settings_model', ['model'], False),
+    ('Settings', 'ix_Settings_size', ['size'], False),
+    ('Settings', 'ix_Settings_quantity', ['quantity'], False),
+    ('Generations', 'ix_generations_user_id_created_at', ['user_id', 'created_at'], False),
+    ('Generations', 'ix_Generations_status', ['status'], False),
+    ('Generations', 'ix_Generations_latency', ['latency'], False),
+    ('Generations', 'ix_Generations_created_at', ['created_at'], False),
+]
+
+# (table, column) of the Telegram user IDs
+USER_ID_COLUMNS = [
+    ('Users', 'user_id'),
+    ('Settings', 'user_id'),
+    ('Generations', 'user_id'),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'Users' not in tables:
+        op.create_table(
+            'Users',
+            sa.Column('user_id', sa.BigInteger(), autoincrement=False, nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('joined_date', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('user_id'),
+        )
+
+    if 'Settings' not in tables:
+        op.create_table(
+            'Settings',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('model', sa.String(), nullable=True),
+            sa.Column('size', sa.String(), nullable=True),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('user_id', sa.BigInteger(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['Users.user_id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    else:
+        # Keep the oldest settings row of each user so the unique index can be built
+        op.execute(
+            'DELETE FROM "Settings" WHERE id NOT IN (SELECT MIN(id) FROM "Settings" GROUP BY user_id)'
+        )
+
+    if 'Generations' not in tables:
+        op.create_table(
+            'Generations',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=True),
+            sa.Column('prompt', sa.Text(), nullable=True),
+            sa.Column('model', sa.String(), nullable=True),
+            sa.Column('size', sa.String(), nullable=True),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('file_ids', sa.JSON(), nullable=True),
+            sa.Column('status', sa.String(), nullable=True),
+            sa.Column('wait_message_id', sa.Integer(), nullable=True),
+            sa.Column('latency', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['Users.user_id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    # SQLite integers are 64 bit already
+    if op.get_bind().dialect.name == 'postgresql':
+        for table, column in USER_ID_COLUMNS:
+            if table in tables:
+                op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer())
+
+    existing = {
+        table: {index['name'] for index in inspector.get_indexes(table)} if table in tables else set()
+        for table in ('Users', 'Settings', 'Generations')
+    }
+    for table, name, columns, unique in INDEXES:
+        if name not in existing[table]:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    # Tables are kept, they may predate the migrations
+    for table, name, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
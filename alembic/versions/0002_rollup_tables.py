@@ -0,0 +1,57 @@
+"""
+Rollup tables of the analytics dashboard.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-05-27 12:00:00
+"""
+# Third-party
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'DailyUsers',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('active_users', sa.Integer(), nullable=False),
+        sa.Column('new_users', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day'),
+    )
+    op.create_table(
+        'ActiveUsers',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'user_id'),
+    )
+    op.create_table(
+        'GenerationStats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('size', sa.String(), nullable=False),
+        sa.Column('generations', sa.Integer(), nullable=False),
+        sa.Column('failures', sa.Integer(), nullable=False),
+        sa.Column('images', sa.Integer(), nullable=False),
+        sa.Column('latency_sum', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'model', 'size'),
+    )
+    op.create_table(
+        'LatencyBuckets',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'model', 'bucket'),
+    )
+
+
+def downgrade():
+    op.drop_table('LatencyBuckets')
+    op.drop_table('GenerationStats')
+    op.drop_table('ActiveUsers')
+    op.drop_table('DailyUsers')
@@ -0,0 +1,39 @@
+"""
+Broadcasts with their resumable progress.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-06-03 12:00:00
+"""
+# Third-party
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'Broadcasts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('last_user_id', sa.BigInteger(), nullable=False),
+        sa.Column('sent', sa.Integer(), nullable=False),
+        sa.Column('blocked', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('elapsed', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_Broadcasts_status', 'Broadcasts', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_Broadcasts_status', table_name='Broadcasts')
+    op.drop_table('Broadcasts')
@@ -0,0 +1,7 @@
+# Standard
+import os
+
+# Modules read the configuration on import, the benchmarks need neither Telegram nor OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ.setdefault('BOT_TOKEN', '1:benchmark')
+os.environ.setdefault('LOG_CONSOLE', '0')
@@ -0,0 +1,107 @@
+"""
+Compare the database backends under mixed bot and panel traffic.
+
+Writer tasks insert generations like the bot does, reader tasks run the count and list queries of the admin panel.
+SQLite runs in its default DELETE/FULL journaling and in the WAL/NORMAL tuning of config.database,
+every mode on a fresh copy of the bundled database. With --postgresql the same load runs against the database
+of the DATABASE_* variables, e.g. the docker-compose service migrated with `alembic upgrade head`.
+The benchmark users and their rows are deleted afterwards.
+
+Usage:
+    python -m benchmarks.backends [--duration 5] [--writers 4] [--readers 4] [--postgresql]
+"""
+# Third-party
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+# Standard
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from time import perf_counter
+import argparse
+import asyncio
+
+# Project
+from database import GenerationModel, UserModel
+from .common import copy_database, create_engine, create_postgresql_engine, add_users, remove_users
+
+# (journal_mode, synchronous) pairs, the SQLite defaults and the tuning of config.database
+SQLITE_MODES = [('DELETE', 'FULL'), ('WAL', 'NORMAL')]
+
+
+async def write(session_maker: async_sessionmaker, user_ids: list[int], deadline: float) -> int:
+    """
+    Insert generations until the deadline.
+
+    Returns:
+    int: Number of committed inserts.
+    """
+    writes = 0
+    while perf_counter() < deadline:
+        async with session_maker() as session:
+            session.add(GenerationModel.create(
+                user_id=user_ids[writes % len(user_ids)], prompt='benchmark', model='dall-e-2',
+                size='256x256', quantity=1
+            ))
+            await session.commit()
+        writes += 1
+    return writes
+
+
+async def read(session_maker: async_sessionmaker, deadline: float) -> int:
+    """
+    Run the admin panel queries until the deadline.
+
+    Returns:
+    int: Number of executed queries.
+    """
+    reads = 0
+    while perf_counter() < deadline:
+        async with session_maker() as session:
+            await session.scalar(select(func.count()).select_from(GenerationModel))
+            await session.execute(select(UserModel).order_by(UserModel.user_id).limit(50))
+        reads += 2
+    return reads
+
+
+async def run_load(engine: AsyncEngine, args: argparse.Namespace) -> tuple[float, float]:
+    """
+    Run the workload on an engine and dispose it.
+
+    Returns:
+    tuple[float, float]: Writes and reads per second.
+    """
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    try:
+        user_ids = await add_users(session_maker, count=100)
+        try:
+            deadline = perf_counter() + args.duration
+            results = await asyncio.gather(
+                *(write(session_maker, user_ids, deadline) for _ in range(args.writers)),
+                *(read(session_maker, deadline) for _ in range(args.readers)),
+            )
+        finally:
+            await remove_users(session_maker, user_ids)
+    finally:
+        await engine.dispose()
+    return sum(results[:args.writers]) / args.duration, sum(results[args.writers:]) / args.duration
+
+
+async def main(args: argparse.Namespace):
+    for journal_mode, synchronous in SQLITE_MODES:
+        with TemporaryDirectory() as directory:
+            engine = create_engine(copy_database(Path(directory)), journal_mode, synchronous)
+            writes, reads = await run_load(engine, args)
+        print(f'SQLite {journal_mode}/{synchronous}: {writes:.0f} writes/s, {reads:.0f} reads/s')
+    if args.postgresql:
+        writes, reads = await run_load(create_postgresql_engine(), args)
+        print(f'PostgreSQL: {writes:.0f} writes/s, {reads:.0f} reads/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds of every run')
+    parser.add_argument('--writers', type=int, default=4, help='Concurrent bot writers')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent panel readers')
+    parser.add_argument('--postgresql', action='store_true', help='Also run against the configured PostgreSQL')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,85 @@
+"""
+Check that rendering keyboards does not register handlers or slow down the callback dispatch.
+
+Times `Dispatcher.feed_update` for settings button callbacks, renders the settings and generate keyboards
+100k times and times the callbacks again. The run fails if the renders changed the number of callback handlers.
+
+Usage:
+    python -m benchmarks.callbacks [--renders 100000] [--callbacks 2000]
+"""
+# Standard
+from itertools import cycle, islice
+from time import perf_counter
+import argparse
+import asyncio
+
+# Project
+from database import SettingsModel
+from handlers.private.dalle import get_generate_options_inline_keyboard
+from handlers.private.settings import (
+    SettingsCallback, SettingsAction, MODEL_SIZES, QUANTITY_LABELS, get_settings_inline_keyboard
+)
+from .common import create_dispatcher, make_callback_update
+
+SELECTIONS = [
+    (model, size, quantity) for model, sizes in MODEL_SIZES.items() for size in sizes for quantity in QUANTITY_LABELS
+]
+
+
+def count_handlers(dispatcher) -> int:
+    """
+    Count the callback query handlers of the dispatcher and its routers.
+    """
+    return sum(len(router.callback_query.handlers) for router in dispatcher.chain_tail)
+
+
+async def time_callbacks(bot, dispatcher, count: int) -> float:
+    """
+    Feed settings select callbacks to the dispatcher.
+
+    Returns:
+    float: Microseconds per callback.
+    """
+    updates = [
+        make_callback_update(bot, update_id=i, user_id=i, data=SettingsCallback(
+            action=SettingsAction.SELECT, model=model, size=size, quantity=quantity
+        ).pack())
+        for i, (model, size, quantity) in enumerate(islice(cycle(SELECTIONS), count))
+    ]
+    started_at = perf_counter()
+    for update in updates:
+        await dispatcher.feed_update(bot, update)
+    return (perf_counter() - started_at) / count * 1e6
+
+
+async def render(count: int):
+    """
+    Render the settings and generate keyboards like /settings and /generate do.
+    """
+    for model, size, quantity in islice(cycle(SELECTIONS), count):
+        await get_settings_inline_keyboard(SettingsModel.create(user_id=1, model=model, size=size, quantity=quantity))
+        await get_generate_options_inline_keyboard()
+
+
+async def main(args: argparse.Namespace):
+    bot, dispatcher = create_dispatcher()
+    # Warm up the handlers and the keyboards
+    await time_callbacks(bot, dispatcher, len(SELECTIONS))
+
+    handlers_before = count_handlers(dispatcher)
+    before = await time_callbacks(bot, dispatcher, args.callbacks)
+    await render(args.renders)
+    after = await time_callbacks(bot, dispatcher, args.callbacks)
+    handlers_after = count_handlers(dispatcher)
+
+    print(f'callback handlers: {handlers_before} before, {handlers_after} after {args.renders} renders')
+    print(f'feed_update: {before:.0f} us before, {after:.0f} us after per callback')
+    if handlers_after != handlers_before:
+        raise SystemExit('Rendering keyboards registered callback handlers')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--renders', type=int, default=100_000, help='Keyboard renders between the measurements')
+    parser.add_argument('--callbacks', type=int, default=2000, help='Callbacks fed per measurement')
+    asyncio.run(main(parser.parse_args()))
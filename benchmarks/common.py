@@ -0,0 +1,186 @@
+# Third-party
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+from sqlalchemy import delete, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Standard
+from pathlib import Path
+import shutil
+
+# Project
+import config as cf
+from database import UserModel, SettingsModel, GenerationModel
+from database.database import Type
+
+
+class FakeSession(BaseSession):
+    """
+    Bot session answering every Bot API method with True instead of calling Telegram.
+
+    Attributes:
+    requests (int): Number of answered methods.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    async def make_request(self, bot: Bot, method, timeout: int | None = None):
+        self.requests += 1
+        return True
+
+    async def stream_content(self, url: str, headers: dict | None = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def create_dispatcher() -> tuple[Bot, Dispatcher]:
+    """
+    Create a bot without network access and a dispatcher running the private handlers.
+
+    The database is marked ready and the rate limits are lifted, so every update reaches its handler.
+    Handlers touching the database are not benchmarked.
+
+    Returns:
+    tuple[Bot, Dispatcher]: The bot and the dispatcher.
+    """
+    # Imported here, the handlers register their callbacks on import
+    from database import db
+    from handlers import all_routers
+
+    db.ready.set()
+    for command_class in ('cheap', 'generation', 'global_generation'):
+        cf.rate_limit[command_class] = {'rate': float('inf'), 'capacity': float('inf')}
+
+    bot = Bot('1:benchmark', session=FakeSession(), parse_mode='html')
+    dispatcher = Dispatcher(storage=MemoryStorage())
+    dispatcher.include_routers(*all_routers)
+    return bot, dispatcher
+
+
+def make_callback_update(bot: Bot, update_id: int, user_id: int, data: str, reply_markup=None) -> Update:
+    """
+    Build a callback query update of a button under a bot message.
+
+    Args:
+    bot (Bot): The bot receiving the update.
+    update_id (int): The update ID.
+    user_id (int): The user and chat ID.
+    data (str): The callback data of the button.
+    reply_markup: The keyboard of the message.
+
+    Returns:
+    Update: The update.
+    """
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Benchmark'}
+    message = {
+        'message_id': 1, 'date': 1, 'chat': {'id': user_id, 'type': 'private'}, 'from': {**user, 'is_bot': True},
+        'text': 'Benchmark', 'reply_markup': reply_markup.model_dump() if reply_markup else None,
+    }
+    return Update.model_validate({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': '1', 'message': message, 'data': data,
+        },
+    }, context={'bot': bot})
+
+
+def copy_database(directory: Path) -> Path:
+    """
+    Copy the bundled database, migrated to the head revision, so a benchmark never writes to the real file.
+
+    Args:
+    directory (Path): The directory of the copy.
+
+    Returns:
+    Path: The path of the copy.
+    """
+    path = directory / 'sqlite_db.db'
+    shutil.copyfile(cf.SQLITE_PATH, path)
+    return path
+
+
+def create_engine(path: Path, journal_mode: str, synchronous: str) -> AsyncEngine:
+    """
+    Create an engine configured like Database with the given journaling pragmas.
+
+    Args:
+    path (Path): The SQLite file.
+    journal_mode (str): The journal_mode pragma, e.g. 'WAL' or 'DELETE'.
+    synchronous (str): The synchronous pragma, e.g. 'NORMAL' or 'FULL'.
+
+    Returns:
+    AsyncEngine: The engine.
+    """
+    engine = create_async_engine(
+        f'sqlite+aiosqlite:///{path}',
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=cf.database['pool_size'],
+        max_overflow=cf.database['max_overflow'],
+        pool_timeout=cf.database['pool_timeout'],
+    )
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={cf.database["sqlite_busy_timeout"]}')
+        cursor.close()
+
+    return engine
+
+
+def create_postgresql_engine() -> AsyncEngine:
+    """
+    Create an engine for the PostgreSQL configured by the DATABASE_* variables, pooled like Database.
+
+    Returns:
+    AsyncEngine: The engine.
+    """
+    return create_async_engine(
+        Type.POSTGRESQL.value,
+        pool_size=cf.database['pool_size'],
+        max_overflow=cf.database['max_overflow'],
+        pool_timeout=cf.database['pool_timeout'],
+    )
+
+
+async def add_users(session_maker: async_sessionmaker, count: int, first_id: int = 10 ** 12) -> list[int]:
+    """
+    Insert users with default settings.
+
+    Args:
+    session_maker (async_sessionmaker): The session maker of the benchmark engine.
+    count (int): Number of users.
+    first_id (int): ID of the first user, above the Telegram IDs of real users.
+
+    Returns:
+    list[int]: The user IDs.
+    """
+    user_ids = list(range(first_id, first_id + count))
+    async with session_maker() as session:
+        session.add_all(UserModel.create(user_id=user_id, name=f'bench {user_id}') for user_id in user_ids)
+        await session.commit()
+    return user_ids
+
+
+async def remove_users(session_maker: async_sessionmaker, user_ids: list[int]):
+    """
+    Delete benchmark users with their settings and generations.
+
+    Args:
+    session_maker (async_sessionmaker): The session maker of the benchmark engine.
+    user_ids (list[int]): The user IDs.
+    """
+    async with session_maker() as session:
+        for model in (GenerationModel, SettingsModel, UserModel):
+            await session.execute(delete(model).where(model.user_id.in_(user_ids)))
+        await session.commit()
@@ -0,0 +1,53 @@
+"""
+Compare the settings callbacks with the precomputed keyboards and with keyboards built on every click.
+
+Without the registry `_build_settings_keyboard` is replaced by the undecorated builder, as the keyboards
+were built before they were memoized.
+
+Usage:
+    python -m benchmarks.keyboards [--builds 20000] [--callbacks 5000]
+"""
+# Standard
+from itertools import cycle, islice
+from time import perf_counter
+import argparse
+import asyncio
+
+# Project
+from handlers.private import settings
+from .callbacks import SELECTIONS, time_callbacks
+from .common import create_dispatcher
+
+
+def time_builds(count: int) -> float:
+    """
+    Build settings keyboards of all selections.
+
+    Returns:
+    float: Microseconds per keyboard.
+    """
+    started_at = perf_counter()
+    for model, size, quantity in islice(cycle(SELECTIONS), count):
+        settings._build_settings_keyboard(model, size, quantity)
+    return (perf_counter() - started_at) / count * 1e6
+
+
+async def main(args: argparse.Namespace):
+    bot, dispatcher = create_dispatcher()
+    registry = settings._build_settings_keyboard
+    results = {}
+    for name, build in (('registry', registry), ('no registry', registry.__wrapped__)):
+        settings._build_settings_keyboard = build
+        await time_callbacks(bot, dispatcher, len(SELECTIONS))
+        results[name] = time_builds(args.builds), await time_callbacks(bot, dispatcher, args.callbacks)
+    settings._build_settings_keyboard = registry
+
+    for name, (build, callback) in results.items():
+        print(f'{name}: {build:.1f} us per keyboard, {callback:.0f} us per select callback')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--builds', type=int, default=20_000, help='Keyboards built per measurement')
+    parser.add_argument('--callbacks', type=int, default=5000, help='Callbacks fed per measurement')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""
+Compare settings updates committed one by one with the write-behind SettingsWriteBuffer.
+
+Simulated users change their settings concurrently. Direct writes commit every update in its own transaction,
+like Settings.update did before the buffer, the buffer coalesces the updates of a user within its window
+and flushes all rows in one transaction.
+
+Usage:
+    python -m benchmarks.settings_buffer [--users 200] [--updates 20] [--interval 0.01] [--window 2.0]
+"""
+# Third-party
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# Standard
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from time import perf_counter
+import argparse
+import asyncio
+
+# Project
+import config as cf
+from database import SettingsModel
+from database.cache import UserCache
+from database.database import SettingsWriteBuffer
+from .common import copy_database, create_engine, add_users
+
+SIZES = ['256x256', '512x512', '1024x1024']
+
+
+class DirectWriter:
+    """
+    Commits every settings update in its own transaction.
+
+    Attributes:
+    commits (int): Number of committed transactions.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self.session_maker = session_maker
+        self.commits = 0
+
+    async def add(self, user_id: int, values: dict):
+        async with self.session_maker() as session:
+            await session.execute(update(SettingsModel).filter_by(user_id=user_id).values(**values))
+            await session.commit()
+        self.commits += 1
+
+    async def close(self):
+        pass
+
+
+async def click(writer: DirectWriter | SettingsWriteBuffer, user_id: int, args: argparse.Namespace):
+    """
+    Change the settings of a user like repeated presses of the settings keyboard.
+    """
+    for i in range(args.updates):
+        await writer.add(user_id, {'model': 'dall-e-2', 'size': SIZES[i % len(SIZES)], 'quantity': i % 4 + 1})
+        await asyncio.sleep(args.interval)
+
+
+async def run(directory: Path, buffered: bool, args: argparse.Namespace) -> tuple[int, float]:
+    """
+    Apply all updates and write whatever is still buffered.
+
+    Returns:
+    tuple[int, float]: The number of commits and seconds until everything is written.
+    """
+    engine = create_engine(
+        copy_database(directory), cf.database['sqlite_journal_mode'], cf.database['sqlite_synchronous']
+    )
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    try:
+        user_ids = await add_users(session_maker, count=args.users)
+        if buffered:
+            writer = SettingsWriteBuffer(session_maker, cache=UserCache(ttl=60.0, max_size=10), window=args.window)
+        else:
+            writer = DirectWriter(session_maker)
+        started_at = perf_counter()
+        await asyncio.gather(*(click(writer, user_id, args) for user_id in user_ids))
+        await writer.close()
+        elapsed = perf_counter() - started_at
+    finally:
+        await engine.dispose()
+    return writer.flushes if buffered else writer.commits, elapsed
+
+
+async def main(args: argparse.Namespace):
+    total = args.users * args.updates
+    for name, buffered in (('direct', False), (f'buffer {args.window} s', True)):
+        with TemporaryDirectory() as directory:
+            commits, elapsed = await run(Path(directory), buffered, args)
+        print(f'{name}: {total} updates in {elapsed:.1f} s, {commits} commits, {commits / elapsed:.1f} commits/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=200, help='Users changing settings at once')
+    parser.add_argument('--updates', type=int, default=20, help='Updates per user')
+    parser.add_argument('--interval', type=float, default=0.01, help='Seconds between the updates of a user')
+    parser.add_argument('--window', type=float, default=cf.database['write_window'], help='Buffer window in seconds')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""
+Time a cold import of the handlers and check that it does not touch the database.
+
+Every run imports `handlers` in a fresh interpreter. The run fails if the import constructed the engine
+of `db` or opened a connection to the database file or over the network.
+
+Usage:
+    python -m benchmarks.startup [--runs 5]
+"""
+# Standard
+from statistics import median
+import argparse
+import os
+import subprocess
+import sys
+
+# Project
+import config as cf
+
+CHECK = '''
+import sys
+
+connections = []
+
+
+def audit(event, args):
+    if event == 'socket.connect' or event == 'sqlite3.connect' and str(args[0]) == {path!r}:
+        connections.append((event, args))
+
+
+sys.addaudithook(audit)
+
+from time import perf_counter
+
+started_at = perf_counter()
+import handlers
+elapsed = perf_counter() - started_at
+
+from database import db
+
+assert db._Database__engine is None, 'Importing handlers constructed the database engine'
+assert not connections, f'Importing handlers opened connections: {{connections}}'
+print(elapsed)
+'''
+
+
+def run_import() -> float:
+    """
+    Import the handlers in a fresh interpreter.
+
+    Returns:
+    float: Seconds the import took.
+
+    Raises:
+    RuntimeError: If the import failed or touched the database.
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', CHECK.format(path=str(cf.SQLITE_PATH))],
+        cwd=cf.project['base'], env=os.environ, capture_output=True, text=True
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(args: argparse.Namespace):
+    times = [run_import() for _ in range(args.runs)]
+    print(f'import handlers: {median(times):.2f} s median, {min(times):.2f} s min of {args.runs} runs, '
+          f'no engine and no database connection')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5, help='Cold imports to time')
+    main(parser.parse_args())
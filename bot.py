@@ -3,9 +3,10 @@ from aiogram import Bot, Dispatcher
 
 # Project
 import config as cf
+from fsm_storage import create_storage
 
 # Initialize the bot with the token and set the parse mode to HTML
 bot = Bot(cf.bot['token'], parse_mode='html')
 
-# Create a dispatcher for the bot
-dispatcher = Dispatcher(bot=bot)
\ No newline at end of file
+# Create a dispatcher for the bot with the configured FSM storage
+dispatcher = Dispatcher(bot=bot, storage=create_storage())
\ No newline at end of file
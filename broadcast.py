@@ -0,0 +1,225 @@
+# Third-party
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
+
+# Standard
+from datetime import datetime
+from html.parser import HTMLParser
+import re
+from time import monotonic, perf_counter
+import asyncio
+
+# Project
+import config as cf
+from bot import bot
+from database import db, BroadcastStatus
+from jobs import JobQueue
+from logger import bot_logger
+from metrics import broadcast_messages, broadcast_flood_waits
+from throttling import rate_limit_backend
+
+
+# Longest text of a Telegram message
+MAX_TEXT_LENGTH = 4096
+# An ampersand that does not start one of the entities supported by Telegram
+BARE_AMPERSAND = re.compile(r'&(?!(?:lt|gt|amp|quot|#\d+|#x[0-9a-fA-F]+);)')
+
+
+class TelegramHTMLValidator(HTMLParser):
+    """
+    Checks that a text uses only the HTML subset accepted by Telegram, see https://core.telegram.org/bots/api#html-style.
+
+    Attributes:
+    errors (list[str]): The problems found.
+    """
+
+    TAGS = {
+        'b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del', 'span', 'tg-spoiler', 'a', 'tg-emoji',
+        'code', 'pre', 'blockquote',
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.errors: list[str] = []
+        self.__open: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        if tag not in self.TAGS:
+            self.errors.append(f'Unsupported tag <{tag}>')
+        elif tag == 'a' and not dict(attrs).get('href'):
+            self.errors.append('Tag <a> needs an href')
+        self.__open.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        self.errors.append(f'Unsupported tag <{tag}/>')
+
+    def handle_endtag(self, tag: str):
+        if not self.__open or self.__open[-1] != tag:
+            self.errors.append(f'Unexpected </{tag}>')
+            return
+        self.__open.pop()
+
+    def handle_data(self, data: str):
+        if '<' in data or '>' in data:
+            self.errors.append('Symbols < and > must be written as &lt; and &gt;')
+
+    def close(self):
+        super().close()
+        self.errors.extend(f'Tag <{tag}> is not closed' for tag in self.__open)
+
+
+def validate_broadcast_text(text: str):
+    """
+    Check a broadcast text before it is queued, so an invalid text does not fail for every user.
+
+    Args:
+    text (str): The HTML text of the message.
+
+    Raises:
+    ValueError: If the text is empty, too long or not valid Telegram HTML.
+    """
+    if not text or len(text) > MAX_TEXT_LENGTH:
+        raise ValueError(f'Text must have 1 to {MAX_TEXT_LENGTH} characters')
+    validator = TelegramHTMLValidator()
+    validator.feed(text)
+    validator.close()
+    if BARE_AMPERSAND.search(text):
+        validator.errors.append('Symbol & must be written as &amp;')
+    if validator.errors:
+        raise ValueError('; '.join(dict.fromkeys(validator.errors)))
+
+
+class BroadcastLimiter:
+    """
+    Paces broadcast messages below the Telegram limit of a bot.
+
+    Every message takes a token from the 'broadcast' bucket of the rate limit backend, so with the Redis backend
+    all bot processes share the rate. A flood wait requested by Telegram applies to the whole bot,
+    so it pauses every sender until it is over.
+
+    Attributes:
+    rate (float): Messages per second.
+    capacity (float): Messages sent at once after an idle period.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize the limiter.
+
+        Args:
+        rate (float): Messages per second.
+        capacity (float): Messages sent at once after an idle period.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.__resume_at = 0.0
+
+    async def acquire(self):
+        """
+        Wait until a message may be sent.
+        """
+        while True:
+            delay = self.__resume_at - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif await rate_limit_backend.consume('broadcast', rate=self.rate, capacity=self.capacity):
+                return
+            else:
+                await asyncio.sleep(1 / self.rate)
+
+    def pause(self, seconds: float):
+        """
+        Stop all senders for a flood wait.
+
+        Args:
+        seconds (float): The wait requested by Telegram.
+        """
+        self.__resume_at = max(self.__resume_at, monotonic() + seconds)
+
+
+async def send_broadcast_message(limiter: BroadcastLimiter, chat_id: int, text: str) -> str:
+    """
+    Send a broadcast message to a user, waiting out flood waits.
+
+    The per-chat limit of Telegram is not tracked, a broadcast sends a single message to every chat
+    and a resend waits for the flood wait first.
+
+    Args:
+    limiter (BroadcastLimiter): The limiter pacing the messages.
+    chat_id (int): The user chat ID.
+    text (str): The HTML text of the message.
+
+    Returns:
+    str: The outcome, 'sent', 'blocked' or 'failed'.
+    """
+    outcome = 'failed'
+    for _ in range(cf.broadcast['max_retries'] + 1):
+        await limiter.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            outcome = 'sent'
+        except TelegramRetryAfter as e:
+            broadcast_flood_waits.inc()
+            bot_logger.warning(f'Broadcast is paused for {e.retry_after} s by a flood wait')
+            limiter.pause(e.retry_after)
+            continue
+        except TelegramForbiddenError:
+            # The user blocked the bot or deleted the account
+            outcome = 'blocked'
+        except Exception as e:
+            bot_logger.error(f'Broadcast message to user {chat_id} failed: {e}')
+        break
+    broadcast_messages.inc(outcome=outcome)
+    return outcome
+
+
+async def run_broadcast(broadcast_id: int):
+    """
+    Send a broadcast to all users, resuming after the last completed batch.
+
+    Recipients are read in batches in user ID order and the progress is stored after every batch,
+    so a broadcast interrupted by a shutdown continues on the next start and at most one batch is sent twice.
+    A broadcast cancelled in the panel stops after its current batch.
+
+    Args:
+    broadcast_id (int): The ID of the broadcast record.
+    """
+    broadcast = await db.broadcasts.get_by_id(broadcast_id)
+    if not broadcast or broadcast.status not in (BroadcastStatus.QUEUED.value, BroadcastStatus.RUNNING.value):
+        return
+    broadcast.status = BroadcastStatus.RUNNING.value
+    if not await db.broadcasts.update(broadcast):
+        return
+    bot_logger.info(f'Broadcast {broadcast.id} started', last_user_id=broadcast.last_user_id)
+
+    semaphore = asyncio.Semaphore(cf.broadcast['concurrency'])
+
+    async def send(chat_id: int) -> str:
+        async with semaphore:
+            return await send_broadcast_message(broadcast_limiter, chat_id, broadcast.text)
+
+    while user_ids := await db.users.get_ids_after(broadcast.last_user_id, limit=cf.broadcast['batch_size']):
+        started_at = perf_counter()
+        outcomes = await asyncio.gather(*(send(user_id) for user_id in user_ids))
+        broadcast.sent += outcomes.count('sent')
+        broadcast.blocked += outcomes.count('blocked')
+        broadcast.failed += outcomes.count('failed')
+        broadcast.last_user_id = user_ids[-1]
+        broadcast.elapsed += perf_counter() - started_at
+        if not await db.broadcasts.update(broadcast):
+            bot_logger.info(f'Broadcast {broadcast.id} is cancelled', processed=broadcast.processed)
+            return
+
+    broadcast.status = BroadcastStatus.DONE.value
+    broadcast.finished_at = datetime.now()
+    await db.broadcasts.update(broadcast)
+    bot_logger.info(
+        f'Broadcast {broadcast.id} finished', sent=broadcast.sent, blocked=broadcast.blocked,
+        failed=broadcast.failed, throughput=round(broadcast.throughput or 0.0, 1)
+    )
+
+
+# Limiter shared by all broadcasts, without bursts Telegram sees an even rate in every second
+broadcast_limiter = BroadcastLimiter(rate=cf.broadcast['rate'], capacity=1)
+
+# A single worker, broadcasts are sent one after another at the full rate
+broadcast_jobs = JobQueue(name='broadcast', handler=run_broadcast, workers=1)
@@ -16,28 +16,131 @@ project = {
     'storage': BASE / 'storage'
 }
 
+# Define generated images cache configuration
+image_cache = {
+    'max_bytes': int(os.getenv('IMAGE_CACHE_MAX_BYTES', 1024 ** 3)),  # Disk budget of 'storage', LRU evicted
+    'download_timeout': float(os.getenv('IMAGE_CACHE_DOWNLOAD_TIMEOUT', 60.0)),  # Seconds per image download
+    'download_connections': int(os.getenv('IMAGE_CACHE_DOWNLOAD_CONNECTIONS', 10)),  # Pooled connections to OpenAI
+    'chunk_size': int(os.getenv('IMAGE_CACHE_CHUNK_SIZE', 64 * 1024)),  # Bytes per streamed download/upload chunk
+}
+
 # Define bot configuration
 bot = {
     'token': os.getenv('BOT_TOKEN'),
+    'mode': os.getenv('BOT_MODE', 'polling'),  # 'polling' or 'webhook'
+    'webhook_url': os.getenv('WEBHOOK_URL'),  # Public base URL of the panel, e.g. https://example.com
+    'webhook_path': os.getenv('WEBHOOK_PATH', '/telegram/webhook'),  # Path of the update endpoint on the panel
+    'webhook_secret': os.getenv('WEBHOOK_SECRET'),  # Checked against X-Telegram-Bot-Api-Secret-Token
+    'webhook_concurrency': int(os.getenv('WEBHOOK_CONCURRENCY', 64)),  # Updates processed at once
+    'drop_pending_updates': os.getenv('BOT_DROP_PENDING_UPDATES', '0') == '1',  # Skip updates queued while stopped
+}
+
+# Define rate limiting configuration, rates are tokens per second and capacities are burst sizes
+rate_limit = {
+    'backend': os.getenv('RATE_LIMIT_BACKEND', 'memory'),  # 'memory' or 'redis'
+    'redis_url': os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/1'),
+    'cheap': {'rate': 1.0, 'capacity': 10},  # Commands and settings buttons per user
+    'generation': {'rate': 1 / 30, 'capacity': 3},  # Prompts and generation requests per user
+    'global_generation': {'rate': 2.0, 'capacity': 20},  # Prompts and generation requests of all users
+}
+
+# Define FSM storage configuration
+fsm = {
+    'storage': os.getenv('FSM_STORAGE', 'sqlite'),  # 'memory', 'sqlite' or 'redis'
+    'redis_url': os.getenv('FSM_REDIS_URL', 'redis://localhost:6379/0'),
+    'sqlite_path': BASE / 'database' / 'fsm_storage.db',
+    'state_ttl': int(os.getenv('FSM_STATE_TTL', 24 * 60 * 60)),  # Seconds an untouched state is kept
 }
 
 # Define API configuration
 api = {
     'token': os.getenv('OPENAI_API_KEY'),
-    'base_url': 'https://api.proxyapi.ru/openai/v1'
+    'base_url': 'https://api.proxyapi.ru/openai/v1',
+    'timeouts': {  # Seconds to wait for a single request per model
+        'dall-e-2': float(os.getenv('OPENAI_TIMEOUT_DALLE_2', 60.0)),
+        'dall-e-3': float(os.getenv('OPENAI_TIMEOUT_DALLE_3', 120.0)),
+    },
+    'default_timeout': float(os.getenv('OPENAI_TIMEOUT', 90.0)),  # Seconds for models missing in 'timeouts'
+    'max_retries': int(os.getenv('OPENAI_MAX_RETRIES', 3)),  # Retries on 429, 5xx, timeouts and connection errors
+    'backoff_base': float(os.getenv('OPENAI_BACKOFF_BASE', 1.0)),  # Seconds of the first retry delay
+    'backoff_max': float(os.getenv('OPENAI_BACKOFF_MAX', 30.0)),  # Upper bound of a retry delay
+    'breaker_threshold': int(os.getenv('OPENAI_BREAKER_THRESHOLD', 5)),  # Failed calls in a row to open the breaker
+    'breaker_reset': float(os.getenv('OPENAI_BREAKER_RESET', 60.0)),  # Seconds before a probe call is allowed
+}
+
+# Define generation scheduler configuration
+generation = {
+    'max_concurrency': int(os.getenv('GENERATION_MAX_CONCURRENCY', 4)),  # Simultaneous DALL-E requests overall
+    'max_per_user': int(os.getenv('GENERATION_MAX_PER_USER', 1)),  # Simultaneous DALL-E requests per user
+    'workers': int(os.getenv('GENERATION_WORKERS', 8)),  # Background workers running generation jobs
+    'shutdown_timeout': float(os.getenv('GENERATION_SHUTDOWN_TIMEOUT', 30.0)),  # Seconds to finish jobs on stop
+}
+
+# Define broadcast configuration
+broadcast = {
+    'rate': float(os.getenv('BROADCAST_RATE', 25.0)),  # Messages per second, Telegram allows about 30 for a bot
+    'concurrency': int(os.getenv('BROADCAST_CONCURRENCY', 10)),  # Messages in flight at once
+    'batch_size': int(os.getenv('BROADCAST_BATCH_SIZE', 100)),  # Recipients read and checkpointed at once
+    'max_retries': int(os.getenv('BROADCAST_MAX_RETRIES', 3)),  # Resends of a message after a flood wait
+    'shutdown_timeout': float(os.getenv('BROADCAST_SHUTDOWN_TIMEOUT', 5.0)),  # Seconds to finish on stop
 }
 
 # Define database configuration
 database = {
+    'backend': os.getenv('DATABASE_BACKEND', 'sqlite'),  # 'sqlite' or 'postgresql'
     'host': os.getenv('DATABASE_HOST'),
     'port': os.getenv('DATABASE_PORT'),
     'user': os.getenv('DATABASE_USER'),
     'password': os.getenv('DATABASE_PASSWORD'),
+    'pool_size': int(os.getenv('DATABASE_POOL_SIZE', 5)),  # Connections kept open in the pool
+    'max_overflow': int(os.getenv('DATABASE_MAX_OVERFLOW', 10)),  # Extra connections allowed on bursts
+    'pool_timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', 30.0)),  # Seconds to wait for a free connection
+    'pool_recycle': int(os.getenv('DATABASE_POOL_RECYCLE', 1800)),  # Seconds before a connection is recycled
+    'cache_ttl': float(os.getenv('DATABASE_CACHE_TTL', 300.0)),  # Seconds a cached user snapshot stays valid
+    'cache_size': int(os.getenv('DATABASE_CACHE_SIZE', 10000)),  # Maximum number of cached users
+    'write_window': float(os.getenv('DATABASE_WRITE_WINDOW', 2.0)),  # Seconds settings updates are coalesced
+    'connect_backoff_base': float(os.getenv('DATABASE_CONNECT_BACKOFF_BASE', 1.0)),  # First retry delay, seconds
+    'connect_backoff_max': float(os.getenv('DATABASE_CONNECT_BACKOFF_MAX', 60.0)),  # Retry delay cap, seconds
+    # SQLite connection pragmas, WAL lets the panel read while the bot writes
+    'sqlite_journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'sqlite_synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # Safe with WAL, fsync only on checkpoints
+    'sqlite_busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # Milliseconds to wait for a lock
+    # VACUUM locks out writers for the whole rewrite, run it only once this share of the pages is free
+    'sqlite_vacuum_free_ratio': float(os.getenv('SQLITE_VACUUM_FREE_RATIO', 0.25)),
+}
+
+# Define maintenance configuration, intervals in seconds, 0 disables a job
+maintenance = {
+    'image_cache_prune': int(os.getenv('MAINTENANCE_IMAGE_CACHE_PRUNE', 60 * 60)),  # Enforce the image cache budget
+    'fsm_prune': int(os.getenv('MAINTENANCE_FSM_PRUNE', 60 * 60)),  # Delete expired FSM states
+    'compact': int(os.getenv('MAINTENANCE_COMPACT', 24 * 60 * 60)),  # Checkpoint the SQLite WAL, VACUUM if needed
+    'log_rotate': int(os.getenv('MAINTENANCE_LOG_ROTATE', 24 * 60 * 60)),  # Force rotation of the log files
+    'rollup_refresh': int(os.getenv('MAINTENANCE_ROLLUP_REFRESH', 15 * 60)),  # Rebuild the recent rollups
+    'rollup_days': int(os.getenv('MAINTENANCE_ROLLUP_DAYS', 2)),  # Days rebuilt by the rollup refresh
+}
+
+# Define logging configuration
+logging = {
+    'level': os.getenv('LOG_LEVEL', 'INFO'),  # Default level of all loggers
+    'levels': {  # Per-logger overrides, e.g. LOG_LEVEL_GPT=DEBUG
+        name: os.getenv(f'LOG_LEVEL_{name.upper()}')
+        for name in ('bot', 'database', 'server', 'gpt', 'storage')
+        if os.getenv(f'LOG_LEVEL_{name.upper()}')
+    },
+    'rotation': os.getenv('LOG_ROTATION', 'size'),  # 'size' or 'time'
+    'max_bytes': int(os.getenv('LOG_MAX_BYTES', 10 * 1024 ** 2)),  # Size of a log file before rotation
+    'when': os.getenv('LOG_ROTATION_WHEN', 'midnight'),  # Rotation interval for 'time' rotation
+    'backup_count': int(os.getenv('LOG_BACKUP_COUNT', 5)),  # Rotated files kept per logger
+    'debug_sample_rate': float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.1)),  # Share of debug records kept
+    'console': os.getenv('LOG_CONSOLE', '1') == '1',  # Mirror records to stdout
 }
 
 # Define server configuration
 server = {
     'host': os.getenv('PANEL_HOST'),
     'port': os.getenv('PANEL_PORT'),
-    'secret_key': os.getenv('SECRET_KEY')
+    'secret_key': os.getenv('SECRET_KEY'),
+    'username': os.getenv('PANEL_USERNAME'),  # Credentials of the admin pages, e.g. /broadcasts
+    'password': os.getenv('PANEL_PASSWORD'),
+    'dashboard_days': int(os.getenv('PANEL_DASHBOARD_DAYS', 30)),  # Days shown on the analytics dashboard
 }
\ No newline at end of file
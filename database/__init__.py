@@ -1,6 +1,8 @@
 # Importing necessary modules and classes from the package
-from .database import db
-from .models import UserModel, SettingsModel
+from .database import db, SchemaVersionError
+from .models import UserModel, SettingsModel, GenerationModel, GenerationStatus, LATENCY_BUCKETS
+from .models import BroadcastModel, BroadcastStatus
 
 # List of classes and modules that will be accessible when importing the package
-__all__ = ['UserModel', 'SettingsModel', 'db']
+__all__ = ['UserModel', 'SettingsModel', 'GenerationModel', 'GenerationStatus', 'LATENCY_BUCKETS',
+           'BroadcastModel', 'BroadcastStatus', 'db', 'SchemaVersionError']
@@ -0,0 +1,162 @@
+# Standard
+from collections import OrderedDict
+from time import monotonic
+
+# Project
+from .models import UserModel, SettingsModel
+
+
+class UserCache:
+    """
+    In-process TTL + LRU cache of user and settings snapshots.
+
+    Snapshots are stored as plain column values and materialized into fresh detached models
+    on every hit, so handlers may mutate the returned objects without touching the cache.
+    Every invalidation bumps the version of the user, a row read before it is not stored afterwards.
+
+    Attributes:
+    ttl (float): Seconds a snapshot stays valid.
+    max_size (int): Maximum number of cached users, the least recently used one is evicted first.
+    hits (int): Number of lookups served from the cache.
+    misses (int): Number of lookups that had to go to the database.
+    evictions (int): Number of snapshots dropped because of size or age.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        """
+        Initialize the cache.
+
+        Args:
+        ttl (float): Seconds a snapshot stays valid.
+        max_size (int): Maximum number of cached users.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries: OrderedDict[int, tuple[float, dict, dict | None]] = OrderedDict()
+        self.__versions: dict[int, int] = {}
+        self.__epoch = 0
+
+    @staticmethod
+    def __dump(model) -> dict:
+        """
+        Copy the column values of a model.
+
+        Args:
+        model: The model to copy.
+
+        Returns:
+        dict: Mapping of column names to values.
+        """
+        return {column.key: getattr(model, column.key) for column in model.__table__.columns}
+
+    def get(self, user_id: int) -> UserModel | None:
+        """
+        Get a user snapshot by user ID.
+
+        Args:
+        user_id (int): The user ID to look up.
+
+        Returns:
+        UserModel | None: A detached copy of the cached user or None on a miss.
+        """
+        entry = self.__entries.get(user_id)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self.__entries[user_id]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+        self.__entries.move_to_end(user_id)
+        self.hits += 1
+        _, user_data, settings_data = entry
+        user = UserModel(**user_data)
+        if settings_data is not None:
+            user.settings = SettingsModel(**settings_data)
+        return user
+
+    def version(self, user_id: int) -> int:
+        """
+        Get the invalidation counter of a user, read it before querying the user and pass it to `put`.
+
+        Args:
+        user_id (int): The user ID.
+
+        Returns:
+        int: A number growing with every invalidation of the user and every clear.
+        """
+        return self.__epoch + self.__versions.get(user_id, 0)
+
+    def put(self, user: UserModel, version: int | None = None) -> bool:
+        """
+        Store a snapshot of a user with loaded settings.
+
+        Args:
+        user (UserModel): The user to cache.
+        version (int | None): The `version` of the user read before the user was queried.
+            The snapshot is not stored if the user was invalidated since, it may be stale.
+
+        Returns:
+        bool: Whether the snapshot was stored.
+        """
+        if version is not None and version != self.version(user.user_id):
+            return False
+        settings_data = self.__dump(user.settings) if user.settings is not None else None
+        self.__entries[user.user_id] = (monotonic() + self.ttl, self.__dump(user), settings_data)
+        self.__entries.move_to_end(user.user_id)
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, user_id: int):
+        """
+        Drop the snapshot of a user.
+
+        Args:
+        user_id (int): The user ID to drop.
+        """
+        self.__entries.pop(user_id, None)
+        self.__versions[user_id] = self.__versions.get(user_id, 0) + 1
+
+    def prune(self) -> int:
+        """
+        Drop all expired snapshots.
+
+        Returns:
+        int: The number of dropped snapshots.
+        """
+        now = monotonic()
+        expired = [user_id for user_id, (expires_at, _, _) in self.__entries.items() if expires_at < now]
+        for user_id in expired:
+            del self.__entries[user_id]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def clear(self):
+        """
+        Drop all snapshots.
+        """
+        self.__entries.clear()
+        # Versions read before the clear must not match again
+        self.__epoch += 1 + max(self.__versions.values(), default=0)
+        self.__versions.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+        dict: Size, hits, misses, evictions and hit ratio of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.__entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
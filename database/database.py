@@ -1,61 +1,258 @@
 # Third-party
 import sqlalchemy.exc
 from sqlalchemy import *
-from sqlalchemy.orm import sessionmaker, joinedload
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import joinedload
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 # Standard
-from time import sleep
+from collections import defaultdict
+from datetime import datetime, date
+import asyncio
+import bisect
+import functools
 import traceback
 from enum import Enum
 
 # Project
 import config as cf
 from logger import database_logger
-from .models import base, UserModel, SettingsModel
+from metrics import db_query_latency, Counter, Gauge
+from .models import UserModel, SettingsModel, GenerationModel, GenerationStatus, BroadcastModel, BroadcastStatus
+from .models import (
+    DailyUsersModel, ActiveUserModel, GenerationStatsModel, LatencyBucketModel, LATENCY_BUCKETS
+)
+from .cache import UserCache
 
 
 # Enum for different types of database connections
 class Type(Enum):
-    POSTGRESQL = f'postgresql+psycopg2://{cf.database["user"]}:{cf.database["password"]}@{cf.database["host"]}:{cf.database["port"]}'
-    SQLITE = f'sqlite:///{cf.SQLITE_PATH}'
+    POSTGRESQL = f'postgresql+asyncpg://{cf.database["user"]}:{cf.database["password"]}@{cf.database["host"]}:{cf.database["port"]}'
+    SQLITE = f'sqlite+aiosqlite:///{cf.SQLITE_PATH}'
+
+
+def observe_query(method):
+    """
+    Decorator measuring the latency of a database method.
+
+    Args:
+    method: The coroutine method to measure.
+
+    Returns:
+    The wrapped method.
+    """
+    label = method.__qualname__.removeprefix('Database.')
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with db_query_latency.time(method=label):
+            return await method(*args, **kwargs)
+
+    return wrapper
+
+
+class SchemaVersionError(RuntimeError):
+    """
+    Raised when the database schema is not at the latest migration.
+    """
+
+
+class SettingsWriteBuffer:
+    """
+    Write-behind buffer coalescing settings updates per user.
+
+    Updates wait for `window` seconds, repeated updates of a user within the window collapse into one row,
+    and all buffered rows are written by a single executemany UPDATE in one transaction.
+    Rows being written stay visible to `pending` until the commit, then the cached users are invalidated,
+    so a read racing the flush never caches the old row.
+
+    Attributes:
+    window (float): Seconds updates are buffered, 0 writes every update immediately.
+    flushes (int): Number of committed flushes.
+    rows (int): Number of rows written by the flushes.
+    """
+
+    def __init__(self, session_maker, cache: UserCache, window: float):
+        """
+        Initialize the buffer.
+
+        Args:
+        session_maker: The session maker object.
+        cache (UserCache): The cache of user and settings snapshots.
+        window (float): Seconds updates are buffered.
+        """
+        self.session_maker = session_maker
+        self.cache = cache
+        self.window = window
+        self.flushes = 0
+        self.rows = 0
+        self.__pending: dict[int, dict] = {}
+        self.__flushing: dict[int, dict] = {}
+        self.__closing = False
+        self.__flush_task: asyncio.Task | None = None
+        self.__lock = asyncio.Lock()
+        self.__statement = update(SettingsModel.__table__).where(
+            SettingsModel.__table__.c.user_id == bindparam('b_user_id')
+        ).values(model=bindparam('b_model'), size=bindparam('b_size'), quantity=bindparam('b_quantity'))
+
+    def pending(self, user_id: int) -> dict | None:
+        """
+        Get the buffered values of a user.
+
+        Args:
+        user_id (int): The user ID.
+
+        Returns:
+        dict | None: The column values not yet written or None.
+        """
+        if user_id not in self.__pending and user_id not in self.__flushing:
+            return None
+        return {**self.__flushing.get(user_id, {}), **self.__pending.get(user_id, {})}
+
+    def discard(self, user_id: int):
+        """
+        Drop the buffered values of a user, e.g. when the settings are deleted.
+
+        Args:
+        user_id (int): The user ID.
+        """
+        self.__pending.pop(user_id, None)
+
+    async def add(self, user_id: int, values: dict):
+        """
+        Buffer the settings values of a user.
+
+        Args:
+        user_id (int): The user ID.
+        values (dict): The model, size and quantity columns.
+        """
+        self.__pending[user_id] = {**self.__pending.get(user_id, {}), **values}
+        if self.window <= 0:
+            await self.flush()
+        else:
+            self.__schedule()
+
+    def __schedule(self):
+        """
+        Schedule a flush after the window unless one is already waiting.
+        """
+        task = self.__flush_task
+        if self.__closing or (task is not None and not task.done() and task is not asyncio.current_task()):
+            return
+        self.__flush_task = asyncio.create_task(self.__flush_later())
+
+    async def __flush_later(self):
+        """
+        Flush once the window has passed.
+        """
+        await asyncio.sleep(self.window)
+        try:
+            await self.flush()
+        except Exception:
+            database_logger.error('Settings flush failed:\n' + traceback.format_exc())
+
+    @observe_query
+    async def flush(self) -> int:
+        """
+        Write all buffered updates in one transaction.
+
+        Failed rows are put back into the buffer unless newer values arrived meanwhile,
+        and another flush is scheduled.
+
+        Returns:
+        int: The number of written rows.
+        """
+        async with self.__lock:
+            batch, self.__pending = self.__pending, {}
+            if not batch:
+                return 0
+            self.__flushing = batch
+            try:
+                async with self.session_maker() as session:
+                    await session.execute(self.__statement, [
+                        {'b_user_id': user_id, 'b_model': values['model'],
+                         'b_size': values['size'], 'b_quantity': values['quantity']}
+                        for user_id, values in batch.items()
+                    ])
+                    await session.commit()
+            except BaseException:
+                for user_id, values in batch.items():
+                    self.__pending[user_id] = {**values, **self.__pending.get(user_id, {})}
+                if self.window > 0:
+                    self.__schedule()
+                raise
+            finally:
+                self.__flushing = {}
+                # Reads during the flush may have cached a row without the in-flight values
+                for user_id in batch:
+                    self.cache.invalidate(user_id)
+
+            self.flushes += 1
+            self.rows += len(batch)
+            database_logger.info(f'Flushed {len(batch)} buffered settings updates')
+            return len(batch)
+
+    async def close(self):
+        """
+        Cancel the scheduled flush and write everything still buffered.
+        """
+        self.__closing = True
+        if self.__flush_task is not None and not self.__flush_task.done():
+            self.__flush_task.cancel()
+        await self.flush()
 
 
 class Database:
     """
     A class to interact with the database.
 
+    The engine is constructed on first use, so importing the package neither loads the driver nor connects.
+
     Attributes:
     type_ (Type): The type of database connection.
+    ready (asyncio.Event): Set once `connect` verified the database.
     """
 
-    # Private method to connect to the database
-    def __connect_to_database(self, type_: Type):
+    # Private method to create the engine
+    def __create_engine(self, type_: Type):
         """
-        Connect to the database using the specified type.
+        Create the async engine for the specified type and bind the session makers to it.
+
+        No connection is opened here, the pool connects on first use.
 
         Args:
         type_ (Type): The type of database connection.
         """
-        while True:
-            database_logger.warning('Connecting to database...')
-            try:
-                # Creating a database engine
-                self.engine = create_engine(type_.value)
-                self.session_maker = sessionmaker(bind=self.engine)
-                # Creating tables defined in 'base' metadata
-                base.metadata.create_all(self.engine)
+        self.__engine = create_async_engine(
+            type_.value,
+            poolclass=AsyncAdaptedQueuePool,  # aiosqlite defaults to NullPool, which ignores the sizing below
+            pool_size=cf.database['pool_size'],
+            max_overflow=cf.database['max_overflow'],
+            pool_timeout=cf.database['pool_timeout'],
+            pool_recycle=cf.database['pool_recycle'],
+            pool_pre_ping=True,
+        )
+        if type_ is Type.SQLITE:
+            event.listen(self.__engine.sync_engine, 'connect', self.__set_sqlite_pragmas)
+        for session_maker in self.__session_makers:
+            session_maker.configure(bind=self.__engine)
 
-                # __connect_inner_classes__ !DO NOT DELETE!
-
-                self.users = self.User(session_maker=self.session_maker)
-                self.settings = self.Settings(session_maker=self.session_maker)
+    @staticmethod
+    def __set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        Tune every new SQLite connection, see the 'sqlite_*' options of config.database.
 
-                database_logger.info('Connected to database')
-                break
-            except sqlalchemy.exc.OperationalError:
-                # Handling database connection errors
-                database_logger.error('Database error:\n' + traceback.format_exc())
-                sleep(5.0)
+        Args:
+        dbapi_connection: The DBAPI connection.
+        connection_record: The pool record of the connection.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={cf.database["sqlite_journal_mode"]}')
+        cursor.execute(f'PRAGMA synchronous={cf.database["sqlite_synchronous"]}')
+        cursor.execute(f'PRAGMA busy_timeout={cf.database["sqlite_busy_timeout"]}')
+        cursor.close()
 
     # Constructor to initialize the Database class
     def __init__(self, type_: Type):
@@ -65,7 +262,144 @@ class Database:
         Args:
         type_ (Type): The type of database connection.
         """
-        self.__connect_to_database(type_=type_)
+        self.type_ = type_
+        self.ready = asyncio.Event()
+        self.__engine = None
+        self.__session_makers: list[async_sessionmaker] = []
+
+        # Objects stay usable after commit, handlers read them outside the session
+        self.session_maker = self.create_session_maker(expire_on_commit=False)
+        self.cache = UserCache(ttl=cf.database['cache_ttl'], max_size=cf.database['cache_size'])
+        self.settings_buffer = SettingsWriteBuffer(
+            session_maker=self.session_maker, cache=self.cache, window=cf.database['write_window']
+        )
+
+        # __connect_inner_classes__ !DO NOT DELETE!
+
+        self.users = self.User(session_maker=self.session_maker, cache=self.cache, buffer=self.settings_buffer)
+        self.settings = self.Settings(session_maker=self.session_maker, cache=self.cache, buffer=self.settings_buffer)
+        self.generations = self.Generation(session_maker=self.session_maker)
+        self.broadcasts = self.Broadcast(session_maker=self.session_maker)
+        self.stats = self.Stats(
+            session_maker=self.session_maker,
+            insert_factory=postgresql.insert if type_ is Type.POSTGRESQL else sqlite.insert
+        )
+
+    @property
+    def engine(self):
+        """
+        The async engine, constructed on first access.
+        """
+        if self.__engine is None:
+            self.__create_engine(type_=self.type_)
+        return self.__engine
+
+    def create_session_maker(self, **kwargs) -> async_sessionmaker:
+        """
+        Create a session maker bound to the engine as soon as it is constructed.
+
+        Args:
+        kwargs: Arguments of the session maker.
+
+        Returns:
+        async_sessionmaker: The session maker.
+        """
+        session_maker = async_sessionmaker(bind=self.__engine, **kwargs)
+        self.__session_makers.append(session_maker)
+        return session_maker
+
+    @staticmethod
+    def __check_schema_version(connection):
+        """
+        Compare the revision stamped in the database with the head of the migrations.
+
+        Args:
+        connection: The synchronous connection.
+
+        Raises:
+        SchemaVersionError: If the database is not migrated to the head revision.
+        """
+        # Imported here to keep alembic out of the package import
+        from alembic.config import Config as AlembicConfig
+        from alembic.runtime.migration import MigrationContext
+        from alembic.script import ScriptDirectory
+
+        current = MigrationContext.configure(connection).get_current_revision()
+        head = ScriptDirectory.from_config(AlembicConfig(cf.project['base'] / 'alembic.ini')).get_current_head()
+        if current != head:
+            raise SchemaVersionError(
+                f'Database schema is at revision {current}, expected {head}. Run `alembic upgrade head`'
+            )
+
+    async def connect(self):
+        """
+        Connect to the database and verify the schema version, retrying with exponential backoff
+        until the database is reachable. Sets `ready` on success.
+
+        Raises:
+        SchemaVersionError: If the database is not migrated to the head revision.
+        """
+        delay = cf.database['connect_backoff_base']
+        while True:
+            database_logger.warning('Connecting to database...')
+            try:
+                # Tables are managed by the migrations in 'alembic', see alembic.ini
+                async with self.engine.connect() as connection:
+                    await connection.run_sync(self.__check_schema_version)
+
+                database_logger.info('Connected to database')
+                self.ready.set()
+                break
+            except (sqlalchemy.exc.OperationalError, OSError):
+                # Handling database connection errors
+                database_logger.error(f'Database error, retrying in {delay:.0f} s:\n' + traceback.format_exc())
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, cf.database['connect_backoff_max'])
+
+    @observe_query
+    async def compact(self) -> bool:
+        """
+        Truncate the SQLite WAL and VACUUM only once free pages make up 'sqlite_vacuum_free_ratio' of the file.
+
+        VACUUM holds an exclusive lock for the whole rewrite and writes waiting longer than the busy timeout fail,
+        so it runs only when it reclaims a lot of space. PostgreSQL is left to autovacuum.
+
+        Returns:
+        bool: Whether VACUUM ran.
+        """
+        if self.type_ is not Type.SQLITE:
+            return False
+        async with self.engine.connect() as connection:
+            # VACUUM cannot run inside a transaction
+            connection = await connection.execution_options(isolation_level='AUTOCOMMIT')
+            await connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+            free_pages = (await connection.exec_driver_sql('PRAGMA freelist_count')).scalar()
+            pages = (await connection.exec_driver_sql('PRAGMA page_count')).scalar()
+            vacuum = bool(pages) and free_pages / pages >= cf.database['sqlite_vacuum_free_ratio']
+            if vacuum:
+                await connection.exec_driver_sql('VACUUM')
+                await connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        database_logger.info(
+            'Database is compacted' if vacuum else 'Database WAL is checkpointed',
+            free_pages=free_pages, pages=pages
+        )
+        return vacuum
+
+    async def flush(self):
+        """
+        Write all buffered updates.
+        """
+        await self.settings_buffer.flush()
+
+    async def disconnect(self):
+        """
+        Flush buffered updates and close all pooled connections.
+        """
+        await self.settings_buffer.close()
+        self.ready.clear()
+        if self.__engine is not None:
+            await self.__engine.dispose()
+        database_logger.warning('Disconnected from database')
 
     # __inner_classes__ !DO NOT DELETE!
     class User:
@@ -73,15 +407,20 @@ class Database:
         A class to handle user-related database operations.
         """
 
-        def __init__(self, session_maker):
+        def __init__(self, session_maker, cache: UserCache, buffer: SettingsWriteBuffer):
             """
             Initialize the User class with the session maker.
 
             Args:
             session_maker: The session maker object.
+            cache (UserCache): The cache of user and settings snapshots.
+            buffer (SettingsWriteBuffer): The buffer of settings updates not yet written.
             """
             self.session_maker = session_maker
+            self.cache = cache
+            self.buffer = buffer
 
+        @observe_query
         async def insert(self, user: UserModel):
             """
             Insert a new user into the database.
@@ -89,12 +428,13 @@ class Database:
             Args:
             user (UserModel): The user object to insert.
             """
-            with self.session_maker() as session:
+            async with self.session_maker() as session:
                 session.add(user)
-                session.commit()
+                await session.commit()
+                self.cache.invalidate(user.user_id)
                 database_logger.info(f'UserModel is created!')
-                session.close()
 
+        @observe_query
         async def get_all(self) -> list[UserModel] | None:
             """
             Get all user models from the database.
@@ -102,18 +442,52 @@ class Database:
             Returns:
             list[UserModel] | None: A list of user models or None if no users found.
             """
-            with self.session_maker() as session:
-                data = session.query(UserModel).all()
+            async with self.session_maker() as session:
+                data = (await session.scalars(select(UserModel))).all()
                 if data:
                     database_logger.info('Fetched all UserModels')
-                    return data
+                    return list(data)
                 else:
                     database_logger.info('No UserModels in the database')
                     return None
 
+        @observe_query
+        async def count(self) -> int:
+            """
+            Count the users in the database.
+
+            Returns:
+            int: The number of users.
+            """
+            async with self.session_maker() as session:
+                return await session.scalar(select(func.count()).select_from(UserModel))
+
+        @observe_query
+        async def get_ids_after(self, user_id: int, limit: int) -> list[int]:
+            """
+            Get a batch of user IDs in ascending order using keyset pagination.
+
+            Every batch is a short query on the primary key, so walking all users neither loads them at once
+            nor holds a connection between the batches.
+
+            Args:
+            user_id (int): The last user ID of the previous batch, 0 for the first batch.
+            limit (int): The batch size.
+
+            Returns:
+            list[int]: Up to limit user IDs greater than user_id.
+            """
+            async with self.session_maker() as session:
+                data = await session.scalars(
+                    select(UserModel.user_id).where(UserModel.user_id > user_id)
+                    .order_by(UserModel.user_id).limit(limit)
+                )
+                return list(data)
+
+        @observe_query
         async def get_by_id(self, user_id: int) -> UserModel | None:
             """
-            Get a user model by user ID from the database.
+            Get a user model by user ID, served from the cache when possible.
 
             Args:
             user_id (int): The user ID to retrieve.
@@ -121,16 +495,30 @@ class Database:
             Returns:
             UserModel | None: The user model or None if not found.
             """
-            with self.session_maker() as session:
-                data = session.query(UserModel).options(joinedload(UserModel.settings)).filter_by(
-                    user_id=user_id).first()
+            cached = self.cache.get(user_id)
+            if cached:
+                return cached
+
+            # An update invalidating the user while the row is read makes the row stale
+            version = self.cache.version(user_id)
+            async with self.session_maker() as session:
+                data = await session.scalar(
+                    select(UserModel).options(joinedload(UserModel.settings)).filter_by(user_id=user_id)
+                )
                 if data:
                     database_logger.info(f'UserModel {user_id} is retrieved from the database')
+                    # Buffered settings updates are newer than the stored row
+                    pending = self.buffer.pending(user_id)
+                    if pending and data.settings:
+                        for key, value in pending.items():
+                            setattr(data.settings, key, value)
+                    self.cache.put(data, version=version)
                     return data
                 else:
                     database_logger.info(f'UserModel {user_id} is not in the database')
                     return None
 
+        @observe_query
         async def delete(self, user: UserModel):
             """
             Delete a user from the database.
@@ -138,12 +526,14 @@ class Database:
             Args:
             user (UserModel): The user object to delete.
             """
-            with self.session_maker() as session:
-                session.query(UserModel).filter_by(user_id=user.user_id).delete()
+            async with self.session_maker() as session:
+                await session.execute(delete(UserModel).filter_by(user_id=user.user_id))
                 database_logger.warning(f'UserModel {user.user_id} is deleted!')
-                session.commit()
-                session.close()
+                await session.commit()
+                self.buffer.discard(user.user_id)
+                self.cache.invalidate(user.user_id)
 
+        @observe_query
         async def update(self, user: UserModel):
             """
             Update a user in the database.
@@ -151,28 +541,33 @@ class Database:
             Args:
             user (UserModel): The user object to update.
             """
-            with self.session_maker() as session:
+            async with self.session_maker() as session:
                 database_logger.warning(f'UserModel {user.user_id} is updated!')
-                session.query(UserModel).filter_by(user_id=user.user_id).update({
-                    key: getattr(user, key) for key in user.__dict__.keys()
-                })
-                session.commit()
-                session.close()
+                await session.execute(update(UserModel).filter_by(user_id=user.user_id).values({
+                    column.key: getattr(user, column.key) for column in UserModel.__table__.columns
+                }))
+                await session.commit()
+                self.cache.invalidate(user.user_id)
 
     class Settings:
         """
         A class to handle settings-related database operations.
         """
 
-        def __init__(self, session_maker):
+        def __init__(self, session_maker, cache: UserCache, buffer: SettingsWriteBuffer):
             """
             Initialize the Settings class with the session maker.
 
             Args:
             session_maker: The session maker object.
+            cache (UserCache): The cache of user and settings snapshots.
+            buffer (SettingsWriteBuffer): The buffer coalescing settings updates.
             """
             self.session_maker = session_maker
+            self.cache = cache
+            self.buffer = buffer
 
+        @observe_query
         async def insert(self, settings: SettingsModel):
             """
             Insert settings into the database.
@@ -180,32 +575,31 @@ class Database:
             Args:
             settings (SettingsModel): The settings object to insert.
             """
-            with self.session_maker() as session:
+            async with self.session_maker() as session:
                 session.add(settings)
-                session.commit()
+                await session.commit()
+                self.cache.invalidate(settings.user_id)
                 database_logger.info(f'Settings is created!')
-                session.close()
 
+        @observe_query
         async def update(self, settings: SettingsModel):
             """
-            Update settings in the database.
+            Update settings, the write is buffered and coalesced with other updates of the user.
 
             Args:
             settings (SettingsModel): The settings object to update.
             """
-            with self.session_maker() as session:
-                database_logger.warning(f'Settings {settings.user_id} is updated!')
-
-                # Specify the columns to update
-                session.query(SettingsModel).filter_by(user_id=settings.user_id).update({
-                    'model': settings.model,
-                    'size': settings.size,
-                    'quantity': settings.quantity,
-                })
+            database_logger.warning(f'Settings {settings.user_id} is updated!')
 
-                session.commit()
-                session.close()
+            # Specify the columns to update
+            await self.buffer.add(settings.user_id, {
+                'model': settings.model,
+                'size': settings.size,
+                'quantity': settings.quantity,
+            })
+            self.cache.invalidate(settings.user_id)
 
+        @observe_query
         async def delete(self, settings: SettingsModel):
             """
             Delete settings from the database.
@@ -213,12 +607,494 @@ class Database:
             Args:
             settings (SettingsModel): The settings object to delete.
             """
-            with self.session_maker() as session:
-                session.query(SettingsModel).filter_by(user_id=settings.user_id).delete()
+            async with self.session_maker() as session:
+                await session.execute(delete(SettingsModel).filter_by(user_id=settings.user_id))
                 database_logger.warning(f'Settings {settings.user_id} is deleted!')
-                session.commit()
-                session.close()
+                await session.commit()
+                self.buffer.discard(settings.user_id)
+                self.cache.invalidate(settings.user_id)
+
+    class Generation:
+        """
+        A class to handle generation-related database operations.
+        """
+
+        def __init__(self, session_maker):
+            """
+            Initialize the Generation class with the session maker.
+
+            Args:
+            session_maker: The session maker object.
+            """
+            self.session_maker = session_maker
+
+        @observe_query
+        async def insert(self, generation: GenerationModel) -> GenerationModel:
+            """
+            Insert a generation into the database.
+
+            Args:
+            generation (GenerationModel): The generation object to insert.
+
+            Returns:
+            GenerationModel: The inserted generation with its ID.
+            """
+            async with self.session_maker() as session:
+                session.add(generation)
+                await session.commit()
+                database_logger.info(f'GenerationModel {generation.id} is created!')
+                return generation
+
+        @observe_query
+        async def get_by_id(self, generation_id: int) -> GenerationModel | None:
+            """
+            Get a generation by ID from the database.
+
+            Args:
+            generation_id (int): The generation ID to retrieve.
+
+            Returns:
+            GenerationModel | None: The generation or None if not found.
+            """
+            async with self.session_maker() as session:
+                data = await session.get(GenerationModel, generation_id)
+                if data:
+                    database_logger.info(f'GenerationModel {generation_id} is retrieved from the database')
+                    return data
+                else:
+                    database_logger.info(f'GenerationModel {generation_id} is not in the database')
+                    return None
+
+        @observe_query
+        async def get_history(
+                self, user_id: int, limit: int,
+                cursor: tuple[datetime, int] | None = None, newer: bool = False
+        ) -> list[GenerationModel]:
+            """
+            Get a page of delivered generations of a user, newest first, using keyset pagination.
+
+            Args:
+            user_id (int): The user ID.
+            limit (int): The page size, one extra row is fetched to tell whether more pages exist.
+            cursor (tuple[datetime, int] | None): The (created_at, id) of the generation the page starts after.
+            newer (bool): Whether to read the page newer than the cursor instead of the older one.
+
+            Returns:
+            list[GenerationModel]: Up to limit + 1 generations, ordered away from the cursor.
+            """
+            query = select(GenerationModel).filter_by(user_id=user_id, status=GenerationStatus.DONE.value)
+            created_at, id_ = GenerationModel.created_at, GenerationModel.id
+            if cursor and newer:
+                query = query.where(or_(
+                    created_at > cursor[0], and_(created_at == cursor[0], id_ > cursor[1])
+                )).order_by(created_at.asc(), id_.asc())
+            else:
+                if cursor:
+                    query = query.where(or_(
+                        created_at < cursor[0], and_(created_at == cursor[0], id_ < cursor[1])
+                    ))
+                query = query.order_by(created_at.desc(), id_.desc())
+
+            async with self.session_maker() as session:
+                data = await session.scalars(query.limit(limit + 1))
+                return list(data)
+
+        @observe_query
+        async def get_unfinished(self) -> list[int]:
+            """
+            Get the IDs of generations that are queued or were running when the bot stopped.
+
+            Returns:
+            list[int]: The generation IDs, oldest first.
+            """
+            async with self.session_maker() as session:
+                data = await session.scalars(
+                    select(GenerationModel.id).where(GenerationModel.status.in_([
+                        GenerationStatus.QUEUED.value, GenerationStatus.RUNNING.value
+                    ])).order_by(GenerationModel.id)
+                )
+                return list(data)
+
+        @observe_query
+        async def update(self, generation: GenerationModel):
+            """
+            Update the job state of a generation in the database.
+
+            Args:
+            generation (GenerationModel): The generation object to update.
+            """
+            async with self.session_maker() as session:
+                database_logger.info(f'GenerationModel {generation.id} is updated to {generation.status}')
+                await session.execute(update(GenerationModel).filter_by(id=generation.id).values({
+                    'status': generation.status,
+                    'file_ids': generation.file_ids,
+                    'wait_message_id': generation.wait_message_id,
+                    'latency': generation.latency,
+                }))
+                await session.commit()
+
+
+    class Broadcast:
+        """
+        A class to handle broadcast-related database operations.
+        """
+
+        def __init__(self, session_maker):
+            """
+            Initialize the Broadcast class with the session maker.
+
+            Args:
+            session_maker: The session maker object.
+            """
+            self.session_maker = session_maker
+
+        @observe_query
+        async def insert(self, broadcast: BroadcastModel) -> BroadcastModel:
+            """
+            Insert a broadcast into the database.
+
+            Args:
+            broadcast (BroadcastModel): The broadcast object to insert.
+
+            Returns:
+            BroadcastModel: The inserted broadcast with its ID.
+            """
+            async with self.session_maker() as session:
+                session.add(broadcast)
+                await session.commit()
+                database_logger.info(f'BroadcastModel {broadcast.id} is created!')
+                return broadcast
+
+        @observe_query
+        async def get_by_id(self, broadcast_id: int) -> BroadcastModel | None:
+            """
+            Get a broadcast by ID from the database.
+
+            Args:
+            broadcast_id (int): The broadcast ID to retrieve.
+
+            Returns:
+            BroadcastModel | None: The broadcast or None if not found.
+            """
+            async with self.session_maker() as session:
+                return await session.get(BroadcastModel, broadcast_id)
+
+        @observe_query
+        async def get_recent(self, limit: int) -> list[BroadcastModel]:
+            """
+            Get the latest broadcasts, newest first.
+
+            Args:
+            limit (int): The maximum number of broadcasts.
+
+            Returns:
+            list[BroadcastModel]: The broadcasts.
+            """
+            async with self.session_maker() as session:
+                data = await session.scalars(select(BroadcastModel).order_by(BroadcastModel.id.desc()).limit(limit))
+                return list(data)
+
+        @observe_query
+        async def get_unfinished(self) -> list[int]:
+            """
+            Get the IDs of broadcasts that are queued or were running when the bot stopped.
+
+            Returns:
+            list[int]: The broadcast IDs, oldest first.
+            """
+            async with self.session_maker() as session:
+                data = await session.scalars(
+                    select(BroadcastModel.id).where(BroadcastModel.status.in_([
+                        BroadcastStatus.QUEUED.value, BroadcastStatus.RUNNING.value
+                    ])).order_by(BroadcastModel.id)
+                )
+                return list(data)
+
+        @observe_query
+        async def update(self, broadcast: BroadcastModel) -> bool:
+            """
+            Update the progress of a broadcast, and its status unless it was cancelled meanwhile.
+
+            Args:
+            broadcast (BroadcastModel): The broadcast object to update.
+
+            Returns:
+            bool: False if the broadcast was cancelled.
+            """
+            active = [BroadcastStatus.QUEUED.value, BroadcastStatus.RUNNING.value]
+            async with self.session_maker() as session:
+                status = await session.scalar(update(BroadcastModel).filter_by(id=broadcast.id).values({
+                    'status': case((BroadcastModel.status.in_(active), broadcast.status), else_=BroadcastModel.status),
+                    'last_user_id': broadcast.last_user_id,
+                    'sent': broadcast.sent,
+                    'blocked': broadcast.blocked,
+                    'failed': broadcast.failed,
+                    'elapsed': broadcast.elapsed,
+                    'finished_at': func.coalesce(BroadcastModel.finished_at, broadcast.finished_at),
+                }).returning(BroadcastModel.status))
+                await session.commit()
+                return status != BroadcastStatus.CANCELLED.value
+
+        @observe_query
+        async def cancel(self, broadcast_id: int) -> bool:
+            """
+            Cancel a queued or running broadcast, the sender stops after its current batch.
+
+            Args:
+            broadcast_id (int): The broadcast ID.
+
+            Returns:
+            bool: False if the broadcast is not queued or running.
+            """
+            async with self.session_maker() as session:
+                result = await session.execute(update(BroadcastModel).where(
+                    BroadcastModel.id == broadcast_id,
+                    BroadcastModel.status.in_([BroadcastStatus.QUEUED.value, BroadcastStatus.RUNNING.value])
+                ).values(status=BroadcastStatus.CANCELLED.value, finished_at=datetime.now()))
+                await session.commit()
+                if result.rowcount:
+                    database_logger.info(f'BroadcastModel {broadcast_id} is cancelled')
+                return result.rowcount > 0
+
+    class Stats:
+        """
+        A class to maintain and read the analytics rollups.
+
+        Rollups are incremented by upserts when a generation finishes, so the dashboard never aggregates
+        the Generations table. `refresh` rebuilds recent days from the generations to fix missed increments.
+        """
+
+        def __init__(self, session_maker, insert_factory):
+            """
+            Initialize the Stats class with the session maker.
+
+            Args:
+            session_maker: The session maker object.
+            insert_factory: The dialect insert supporting ON CONFLICT.
+            """
+            self.session_maker = session_maker
+            self.insert = insert_factory
+
+        def __increment(self, model, keys: dict, **increments):
+            """
+            Build an upsert adding the increments to the rollup row with the keys.
+
+            Args:
+            model: The rollup model.
+            keys (dict): The primary key values.
+            increments: The values added to the counters.
+
+            Returns:
+            The insert statement.
+            """
+            statement = self.insert(model).values(**keys, **increments)
+            return statement.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={name: model.__table__.c[name] + statement.excluded[name] for name in increments}
+            )
+
+        @observe_query
+        async def record_generation(self, generation: GenerationModel):
+            """
+            Add a finished generation to the rollups of its day.
+
+            Args:
+            generation (GenerationModel): The finished generation.
+            """
+            day = generation.created_at.date()
+            failed = generation.status == GenerationStatus.FAILED.value
+            async with self.session_maker() as session:
+                await session.execute(self.__increment(
+                    GenerationStatsModel, {'day': day, 'model': generation.model, 'size': generation.size},
+                    generations=1, failures=int(failed), images=len(generation.file_ids or []),
+                    latency_sum=0.0 if failed else generation.latency or 0.0,
+                ))
+                if not failed:
+                    await session.execute(self.__increment(
+                        LatencyBucketModel, {
+                            'day': day, 'model': generation.model,
+                            'bucket': bisect.bisect_left(LATENCY_BUCKETS, generation.latency or 0.0)
+                        }, count=1
+                    ))
+                result = await session.execute(
+                    self.insert(ActiveUserModel).values(day=day, user_id=generation.user_id).on_conflict_do_nothing()
+                )
+                if result.rowcount:
+                    await session.execute(self.__increment(
+                        DailyUsersModel, {'day': day}, active_users=1, new_users=0
+                    ))
+                await session.commit()
+
+        @observe_query
+        async def record_new_user(self, day: date | None = None):
+            """
+            Count a user who joined.
+
+            Args:
+            day (date | None): The day the user joined, today by default.
+            """
+            async with self.session_maker() as session:
+                await session.execute(self.__increment(
+                    DailyUsersModel, {'day': day or date.today()}, active_users=0, new_users=1
+                ))
+                await session.commit()
+
+        @observe_query
+        async def refresh(self, since: date):
+            """
+            Rebuild the rollups of the days since the given one from the generations and users.
+
+            Args:
+            since (date): The first day to rebuild.
+            """
+            start = datetime.combine(since, datetime.min.time())
+            stats = defaultdict(lambda: {'generations': 0, 'failures': 0, 'images': 0, 'latency_sum': 0.0})
+            buckets = defaultdict(int)
+            active = set()
+            new_users = defaultdict(int)
+
+            async with self.session_maker() as session:
+                generations = await session.stream(
+                    select(
+                        GenerationModel.created_at, GenerationModel.user_id, GenerationModel.model,
+                        GenerationModel.size, GenerationModel.status, GenerationModel.latency,
+                        GenerationModel.file_ids,
+                    ).where(GenerationModel.created_at >= start, GenerationModel.status.in_([
+                        GenerationStatus.DONE.value, GenerationStatus.FAILED.value
+                    ])).execution_options(yield_per=1000)
+                )
+                async for created_at, user_id, model, size, status, latency, file_ids in generations:
+                    day = created_at.date()
+                    row = stats[day, model, size]
+                    row['generations'] += 1
+                    active.add((day, user_id))
+                    if status == GenerationStatus.FAILED.value:
+                        row['failures'] += 1
+                        continue
+                    row['images'] += len(file_ids or [])
+                    row['latency_sum'] += latency or 0.0
+                    buckets[day, model, bisect.bisect_left(LATENCY_BUCKETS, latency or 0.0)] += 1
+
+                joined = await session.stream(select(UserModel.joined_date).where(UserModel.joined_date >= start))
+                async for joined_date, in joined:
+                    if joined_date:
+                        new_users[joined_date.date()] += 1
+
+                active_users = defaultdict(int)
+                for day, _ in active:
+                    active_users[day] += 1
+
+                for model in (GenerationStatsModel, LatencyBucketModel, ActiveUserModel, DailyUsersModel):
+                    await session.execute(delete(model).where(model.day >= since))
+                for rows, model in [
+                    ([{'day': day, 'model': m, 'size': s, **row} for (day, m, s), row in stats.items()],
+                     GenerationStatsModel),
+                    ([{'day': day, 'model': m, 'bucket': b, 'count': count} for (day, m, b), count in buckets.items()],
+                     LatencyBucketModel),
+                    ([{'day': day, 'user_id': user_id} for day, user_id in active], ActiveUserModel),
+                    ([{'day': day, 'active_users': active_users[day], 'new_users': new_users[day]}
+                      for day in set(active_users) | set(new_users)], DailyUsersModel),
+                ]:
+                    if rows:
+                        await session.execute(insert(model), rows)
+                await session.commit()
+            database_logger.info(f'Rollups since {since} are rebuilt from {sum(active_users.values())} active users')
+
+        @observe_query
+        async def get_daily(self, since: date) -> list[dict]:
+            """
+            Get the daily totals since the given day, newest first.
+
+            Args:
+            since (date): The first day.
+
+            Returns:
+            list[dict]: Day, active and new users, generations and failures of every day with activity.
+            """
+            async with self.session_maker() as session:
+                users = {
+                    row.day: row for row in await session.scalars(
+                        select(DailyUsersModel).where(DailyUsersModel.day >= since)
+                    )
+                }
+                generations = {
+                    day: (total, failures) for day, total, failures in await session.execute(
+                        select(
+                            GenerationStatsModel.day, func.sum(GenerationStatsModel.generations),
+                            func.sum(GenerationStatsModel.failures)
+                        ).where(GenerationStatsModel.day >= since).group_by(GenerationStatsModel.day)
+                    )
+                }
+            return [
+                {
+                    'day': day,
+                    'active_users': users[day].active_users if day in users else 0,
+                    'new_users': users[day].new_users if day in users else 0,
+                    'generations': generations.get(day, (0, 0))[0],
+                    'failures': generations.get(day, (0, 0))[1],
+                }
+                for day in sorted(set(users) | set(generations), reverse=True)
+            ]
+
+        @observe_query
+        async def get_by_model(self, since: date) -> list[dict]:
+            """
+            Get the generation totals per model and size since the given day.
+
+            Args:
+            since (date): The first day.
+
+            Returns:
+            list[dict]: Model, size, generations, failures, images and total latency.
+            """
+            async with self.session_maker() as session:
+                rows = await session.execute(
+                    select(
+                        GenerationStatsModel.model, GenerationStatsModel.size,
+                        func.sum(GenerationStatsModel.generations), func.sum(GenerationStatsModel.failures),
+                        func.sum(GenerationStatsModel.images), func.sum(GenerationStatsModel.latency_sum),
+                    ).where(GenerationStatsModel.day >= since)
+                    .group_by(GenerationStatsModel.model, GenerationStatsModel.size)
+                    .order_by(GenerationStatsModel.model, GenerationStatsModel.size)
+                )
+                return [
+                    {
+                        'model': model, 'size': size, 'generations': generations, 'failures': failures,
+                        'images': images, 'latency_sum': latency_sum,
+                    }
+                    for model, size, generations, failures, images, latency_sum in rows
+                ]
+
+        @observe_query
+        async def get_latency_histograms(self, since: date) -> dict[str, list[int]]:
+            """
+            Get the latency histograms per model since the given day.
+
+            Args:
+            since (date): The first day.
+
+            Returns:
+            dict[str, list[int]]: Counts per bucket of LATENCY_BUCKETS by model.
+            """
+            histograms = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+            async with self.session_maker() as session:
+                rows = await session.execute(
+                    select(LatencyBucketModel.model, LatencyBucketModel.bucket, func.sum(LatencyBucketModel.count))
+                    .where(LatencyBucketModel.day >= since)
+                    .group_by(LatencyBucketModel.model, LatencyBucketModel.bucket)
+                )
+                for model, bucket, count in rows:
+                    histograms[model][bucket] += count
+            return dict(histograms)
 
+# Create an instance of the Database class with the configured backend
+db = Database(type_=Type[cf.database['backend'].upper()])
 
-# Create an instance of the Database class with a PostgreSQL connection
-db = Database(type_=Type.SQLITE)
\ No newline at end of file
+# Export the readiness and the user cache counters
+Gauge('db_ready', 'Whether the database is connected and migrated.', callback=lambda: {(): int(db.ready.is_set())})
+Gauge('db_user_cache_size', 'Number of cached users.', callback=lambda: {(): db.cache.stats()['size']})
+for _stat in ('hits', 'misses', 'evictions'):
+    Counter(
+        f'db_user_cache_{_stat}_total', f'User cache {_stat}.',
+        callback=lambda stat=_stat: {(): db.cache.stats()[stat]}
+    )
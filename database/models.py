@@ -7,25 +7,44 @@ from sqlalchemy.sql import func
 # Project
 from gpt import Model, Size
 
+# Standard
+from datetime import datetime
+from enum import Enum
+
 # Creating a base class for declarative models
 base = declarative_base()
 
 
+class GenerationStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class BroadcastStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    CANCELLED = 'cancelled'
+
+
 class UserModel(base):
     """
     Represents a user in the database.
 
     Attributes:
-    user_id (Integer): The unique identifier for the user.
+    user_id (BigInteger): The unique identifier for the user, Telegram IDs exceed 32 bits.
     name (String): The name of the user.
     joined_date (DateTime): The date the user joined.
     settings (Relationship): The settings associated with the user.
     """
 
     __tablename__ = 'Users'
-    user_id = Column(Integer, primary_key=True)
-    name = Column(String)
-    joined_date = Column(DateTime, default=func.now())
+    # Telegram assigns the IDs, no sequence is needed
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    name = Column(String, index=True)
+    joined_date = Column(DateTime, default=func.now(), index=True)
 
     # Relationship with Settings table
     settings = relationship('SettingsModel', uselist=False, back_populates='user')
@@ -61,17 +80,18 @@ class SettingsModel(base):
     model (String): The model to use.
     size (String): The size of the model.
     quantity (int): The quantity of settings.
-    user_id (Integer): The user ID associated with the settings.
+    user_id (BigInteger): The user ID associated with the settings.
     user (Relationship): The user associated with the settings.
     """
 
     __tablename__ = 'Settings'
     id = Column(Integer, primary_key=True)
-    model = Column(String, default=Model.DALLE_2.value)
-    size = Column(String, default=Size.S_256.value)
-    quantity = Column(Integer, default=1)
+    model = Column(String, default=Model.DALLE_2.value, index=True)
+    size = Column(String, default=Size.S_256.value, index=True)
+    quantity = Column(Integer, default=1, index=True)
 
-    user_id = Column(Integer, ForeignKey('Users.user_id'))
+    # One settings row per user, looked up by every get_by_id and settings update
+    user_id = Column(BigInteger, ForeignKey('Users.user_id'), unique=True, index=True)
     user = relationship('UserModel', back_populates='settings')
 
     @staticmethod
@@ -94,3 +114,218 @@ class SettingsModel(base):
             size=size,
             quantity=quantity,
         )
+
+
+class GenerationModel(base):
+    """
+    Represents an image generation requested by a user.
+
+    Attributes:
+    id (Integer): The unique identifier for the generation.
+    user_id (BigInteger): The user ID who requested the generation.
+    prompt (Text): The prompt of the generation.
+    model (String): The model used.
+    size (String): The size of the images.
+    quantity (Integer): The number of images.
+    file_ids (JSON): Telegram file IDs of the sent images, stored as they are delivered and reused to resend them.
+    status (String): The job status, one of GenerationStatus values.
+    latency (Float): Seconds from the start of the job until the images were delivered.
+    wait_message_id (Integer): The message shown to the user while the generation runs.
+    created_at (DateTime): The date of the generation.
+    user (Relationship): The user who requested the generation.
+    """
+
+    __tablename__ = 'Generations'
+    __table_args__ = (
+        # Serves the keyset pagination of /history
+        Index('ix_generations_user_id_created_at', 'user_id', 'created_at'),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('Users.user_id'))
+    prompt = Column(Text)
+    model = Column(String)
+    size = Column(String)
+    quantity = Column(Integer)
+    file_ids = Column(JSON, default=list)
+    status = Column(String, default=GenerationStatus.QUEUED.value, index=True)
+    wait_message_id = Column(Integer)
+    latency = Column(Float, index=True)
+    # Set on the Python side so SQLite stores microseconds and keyset cursors compare exactly
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+    user = relationship('UserModel')
+
+    @staticmethod
+    def create(
+            user_id: int, prompt: str, model: str, size: str, quantity: int,
+            wait_message_id: int | None = None
+    ):
+        """
+        Creates a queued generation with the given parameters.
+
+        Args:
+        user_id (int): The user ID.
+        prompt (str): The prompt of the generation.
+        model (str): The model used.
+        size (str): The size of the images.
+        quantity (int): The number of images.
+        wait_message_id (int | None): The message shown to the user while the generation runs.
+
+        Returns:
+        GenerationModel: The created generation.
+        """
+        return GenerationModel(
+            user_id=user_id,
+            prompt=prompt,
+            model=model,
+            size=size,
+            quantity=quantity,
+            file_ids=[],
+            status=GenerationStatus.QUEUED.value,
+            wait_message_id=wait_message_id,
+        )
+
+
+# Upper bounds of the generation latency buckets in seconds, the last bucket is unbounded
+LATENCY_BUCKETS = (1, 2.5, 5, 7.5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300, float('inf'))
+
+
+class DailyUsersModel(base):
+    """
+    Daily rollup of user activity.
+
+    Attributes:
+    day (Date): The day of the rollup.
+    active_users (Integer): Number of distinct users who ran a generation that day.
+    new_users (Integer): Number of users who joined that day.
+    """
+
+    __tablename__ = 'DailyUsers'
+    day = Column(Date, primary_key=True)
+    active_users = Column(Integer, default=0, nullable=False)
+    new_users = Column(Integer, default=0, nullable=False)
+
+
+class ActiveUserModel(base):
+    """
+    A user active on a day, keeps the daily active users distinct.
+
+    Attributes:
+    day (Date): The day of the activity.
+    user_id (BigInteger): The active user ID.
+    """
+
+    __tablename__ = 'ActiveUsers'
+    day = Column(Date, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+
+
+class GenerationStatsModel(base):
+    """
+    Daily rollup of finished generations per model and size.
+
+    Attributes:
+    day (Date): The day of the rollup.
+    model (String): The model used.
+    size (String): The size of the images.
+    generations (Integer): Number of finished generations.
+    failures (Integer): Number of failed generations.
+    images (Integer): Number of delivered images.
+    latency_sum (Float): Total latency of the delivered generations in seconds.
+    """
+
+    __tablename__ = 'GenerationStats'
+    day = Column(Date, primary_key=True)
+    model = Column(String, primary_key=True)
+    size = Column(String, primary_key=True)
+    generations = Column(Integer, default=0, nullable=False)
+    failures = Column(Integer, default=0, nullable=False)
+    images = Column(Integer, default=0, nullable=False)
+    latency_sum = Column(Float, default=0.0, nullable=False)
+
+
+class LatencyBucketModel(base):
+    """
+    Daily histogram of the latency of delivered generations per model.
+
+    Attributes:
+    day (Date): The day of the rollup.
+    model (String): The model used.
+    bucket (Integer): Index of the bucket in LATENCY_BUCKETS.
+    count (Integer): Number of generations in the bucket.
+    """
+
+    __tablename__ = 'LatencyBuckets'
+    day = Column(Date, primary_key=True)
+    model = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class BroadcastModel(base):
+    """
+    Represents a message sent to all users, with the progress needed to resume it.
+
+    Attributes:
+    id (Integer): The unique identifier for the broadcast.
+    text (Text): The HTML text of the message.
+    status (String): The job status, one of BroadcastStatus values.
+    total (Integer): Number of users when the broadcast was created.
+    last_user_id (BigInteger): The last user ID of the completed batches, recipients are read in user ID order.
+    sent (Integer): Number of delivered messages.
+    blocked (Integer): Number of users who blocked the bot or deleted their account.
+    failed (Integer): Number of messages failed for other reasons.
+    elapsed (Float): Seconds spent sending, excluding the time the bot was stopped.
+    created_at (DateTime): The date of the broadcast.
+    finished_at (DateTime): The date the broadcast was finished or cancelled.
+    """
+
+    __tablename__ = 'Broadcasts'
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    status = Column(String, default=BroadcastStatus.QUEUED.value, index=True)
+    total = Column(Integer, default=0, nullable=False)
+    last_user_id = Column(BigInteger, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    blocked = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    elapsed = Column(Float, default=0.0, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime)
+
+    @staticmethod
+    def create(text: str, total: int):
+        """
+        Creates a queued broadcast with the given text.
+
+        Args:
+        text (str): The HTML text of the message.
+        total (int): Number of users to send the message to.
+
+        Returns:
+        BroadcastModel: The created broadcast.
+        """
+        return BroadcastModel(
+            text=text,
+            status=BroadcastStatus.QUEUED.value,
+            total=total,
+            last_user_id=0,
+            sent=0,
+            blocked=0,
+            failed=0,
+            elapsed=0.0,
+        )
+
+    @property
+    def processed(self) -> int:
+        """
+        Number of users the message was sent or attempted to.
+        """
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def throughput(self) -> float | None:
+        """
+        Messages per second spent sending, None before the first batch.
+        """
+        return self.processed / self.elapsed if self.elapsed else None
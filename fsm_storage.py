@@ -0,0 +1,176 @@
+# Third-party
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+import aiosqlite
+
+# Standard
+from pathlib import Path
+from time import time
+from typing import Any
+import asyncio
+import json
+
+# Project
+import config as cf
+from logger import bot_logger
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage kept in a local SQLite file, so states survive restarts without an external service.
+
+    Attributes:
+    path (Path): The database file.
+    state_ttl (int): Seconds an untouched state and its data are kept.
+    """
+
+    def __init__(self, path: Path, state_ttl: int):
+        """
+        Initialize the storage. The file is opened on first use.
+
+        Args:
+        path (Path): The database file.
+        state_ttl (int): Seconds an untouched state and its data are kept.
+        """
+        self.path = Path(path)
+        self.state_ttl = state_ttl
+        self.__connection: aiosqlite.Connection | None = None
+        self.__lock = asyncio.Lock()
+
+    @staticmethod
+    def __make_key(key: StorageKey) -> str:
+        """
+        Build the row key of a storage key.
+
+        Args:
+        key (StorageKey): The aiogram storage key.
+
+        Returns:
+        str: The row key.
+        """
+        return f'{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id}:{key.destiny}'
+
+    async def __get_connection(self) -> aiosqlite.Connection:
+        """
+        Open the database on first use.
+
+        Returns:
+        aiosqlite.Connection: The connection.
+        """
+        if self.__connection is None:
+            self.__connection = await aiosqlite.connect(self.path)
+            await self.__connection.execute('PRAGMA journal_mode=WAL')
+            await self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS fsm '
+                "(key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', updated_at REAL NOT NULL)"
+            )
+            await self.__connection.execute('CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at)')
+            await self.__connection.commit()
+        return self.__connection
+
+    async def __read(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        """
+        Read the state and data of a key, expired rows read as empty.
+
+        Args:
+        key (StorageKey): The aiogram storage key.
+
+        Returns:
+        tuple[str | None, dict[str, Any]]: The state and the data.
+        """
+        connection = await self.__get_connection()
+        async with connection.execute(
+                'SELECT state, data FROM fsm WHERE key = ? AND updated_at >= ?',
+                (self.__make_key(key), time() - self.state_ttl)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    async def __write(self, key: StorageKey, state: str | None, data: dict[str, Any]):
+        """
+        Write the state and data of a key, removing the row once both are empty.
+
+        Args:
+        key (StorageKey): The aiogram storage key.
+        state (str | None): The state.
+        data (dict[str, Any]): The data.
+        """
+        connection = await self.__get_connection()
+        if state is None and not data:
+            await connection.execute('DELETE FROM fsm WHERE key = ?', (self.__make_key(key),))
+        else:
+            await connection.execute(
+                'INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data, '
+                'updated_at = excluded.updated_at',
+                (self.__make_key(key), state, json.dumps(data), time())
+            )
+        await connection.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        async with self.__lock:
+            _, data = await self.__read(key)
+            await self.__write(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        async with self.__lock:
+            state, _ = await self.__read(key)
+            return state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        async with self.__lock:
+            state, _ = await self.__read(key)
+            await self.__write(key, state, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        async with self.__lock:
+            _, data = await self.__read(key)
+            return data
+
+    async def prune(self) -> int:
+        """
+        Delete the states that were not touched for longer than the TTL.
+
+        Returns:
+        int: The number of deleted states.
+        """
+        async with self.__lock:
+            connection = await self.__get_connection()
+            cursor = await connection.execute('DELETE FROM fsm WHERE updated_at < ?', (time() - self.state_ttl,))
+            await connection.commit()
+            return cursor.rowcount
+
+    async def close(self) -> None:
+        if self.__connection is not None:
+            await self.__connection.close()
+            self.__connection = None
+
+
+def create_storage() -> BaseStorage:
+    """
+    Create the FSM storage selected in the configuration.
+
+    Returns:
+    BaseStorage: The storage passed to the dispatcher.
+
+    Raises:
+    ValueError: If FSM_STORAGE names an unknown storage, a typo must not lose the states on every restart.
+    """
+    match cf.fsm['storage']:
+        case 'redis':
+            # Optional dependency, only needed when states are shared between bot processes
+            from aiogram.fsm.storage.redis import RedisStorage
+            storage = RedisStorage.from_url(
+                cf.fsm['redis_url'], state_ttl=cf.fsm['state_ttl'], data_ttl=cf.fsm['state_ttl']
+            )
+        case 'sqlite':
+            storage = SQLiteStorage(path=cf.fsm['sqlite_path'], state_ttl=cf.fsm['state_ttl'])
+        case 'memory':
+            storage = MemoryStorage()
+        case unknown:
+            raise ValueError(f"Unknown FSM_STORAGE {unknown!r}, expected 'memory', 'sqlite' or 'redis'")
+    bot_logger.info(f'Using {type(storage).__name__} for FSM states')
+    return storage
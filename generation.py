@@ -0,0 +1,236 @@
+# Standard
+from collections import deque
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Awaitable, Callable, Hashable, TypeVar
+import asyncio
+
+# Project
+import config as cf
+from logger import gpt_logger
+from metrics import Gauge, Histogram
+
+T = TypeVar('T')
+
+
+@dataclass
+class _Ticket:
+    """
+    A queued request for a generation slot.
+
+    Attributes:
+    user_id (int): The user who requested the slot.
+    future (asyncio.Future): Resolved when the slot is granted.
+    group (Hashable): Tickets of the same group count once against the per-user limit.
+    enqueued_at (float): Monotonic time the ticket was queued.
+    granted (bool): Whether the ticket already holds a slot.
+    """
+    user_id: int
+    future: asyncio.Future
+    group: Hashable = None
+    enqueued_at: float = field(default_factory=monotonic)
+    granted: bool = False
+
+
+class GenerationScheduler:
+    """
+    Bounded concurrency scheduler for image generations.
+
+    Requests wait in per-user queues and slots are granted round-robin across users, so one user
+    sending many prompts cannot starve the others. Requests split into parts share a group,
+    the parts take one slot each but count as a single generation against the per-user limit.
+
+    Attributes:
+    max_concurrency (int): Maximum number of requests running at once.
+    max_per_user (int): Maximum number of request groups running at once for a single user.
+    """
+
+    def __init__(self, max_concurrency: int, max_per_user: int):
+        """
+        Initialize the scheduler.
+
+        Args:
+        max_concurrency (int): Maximum number of generations running at once.
+        max_per_user (int): Maximum number of generations running at once for a single user.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+
+        self.__queues: dict[int, deque[_Ticket]] = {}
+        self.__rotation: deque[int] = deque()
+        self.__running = 0
+        self.__running_groups: dict[int, dict[Hashable, int]] = {}
+
+        self.__completed = 0
+        self.__total_wait = 0.0
+        self.__max_wait = 0.0
+
+    @property
+    def queued(self) -> int:
+        """
+        Number of requests waiting for a slot.
+        """
+        return sum(len(queue) for queue in self.__queues.values())
+
+    @property
+    def running(self) -> int:
+        """
+        Number of generations currently holding a slot.
+        """
+        return self.__running
+
+    def position(self, ticket: _Ticket) -> int:
+        """
+        Estimate how many slots are granted before the ticket, counting itself.
+
+        Args:
+        ticket (_Ticket): The queued ticket.
+
+        Returns:
+        int: The 1-based queue position.
+        """
+        queue = self.__queues.get(ticket.user_id)
+        if not queue or ticket not in queue:
+            return 0
+        index = queue.index(ticket)
+        ahead = sum(
+            min(len(other), index + 1)
+            for user_id, other in self.__queues.items() if user_id != ticket.user_id
+        )
+        return ahead + index + 1
+
+    def stats(self) -> dict:
+        """
+        Get the scheduler counters.
+
+        Returns:
+        dict: Queue depth, running and completed generations, average and maximum wait time in seconds.
+        """
+        return {
+            'queued': self.queued,
+            'running': self.__running,
+            'completed': self.__completed,
+            'avg_wait': self.__total_wait / self.__completed if self.__completed else 0.0,
+            'max_wait': self.__max_wait,
+        }
+
+    def __dispatch(self):
+        """
+        Grant free slots to queued tickets in round-robin order across users.
+        """
+        skipped = 0
+        while self.__running < self.max_concurrency and skipped < len(self.__rotation):
+            user_id = self.__rotation[0]
+            self.__rotation.rotate(-1)
+            queue = self.__queues[user_id]
+            groups = self.__running_groups.setdefault(user_id, {})
+            if queue[0].group not in groups and len(groups) >= self.max_per_user:
+                skipped += 1
+                continue
+
+            ticket = queue.popleft()
+            if not queue:
+                # The user was rotated to the end, drop them until they queue again
+                del self.__queues[user_id]
+                self.__rotation.pop()
+
+            ticket.granted = True
+            self.__running += 1
+            groups[ticket.group] = groups.get(ticket.group, 0) + 1
+            ticket.future.set_result(None)
+            skipped = 0
+
+    def __release(self, ticket: _Ticket):
+        """
+        Return the slot held by a ticket and hand it to the next one.
+
+        Args:
+        ticket (_Ticket): The ticket holding the slot.
+        """
+        self.__running -= 1
+        groups = self.__running_groups[ticket.user_id]
+        groups[ticket.group] -= 1
+        if not groups[ticket.group]:
+            del groups[ticket.group]
+        if not groups:
+            del self.__running_groups[ticket.user_id]
+        self.__dispatch()
+
+    def __discard(self, ticket: _Ticket):
+        """
+        Remove a ticket that was cancelled before it got a slot.
+
+        Args:
+        ticket (_Ticket): The cancelled ticket.
+        """
+        queue = self.__queues.get(ticket.user_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self.__queues[ticket.user_id]
+                self.__rotation.remove(ticket.user_id)
+
+    async def submit(
+            self, user_id: int, job: Callable[[], Awaitable[T]],
+            on_queued: Callable[[int], Awaitable] | None = None, group: Hashable = None
+    ) -> T:
+        """
+        Wait for a generation slot and run the job in it.
+
+        Args:
+        user_id (int): The user requesting the generation.
+        job (Callable[[], Awaitable[T]]): Factory of the coroutine to run once a slot is granted.
+        on_queued (Callable[[int], Awaitable] | None): Called with the queue position if the request has to wait.
+        group (Hashable): Shared by the parts of one generation, a request is its own group by default.
+
+        Returns:
+        T: The result of the job.
+        """
+        ticket = _Ticket(
+            user_id=user_id, future=asyncio.get_running_loop().create_future(),
+            group=object() if group is None else group
+        )
+        if user_id not in self.__queues:
+            self.__queues[user_id] = deque()
+            self.__rotation.append(user_id)
+        self.__queues[user_id].append(ticket)
+        self.__dispatch()
+
+        try:
+            if not ticket.granted and on_queued:
+                try:
+                    await on_queued(self.position(ticket))
+                except Exception as e:
+                    gpt_logger.warning(f'Failed to report queue position to user {user_id}: {e}')
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.granted:
+                self.__release(ticket)
+            else:
+                self.__discard(ticket)
+            raise
+
+        wait = monotonic() - ticket.enqueued_at
+        _wait_time.observe(wait)
+        self.__total_wait += wait
+        self.__max_wait = max(self.__max_wait, wait)
+        try:
+            return await job()
+        finally:
+            self.__completed += 1
+            self.__release(ticket)
+
+
+# Scheduler shared by all generation requests
+generation_scheduler = GenerationScheduler(
+    max_concurrency=cf.generation['max_concurrency'],
+    max_per_user=cf.generation['max_per_user'],
+)
+
+_wait_time = Histogram('generation_queue_wait_seconds', 'Time generation requests waited for a slot.')
+Gauge(
+    'generation_queue', 'Queued, running and completed generation requests.', ('state',),
+    callback=lambda: {
+        (key,): value for key, value in generation_scheduler.stats().items() if key in ('queued', 'running', 'completed')
+    }
+)
@@ -1,16 +1,21 @@
 # Standard
 from datetime import datetime, timezone, timedelta
 from enum import Enum
+from time import monotonic, perf_counter
+from typing import AsyncIterator, Awaitable, Callable
+import asyncio
+import random
 import os
 
 # Project
 import config as cf
 from logger import gpt_logger
+from metrics import openai_latency, openai_requests
 
 
 # Third-party
 os.environ['OPENAI_API_KEY'] = cf.api.get('token', '')
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
 
 
 class Size(Enum):
@@ -26,18 +31,217 @@ class Model(Enum):
     DALLE_3 = 'dall-e-3'
 
 
+# Largest number of images a single request of the model may ask for, unlisted models take any quantity
+MAX_IMAGES_PER_REQUEST = {Model.DALLE_3.value: 1}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when the OpenAI API is considered unavailable and calls are rejected without being sent.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding the OpenAI API.
+
+    After `threshold` failed calls in a row the breaker opens and rejects calls for `reset_timeout`
+    seconds, then lets a single probe call through. A successful probe closes the breaker again.
+
+    Attributes:
+    threshold (int): Failed calls in a row to open the breaker.
+    reset_timeout (float): Seconds the breaker stays open before a probe.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        """
+        Initialize the breaker in the closed state.
+
+        Args:
+        threshold (int): Failed calls in a row to open the breaker.
+        reset_timeout (float): Seconds the breaker stays open before a probe.
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.__failures = 0
+        self.__opened_at: float | None = None
+        self.__probing = False
+
+    @property
+    def state(self) -> str:
+        """
+        Current state of the breaker: 'closed', 'open' or 'half_open'.
+        """
+        if self.__opened_at is None:
+            return 'closed'
+        if monotonic() - self.__opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self) -> bool:
+        """
+        Check whether a call may be sent.
+
+        Returns:
+        bool: True if the call is the probe of a half-open breaker, it must be released by `end_probe`.
+
+        Raises:
+        CircuitOpenError: If the breaker is open or a probe call is already in flight.
+        """
+        state = self.state
+        if state == 'open' or (state == 'half_open' and self.__probing):
+            raise CircuitOpenError('OpenAI API circuit is open')
+        if state == 'half_open':
+            self.__probing = True
+            return True
+        return False
+
+    def end_probe(self):
+        """
+        Let the next call probe again, needed when a probe ends without an outcome, e.g. cancelled.
+        """
+        self.__probing = False
+
+    def record_success(self):
+        """
+        Close the breaker after a successful call.
+        """
+        if self.__opened_at is not None:
+            gpt_logger.warning('OpenAI circuit breaker closed')
+        self.__failures = 0
+        self.__opened_at = None
+        self.__probing = False
+
+    def record_failure(self):
+        """
+        Count a failed call and open the breaker once the threshold is reached.
+        """
+        self.__failures += 1
+        self.__probing = False
+        if self.__failures >= self.threshold:
+            if self.state != 'open':
+                gpt_logger.error(f'OpenAI circuit breaker opened after {self.__failures} failures')
+            self.__opened_at = monotonic()
+
+
 _client = AsyncOpenAI(
     api_key=cf.api.get('token', ''),
-    base_url=cf.api.get('base_url', '')
+    base_url=cf.api.get('base_url', ''),
+    max_retries=0,  # Retries are handled by _request_dalle
 )
+_breaker = CircuitBreaker(threshold=cf.api['breaker_threshold'], reset_timeout=cf.api['breaker_reset'])
+
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Check whether a failed request is worth retrying.
+
+    Args:
+        error (Exception): The raised error.
+
+    Returns:
+        bool: True for timeouts, connection errors, 429 and 5xx responses.
+    """
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _get_retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Get the delay before the next attempt.
+
+    The Retry-After header is honored when present, otherwise exponential backoff with full jitter is used.
 
+    Args:
+        error (Exception): The raised error.
+        attempt (int): The number of the failed attempt, starting from 0.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(float(retry_after), cf.api['backoff_max'])
+            except ValueError:
+                pass
+    return random.uniform(0, min(cf.api['backoff_base'] * 2 ** attempt, cf.api['backoff_max']))
+
+
+def split_quantity(model: Model | str, quantity: int) -> list[int]:
+    """
+    Split a number of images into the quantities of the requests the model accepts.
+
+    Args:
+        model (Model | str): The model to use for image generation.
+        quantity (int): The number of images to generate.
+
+    Returns:
+        list[int]: The number of images of every request.
+    """
+    model = model.value if isinstance(model, Model) else model
+    limit = MAX_IMAGES_PER_REQUEST.get(model, quantity)
+    return [min(limit, quantity - start) for start in range(0, quantity, limit)]
+
+
+async def iter_dalle(
+        prompt: str, size: Size | str, model: Model | str, quantity: int,
+        submit: Callable[[Callable[[], Awaitable[dict]]], Awaitable[dict]] | None = None
+) -> AsyncIterator[dict]:
+    """
+    Generate images in concurrent requests of the quantity the model accepts, yielding every response
+    as soon as it completes.
 
-async def send_dalle(
+    Failed requests are logged and skipped so the images of the others are still delivered.
+
+    Args:
+        prompt (str): The prompt for generating the images.
+        size (Size | str): The size of the image to be generated.
+        model (Model | str): The model to use for image generation.
+        quantity (int): The number of images to generate.
+        submit (Callable | None): Runs a request factory, e.g. in a generation scheduler slot.
+            Requests are run directly if None.
+
+    Yields:
+        dict: The response data of one request.
+
+    Raises:
+        CircuitOpenError: If the API is considered unavailable.
+        openai.OpenAIError: If no request succeeded.
+    """
+    def make_job(n: int) -> Callable[[], Awaitable[dict]]:
+        return lambda: _request_dalle(prompt=prompt, size=size, model=model, quantity=n)
+
+    jobs = [make_job(n) for n in split_quantity(model, quantity)]
+    tasks = [asyncio.create_task(submit(job) if submit else job()) for job in jobs]
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                response = await next_done
+            except Exception as e:
+                gpt_logger.warning(f'GPT request {len(errors) + 1} of {len(tasks)} failed: {e}')
+                errors.append(e)
+                continue
+            yield response
+        if len(errors) == len(tasks):
+            raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _request_dalle(
         prompt: str, size: Size | str,
         model: Model | str, quantity: int
 ) -> dict:
     """
-    Send a request to generate images using OpenAI's DALL-E model.
+    Send a single request to generate images using OpenAI's DALL-E model.
+
+    Timeouts, 429 and 5xx responses are retried with backoff, and repeated failures open the circuit breaker.
 
     Args:
         prompt (str): The prompt for generating the images.
@@ -47,13 +251,56 @@ async def send_dalle(
 
     Returns:
         dict: The response data from the OpenAI API.
+
+    Raises:
+        CircuitOpenError: If the API is considered unavailable.
+        openai.OpenAIError: If the request failed and cannot be retried.
     """
-    response = await _client.images.generate(
-        model=model.value if model is Model else model,
-        prompt=prompt,
-        n=quantity,
-        size=size.value if size is Size else size,
-    )
+    model = model.value if isinstance(model, Model) else model
+    size = size.value if isinstance(size, Size) else size
+    timeout = cf.api['timeouts'].get(model, cf.api['default_timeout'])
+
+    attempt = 0
+    while True:
+        try:
+            probe = _breaker.before_call()
+        except CircuitOpenError:
+            openai_requests.inc(model=model, size=size, outcome='circuit_open')
+            raise
+
+        start = perf_counter()
+        try:
+            response = await _client.images.generate(
+                model=model,
+                prompt=prompt,
+                n=quantity,
+                size=size,
+                timeout=timeout,
+            )
+        except asyncio.CancelledError:
+            if probe:
+                _breaker.end_probe()
+            raise
+        except Exception as e:
+            outcome = 'retryable_error' if _is_retryable(e) else 'error'
+            openai_latency.observe(perf_counter() - start, model=model, size=size, outcome=outcome)
+            openai_requests.inc(model=model, size=size, outcome=outcome)
+            if not _is_retryable(e):
+                _breaker.record_success()  # The API answered, the request itself was rejected
+                raise
+            _breaker.record_failure()
+            if attempt >= cf.api['max_retries']:
+                raise
+            delay = _get_retry_delay(e, attempt)
+            gpt_logger.warning(f'GPT request failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s')
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
 
-    gpt_logger.info(f'GPT response {datetime.now()}: {response.model_dump()}')
-    return response.model_dump()
+        openai_latency.observe(perf_counter() - start, model=model, size=size, outcome='success')
+        openai_requests.inc(model=model, size=size, outcome='success')
+        _breaker.record_success()
+        data = response.model_dump()
+        gpt_logger.info('GPT response', model=model, size=size, quantity=quantity, images=len(data['data']))
+        gpt_logger.debug(f'GPT response {datetime.now()}: {data}')
+        return data
@@ -1,8 +1,9 @@
 # Importing necessary modules and classes from the package
 from .private import private_router
+from .private.dalle import generation_jobs
 
 # Contains all the routers available in the package for external access
 all_routers = [private_router]
 
 # List of classes, methods and modules that will be accessible when importing the package
-__all__ = ['all_routers']
\ No newline at end of file
+__all__ = ['all_routers', 'generation_jobs']
\ No newline at end of file
@@ -0,0 +1,141 @@
+# Third-party
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Message, CallbackQuery
+
+# Standard
+from time import perf_counter
+import asyncio
+from typing import Any, Awaitable, Callable
+
+# Project
+import config as cf
+from metrics import handler_latency, handler_errors, rate_limit_rejected
+from resources import strs
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware measuring the latency of the handlers of a router.
+
+    Attributes:
+    router_name (str): The router label of the metrics.
+    event (str): The event type label of the metrics.
+    """
+
+    def __init__(self, router_name: str, event: str):
+        self.router_name = router_name
+        self.event = event
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        start = perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(router=self.router_name, event=self.event)
+            raise
+        finally:
+            handler_latency.observe(perf_counter() - start, router=self.router_name, event=self.event)
+
+
+class ReadinessMiddleware(BaseMiddleware):
+    """
+    Outer middleware answering updates received before the database is ready instead of handling them.
+
+    Attributes:
+    ready (asyncio.Event): Set once the handlers can use the database.
+    """
+
+    def __init__(self, ready: asyncio.Event):
+        self.ready = ready
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        if self.ready.is_set():
+            return await handler(event, data)
+        if isinstance(event, (Message, CallbackQuery)):
+            await event.answer(text=strs.not_ready_msg)
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """
+    Outer middleware applying token bucket limits per user and per command class.
+
+    Prompts sent while waiting for a generation are the 'generation' class and are also limited globally,
+    everything else is the 'cheap' class. A prompt rejected by the global limit gives the user's token back.
+
+    Attributes:
+    backend: The token bucket backend.
+    generation_states (set[str]): FSM states in which a message starts a generation.
+    cancel_texts (set[str]): Message texts that cancel a generation state and are always cheap.
+    """
+
+    def __init__(self, backend, generation_states: set[str], cancel_texts: set[str] = frozenset()):
+        self.backend = backend
+        self.generation_states = generation_states
+        self.cancel_texts = cancel_texts
+
+    def _get_command_class(self, event: TelegramObject, data: dict[str, Any]) -> str:
+        """
+        Classify an update by its cost.
+
+        Args:
+        event (TelegramObject): The update event.
+        data (dict[str, Any]): The handler data.
+
+        Returns:
+        str: 'generation' or 'cheap'.
+        """
+        if (
+                isinstance(event, Message) and data.get('raw_state') in self.generation_states
+                and event.text not in self.cancel_texts
+        ):
+            return 'generation'
+        return 'cheap'
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        command_class = self._get_command_class(event, data)
+        key, limit = f'{command_class}:{user.id}', cf.rate_limit[command_class]
+        if not await self.backend.consume(key, limit['rate'], limit['capacity']):
+            rate_limit_rejected.inc(scope='user', command_class=command_class)
+            await self._reject(event)
+            return
+
+        if command_class == 'generation':
+            global_limit = cf.rate_limit['global_generation']
+            if not await self.backend.consume('global_generation', global_limit['rate'], global_limit['capacity']):
+                # The prompt is not handled, so it does not count against the user
+                await self.backend.refund(key, limit['rate'], limit['capacity'])
+                rate_limit_rejected.inc(scope='global', command_class=command_class)
+                await self._reject(event)
+                return
+
+        return await handler(event, data)
+
+    @staticmethod
+    async def _reject(event: TelegramObject):
+        """
+        Tell the user the update was throttled.
+
+        Args:
+        event (TelegramObject): The rejected update event.
+        """
+        if isinstance(event, (Message, CallbackQuery)):
+            await event.answer(text=strs.rate_limit_msg)
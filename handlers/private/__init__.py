@@ -1,14 +1,39 @@
 # Third-party
 from aiogram import Router
 
+# Project
+from database import db
+from handlers.middlewares import HandlerMetricsMiddleware, RateLimitMiddleware, ReadinessMiddleware
+from throttling import rate_limit_backend
+
 # Routers
 from .basic import basic_router
-from .dalle import dalle_router
+from .dalle import dalle_router, PromptState
 from .settings import settings_router
+from .history import history_router
 
 private_router = Router()
 sub_routers = [
-    basic_router, dalle_router, settings_router
+    basic_router, dalle_router, settings_router, history_router
 ]
 
 private_router.include_routers(*sub_routers)
+
+# Measure handler latency per router
+for name, router in {
+    'basic_router': basic_router, 'dalle_router': dalle_router, 'settings_router': settings_router,
+    'history_router': history_router,
+}.items():
+    router.message.middleware(HandlerMetricsMiddleware(router_name=name, event='message'))
+    router.callback_query.middleware(HandlerMetricsMiddleware(router_name=name, event='callback_query'))
+
+# Hold updates off until the database is connected, then throttle users before any handler runs
+readiness_middleware = ReadinessMiddleware(ready=db.ready)
+private_router.message.outer_middleware(readiness_middleware)
+private_router.callback_query.outer_middleware(readiness_middleware)
+
+rate_limit_middleware = RateLimitMiddleware(
+    backend=rate_limit_backend, generation_states={PromptState.get_prompt.state}, cancel_texts={'Отмена ❌'}
+)
+private_router.message.outer_middleware(rate_limit_middleware)
+private_router.callback_query.outer_middleware(rate_limit_middleware)
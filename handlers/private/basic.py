@@ -35,6 +35,7 @@ async def handle_start_command(message: Message, state: FSMContext):
     user = await db.users.get_by_id(user_id=message.chat.id)
     if not user:
         await db.users.insert(user=UserModel.create(user_id=message.chat.id, name=message.from_user.full_name))
+        await db.stats.record_new_user()
 
     await message.answer(text=strs.start_msg)
 
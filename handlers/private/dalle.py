@@ -1,16 +1,27 @@
 # Third-party
-from aiogram import Router, F
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.keyboard import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, InputMediaPhoto, InputFile, FSInputFile
 
 # Project
-from database import db, SettingsModel
+import config as cf
+from bot import bot
+from database import db, SettingsModel, GenerationModel, GenerationStatus
+from jobs import JobQueue
 from logger import bot_logger
 from resources import strs
-from gpt import send_dalle
+from gpt import iter_dalle
+from generation import generation_scheduler
+from image_cache import image_cache
+from metrics import image_pipeline_latency
+
+# Standard
+from time import monotonic, perf_counter
 
 # __router__ !DO NOT DELETE!
 dalle_router = Router()
@@ -51,6 +62,12 @@ async def handle_decline_message(message: Message, state: FSMContext):
         reply_markup=ReplyKeyboardRemove())
 
 
+class GenerateAcceptCallback(CallbackData, prefix='generate_accept_btn'):
+    """
+    Callback data of the button confirming the generation settings.
+    """
+
+
 async def get_generate_options_inline_keyboard() -> InlineKeyboardMarkup:
     """
     Creates an inline keyboard markup for generating images options.
@@ -58,26 +75,70 @@ async def get_generate_options_inline_keyboard() -> InlineKeyboardMarkup:
     :return: An instance of InlineKeyboardMarkup with options related to image generation.
     """
     button_list = [
-        [InlineKeyboardButton(text='Продолжить ✅', callback_data=f'generate_accept_btn')]
+        [InlineKeyboardButton(text='Продолжить ✅', callback_data=GenerateAcceptCallback().pack())]
     ]
+    return InlineKeyboardMarkup(inline_keyboard=button_list)
+
+
+class ResendCallback(CallbackData, prefix='resend'):
+    """
+    Callback data of the button resending the images of a generation.
+
+    Attributes:
+        generation_id (int): The ID of the generation to resend.
+    """
+    generation_id: int
 
-    @dalle_router.callback_query(F.data.startswith('generate_accept_btn'))
-    async def handle_accept_button_callback(callback: CallbackQuery, state: FSMContext):
-        """
-        Processes the acceptance of image generation by the user.
 
-        :param callback: CallbackQuery object representing the callback trigger.
-        :param state: FSM context for managing user states.
-        """
-        bot_logger.info(f'Handling generate_options accept button callback from user {callback.message.chat.id}')
-        await callback.message.answer(text=strs.send_prompt_msg, reply_markup=await get_decline_keyboard())
-        await state.set_state(PromptState.get_prompt.state)
-        await callback.message.edit_text(text=callback.message.html_text, reply_markup=None)
-        await callback.answer()
+async def get_resend_inline_keyboard(generation: GenerationModel) -> InlineKeyboardMarkup:
+    """
+    Creates an inline keyboard markup for resending the images of a generation.
 
+    :param generation: The generation to resend.
+    :return: An instance of InlineKeyboardMarkup with the resend button.
+    """
+    button_list = [
+        [InlineKeyboardButton(
+            text='Отправить снова 🔁', callback_data=ResendCallback(generation_id=generation.id).pack()
+        )]
+    ]
     return InlineKeyboardMarkup(inline_keyboard=button_list)
 
 
+@dalle_router.callback_query(ResendCallback.filter())
+async def handle_resend_button_callback(callback: CallbackQuery, callback_data: ResendCallback, state: FSMContext):
+    """
+    Resends the images of a generation by their Telegram file IDs.
+
+    :param callback: CallbackQuery object representing the callback trigger.
+    :param callback_data: The parsed resend button data.
+    :param state: FSM context for managing user states.
+    """
+    bot_logger.info(f'Handling resend button callback from user {callback.message.chat.id}')
+    generation = await db.generations.get_by_id(generation_id=callback_data.generation_id)
+    if not generation or generation.user_id != callback.message.chat.id or not generation.file_ids:
+        await callback.answer(text=strs.generation_not_found_msg, show_alert=True)
+        return
+
+    await send_generated_images(callback.bot, callback.message.chat.id, generation.file_ids)
+    await callback.answer()
+
+
+@dalle_router.callback_query(GenerateAcceptCallback.filter())
+async def handle_accept_button_callback(callback: CallbackQuery, state: FSMContext):
+    """
+    Processes the acceptance of image generation by the user.
+
+    :param callback: CallbackQuery object representing the callback trigger.
+    :param state: FSM context for managing user states.
+    """
+    bot_logger.info(f'Handling generate_options accept button callback from user {callback.message.chat.id}')
+    await callback.message.answer(text=strs.send_prompt_msg, reply_markup=await get_decline_keyboard())
+    await state.set_state(PromptState.get_prompt.state)
+    await callback.message.edit_text(text=callback.message.html_text, reply_markup=None)
+    await callback.answer()
+
+
 # __chat__ !DO NOT DELETE!
 async def _make_up_user_status_msg(settings: SettingsModel) -> str:
     """
@@ -133,61 +194,299 @@ async def handle_get_prompt_state(message: Message, state: FSMContext):
 
 async def process_prompt_input(message: Message, wait_msg: Message, prompt: str):
     """
-    Process the prompt input from the user, generate images, and send them to the user.
+    Store the generation request as a job and hand it to the background workers.
 
     :param message: Telegram message received from the user.
     :param wait_msg: Wait message displayed to the user while processing.
     :param prompt: Prompt text to generate images from.
     """
     user = await db.users.get_by_id(user_id=message.chat.id)
-    response = await send_dalle(
-        prompt=prompt, size=user.settings.size,
-        model=user.settings.model, quantity=user.settings.quantity
+    if not user:
+        await wait_msg.edit_text(text=strs.inner_error_msg)
+        return
+
+    settings = user.settings
+    generation = await db.generations.insert(GenerationModel.create(
+        user_id=message.chat.id, prompt=prompt, model=settings.model,
+        size=settings.size, quantity=settings.quantity, wait_message_id=wait_msg.message_id
+    ))
+    generation_jobs.enqueue(generation.id)
+
+
+async def run_generation_job(generation_id: int):
+    """
+    Generate the images of a queued generation and deliver them to the user.
+
+    Repeated requests are served from the image cache without calling OpenAI. A job interrupted by a restart
+    keeps the images it already delivered and only generates the missing ones.
+
+    :param generation_id: The ID of the generation to run.
+    """
+    generation = await db.generations.get_by_id(generation_id=generation_id)
+    if not generation or generation.status not in (GenerationStatus.QUEUED.value, GenerationStatus.RUNNING.value):
+        return
+
+    started_at = monotonic()
+    chat_id = generation.user_id
+    generation.status = GenerationStatus.RUNNING.value
+    await db.generations.update(generation)
+
+    key = image_cache.make_key(
+        prompt=generation.prompt, model=generation.model, size=generation.size, quantity=generation.quantity
+    )
+    file_ids = list(generation.file_ids or [])
+    if file_ids:
+        bot_logger.info(
+            f'Generation {generation.id} is resumed', delivered=len(file_ids), quantity=generation.quantity
+        )
+    else:
+        file_ids = await send_cached_images(bot, chat_id, key)
+    if len(file_ids) < generation.quantity:
+        file_ids = await generate_images(generation, key)
+
+    await _delete_wait_message(generation)
+    generation.file_ids = file_ids
+    generation.status = GenerationStatus.DONE.value if file_ids else GenerationStatus.FAILED.value
+    generation.latency = monotonic() - started_at
+    await db.generations.update(generation)
+
+    if file_ids:
+        await bot.send_message(
+            chat_id=chat_id, text=strs.generation_done_msg,
+            reply_markup=await get_resend_inline_keyboard(generation=generation)
+        )
+
+    try:
+        await db.stats.record_generation(generation)
+    except Exception as e:
+        # Rollups are rebuilt by db.stats.refresh, a missed increment must not fail the job
+        bot_logger.warning(f'Failed to record generation {generation.id} in the rollups: {e}')
+
+
+async def generate_images(generation: GenerationModel, key: str) -> list[str]:
+    """
+    Request the images from OpenAI, send them to the user and cache them.
+
+    Models accepting a single image per request are asked in concurrent requests sharing the scheduler,
+    and the images of every request are sent as soon as it completes. The file IDs of the sent images are
+    stored after every request, so a job resumed after a restart neither resends nor pays for them again.
+
+    :param generation: The generation to run, with the file IDs of the images delivered before a restart.
+    :param key: The image cache key of the request.
+    :return: Telegram file IDs of all delivered images, empty if the generation failed.
+    """
+    chat_id = generation.user_id
+    reported = False
+
+    async def report_queue_position(position: int):
+        nonlocal reported
+        if reported:
+            return
+        reported = True
+        await bot.edit_message_text(
+            text=strs.queue_position_msg.format(position=position),
+            chat_id=chat_id, message_id=generation.wait_message_id
+        )
+
+    async def report_generating():
+        # The slot is granted, the queue position shown to the user is stale now
+        nonlocal reported
+        if not reported:
+            return
+        reported = False
+        try:
+            await bot.edit_message_text(
+                text=strs.generating_msg, chat_id=chat_id, message_id=generation.wait_message_id
+            )
+        except Exception as e:
+            bot_logger.warning(f'Failed to restore the wait message of user {chat_id}: {e}')
+
+    async def submit(job):
+        async def run():
+            await report_generating()
+            return await job()
+
+        return await generation_scheduler.submit(
+            user_id=chat_id, job=run, group=generation.id,
+            on_queued=report_queue_position if generation.wait_message_id else None
+        )
+
+    file_ids, images, downloaded = list(generation.file_ids or []), [], []
+    try:
+        async for response in iter_dalle(
+                prompt=generation.prompt, size=generation.size,
+                model=generation.model, quantity=generation.quantity - len(file_ids), submit=submit
+        ):
+            urls = [image.get('url', '') for image in response['data']]
+            sent, downloads = await deliver_generated_images(bot, chat_id, urls)
+            file_ids.extend(sent)
+            downloaded.extend(downloads or [])
+            if sent and downloads:
+                images.extend(downloads)
+            if sent:
+                # Checkpoint of the delivered images
+                generation.file_ids = list(file_ids)
+                await db.generations.update(generation)
+    except Exception as e:
+        bot_logger.error(f'Generation {generation.id} failed for user {chat_id}: {e}')
+        await image_cache.discard(downloaded)
+        await bot.send_message(chat_id=chat_id, text=strs.inner_error_msg)
+        return []
+
+    if len(images) == generation.quantity:
+        await image_cache.add(key=key, images=images, file_ids=file_ids)
+        return file_ids
+
+    # Incomplete and resumed results are not cached, the next identical request generates them again
+    await image_cache.discard(downloaded)
+    if 0 < len(file_ids) < generation.quantity:
+        await bot.send_message(
+            chat_id=chat_id, text=strs.generation_partial_msg.format(sent=len(file_ids), quantity=generation.quantity)
+        )
+    return file_ids
+
+
+async def _delete_wait_message(generation: GenerationModel):
+    """
+    Delete the wait message of a generation, it may already be gone after a restart.
+
+    :param generation: The finished generation.
+    """
+    if not generation.wait_message_id:
+        return
+    try:
+        await bot.delete_message(chat_id=generation.user_id, message_id=generation.wait_message_id)
+    except TelegramBadRequest:
+        pass
+    generation.wait_message_id = None
+
+
+async def send_cached_images(bot: Bot, chat_id: int, key: str) -> list[str]:
+    """
+    Send a cached generation result, by Telegram file IDs when known or from the stored files otherwise.
+
+    :param bot: The bot instance.
+    :param chat_id: The chat to send the images to.
+    :param key: The image cache key of the request.
+    :return: Telegram file IDs of the sent images, empty if the request has to be generated.
+    """
+    cached = await image_cache.get(key)
+    if not cached:
+        return []
+
+    images = cached.file_ids or [FSInputFile(image_cache.image_path(digest)) for digest in cached.images]
+    try:
+        file_ids = await _send_images(bot, chat_id, images)
+    except Exception as e:
+        bot_logger.warning(f'Failed to send cached images {key}: {e}')
+        return []
+
+    if not cached.file_ids:
+        await image_cache.set_file_ids(key=key, file_ids=file_ids)
+    bot_logger.info(f'Served cached images {key} to user {chat_id}')
+    return file_ids
+
+
+async def deliver_generated_images(
+        bot: Bot, chat_id: int, urls: list[str]
+) -> tuple[list[str], list[tuple[str, int]] | None]:
+    """
+    Stream generated images through the image cache storage to the user.
+
+    Every image is downloaded once, in chunks, into the cache storage and uploaded from the stored file,
+    so no image is held in memory as a whole. Telegram fetches the URLs itself if the download fails.
+
+    :param bot: The bot instance.
+    :param chat_id: The chat to send the images to.
+    :param urls: The image URLs returned by OpenAI.
+    :return: Telegram file IDs of the sent images, empty if sending failed,
+        and the stored images to cache, None if the download failed.
+    """
+    started_at = perf_counter()
+    downloads = await image_cache.download(urls)
+    downloaded_at = perf_counter()
+    image_pipeline_latency.observe(downloaded_at - started_at, stage='download')
+    if downloads is None:
+        return await send_generated_images(bot, chat_id, urls), None
+
+    images = [
+        FSInputFile(image_cache.image_path(digest), chunk_size=cf.image_cache['chunk_size'])
+        for digest, _ in downloads
+    ]
+    file_ids = await send_generated_images(bot, chat_id, images)
+    uploaded_at = perf_counter()
+    image_pipeline_latency.observe(uploaded_at - downloaded_at, stage='upload')
+
+    bot_logger.info(
+        f'Delivered {len(images)} images to user {chat_id}',
+        download=round(downloaded_at - started_at, 3), upload=round(uploaded_at - downloaded_at, 3)
     )
-    await send_generated_images(message, response)
-    await wait_msg.delete()
+    return file_ids, downloads
 
 
-async def send_generated_images(message: Message, response: dict):
+async def send_generated_images(bot: Bot, chat_id: int, images: list[str | InputFile]) -> list[str]:
     """
-    Send generated images to the user based on the response data received.
+    Send generated images to the user.
 
-    :param message: Telegram message object.
-    :param response: Dictionary containing the response data from image generation.
+    :param bot: The bot instance.
+    :param chat_id: The chat to send the images to.
+    :param images: Image URLs, Telegram file IDs or files to send.
+    :return: Telegram file IDs of the sent images, empty if sending failed.
     """
-    image_list = response['data']
     try:
-        if len(image_list) > 1:
-            await send_image_group(message, image_list)
-        else:
-            await send_single_image(message, response['data'][0].get('url', ''))
+        return await _send_images(bot, chat_id, images)
     except Exception as e:
         bot_logger.error(e)
-        await message.answer(text=strs.inner_error_msg)
+        await bot.send_message(chat_id=chat_id, text=strs.inner_error_msg)
+        return []
+
+
+async def _send_images(bot: Bot, chat_id: int, images: list[str | InputFile]) -> list[str]:
+    """
+    Send images as a single photo or a media group.
+
+    :param bot: The bot instance.
+    :param chat_id: The chat to send the images to.
+    :param images: Image URLs, Telegram file IDs or files to send.
+    :return: Telegram file IDs of the sent images.
+    """
+    if len(images) > 1:
+        return await send_image_group(bot, chat_id, images)
+    return [await send_single_image(bot, chat_id, images[0])]
 
 
-async def send_image_group(message: Message, image_list: list):
+async def send_image_group(bot: Bot, chat_id: int, images: list[str | InputFile]) -> list[str]:
     """
     Send a group of generated images in a media group to the user.
 
-    :param message: Telegram message object.
-    :param image_list: List of images to be sent in a group.
+    :param bot: The bot instance.
+    :param chat_id: The chat to send the images to.
+    :param images: Images to be sent in a group.
+    :return: Telegram file IDs of the sent images.
     """
-    media_group = [InputMediaPhoto(media=image.get('url', '')) for image in image_list]
-    await message.bot.send_media_group(
-        chat_id=message.chat.id,
+    media_group = [InputMediaPhoto(media=image) for image in images]
+    sent_messages = await bot.send_media_group(
+        chat_id=chat_id,
         media=media_group,
     )
+    return [sent_message.photo[-1].file_id for sent_message in sent_messages]
 
 
-async def send_single_image(message: Message, image_url: str):
+async def send_single_image(bot: Bot, chat_id: int, image: str | InputFile) -> str:
     """
     Send a single generated image to the user.
 
-    :param message: Telegram message object.
-    :param image_url: URL of the image to be sent.
+    :param bot: The bot instance.
+    :param chat_id: The chat to send the images to.
+    :param image: URL, Telegram file ID or file of the image to be sent.
+    :return: Telegram file ID of the sent image.
     """
-    await message.bot.send_photo(
-        chat_id=message.chat.id,
-        photo=image_url
+    sent_message = await bot.send_photo(
+        chat_id=chat_id,
+        photo=image
     )
+    return sent_message.photo[-1].file_id
+
+
+# Background workers running the generation jobs
+generation_jobs = JobQueue(name='generation', handler=run_generation_job, workers=cf.generation['workers'])
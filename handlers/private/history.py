@@ -0,0 +1,162 @@
+# Third-party
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.context import FSMContext
+from aiogram.utils.keyboard import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery
+
+# Project
+from database import db, GenerationModel
+from logger import bot_logger
+from resources import strs
+from .dalle import ResendCallback
+
+# Standard
+from datetime import datetime, timedelta
+from html import escape
+
+# __router__ !DO NOT DELETE!
+history_router = Router()
+
+PAGE_SIZE = 5
+_EPOCH = datetime(1970, 1, 1)
+
+
+# __states__ !DO NOT DELETE!
+
+
+# __buttons__ !DO NOT DELETE!
+class HistoryCallback(CallbackData, prefix='history'):
+    """
+    Callback data of the history navigation buttons.
+
+    The cursor is the (created_at, id) of the last generation shown in the navigation direction,
+    created_at is encoded as microseconds since the epoch to fit the callback data.
+
+    Attributes:
+        newer (bool): Whether to show the page newer than the cursor.
+        cursor_us (int): created_at of the cursor generation in microseconds.
+        cursor_id (int): ID of the cursor generation.
+    """
+    newer: bool
+    cursor_us: int
+    cursor_id: int
+
+
+def _to_cursor(generation: GenerationModel) -> tuple[int, int]:
+    """
+    Encode the keyset cursor of a generation.
+
+    :param generation: The generation.
+    :return: created_at in microseconds since the epoch and the ID.
+    """
+    return (generation.created_at - _EPOCH) // timedelta(microseconds=1), generation.id
+
+
+def _from_cursor(callback_data: HistoryCallback) -> tuple[datetime, int]:
+    """
+    Decode the keyset cursor of the callback data.
+
+    :param callback_data: The parsed navigation button data.
+    :return: created_at and the ID of the cursor generation.
+    """
+    return _EPOCH + timedelta(microseconds=callback_data.cursor_us), callback_data.cursor_id
+
+
+async def get_history_inline_keyboard(
+        generations: list[GenerationModel], has_newer: bool, has_older: bool
+) -> InlineKeyboardMarkup:
+    """
+    Get the inline keyboard of a history page.
+
+    :param generations: The generations on the page, newest first.
+    :param has_newer: Whether a newer page exists.
+    :param has_older: Whether an older page exists.
+
+    :return: The Inline Keyboard Markup.
+    """
+    button_list = [[
+        InlineKeyboardButton(
+            text=f'🖼️ {number}', callback_data=ResendCallback(generation_id=generation.id).pack()
+        ) for number, generation in enumerate(generations, start=1)
+    ]]
+
+    navigation = []
+    if has_newer:
+        cursor_us, cursor_id = _to_cursor(generations[0])
+        navigation.append(InlineKeyboardButton(text='⬅️ Новее', callback_data=HistoryCallback(
+            newer=True, cursor_us=cursor_us, cursor_id=cursor_id
+        ).pack()))
+    if has_older:
+        cursor_us, cursor_id = _to_cursor(generations[-1])
+        navigation.append(InlineKeyboardButton(text='Старее ➡️', callback_data=HistoryCallback(
+            newer=False, cursor_us=cursor_us, cursor_id=cursor_id
+        ).pack()))
+    if navigation:
+        button_list.append(navigation)
+    return InlineKeyboardMarkup(inline_keyboard=button_list)
+
+
+async def _make_up_history_page(
+        user_id: int, cursor: tuple[datetime, int] | None = None, newer: bool = False
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """
+    Compose a history page.
+
+    :param user_id: The user ID.
+    :param cursor: The (created_at, id) the page starts after, None for the newest page.
+    :param newer: Whether to show the page newer than the cursor.
+
+    :return: The message text and keyboard.
+    """
+    generations = await db.generations.get_history(user_id=user_id, limit=PAGE_SIZE, cursor=cursor, newer=newer)
+    has_more = len(generations) > PAGE_SIZE
+    generations = generations[:PAGE_SIZE]
+    if newer:
+        generations.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = cursor is not None, has_more
+
+    if not generations:
+        return strs.history_empty_msg, None
+
+    text = strs.history_msg + '\n\n'.join(
+        f'<b>{number}.</b> {generation.created_at:%d.%m.%Y %H:%M} — '
+        f'{generation.model}, {generation.size}, {generation.quantity} шт.\n'
+        f'<i>{escape(generation.prompt[:200])}</i>'
+        for number, generation in enumerate(generations, start=1)
+    )
+    return text, await get_history_inline_keyboard(generations, has_newer=has_newer, has_older=has_older)
+
+
+@history_router.callback_query(HistoryCallback.filter())
+async def handle_history_button_callback(callback: CallbackQuery, callback_data: HistoryCallback, state: FSMContext):
+    """
+    Handle history navigation button callbacks.
+
+    :param callback: The Callback Query object.
+    :param callback_data: The parsed navigation button data.
+    :param state: The FSM Context.
+    """
+    bot_logger.info(f'Handling history callback from user {callback.message.chat.id}')
+    text, keyboard = await _make_up_history_page(
+        user_id=callback.message.chat.id, cursor=_from_cursor(callback_data), newer=callback_data.newer
+    )
+    await callback.message.edit_text(text=text, reply_markup=keyboard)
+    await callback.answer()
+
+
+# __chat__ !DO NOT DELETE!
+@history_router.message(Command('history'))
+async def handle_history_command(message: Message, state: FSMContext):
+    """
+    Handle the /history command showing the newest generations of the user.
+
+    :param message: The Message object.
+    :param state: The FSM Context.
+    """
+    bot_logger.info(f'Handling command /history from user {message.chat.id}')
+    text, keyboard = await _make_up_history_page(user_id=message.chat.id)
+    await message.answer(text=text, reply_markup=keyboard)
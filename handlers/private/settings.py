@@ -1,18 +1,21 @@
 # Third-party
 from aiogram import Router, F
 from aiogram.filters import Command
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.types import Message, CallbackQuery
 
 # Project
-from database import db, UserModel
+from database import db, SettingsModel
 from logger import bot_logger
 from resources import strs
 from gpt import Model, Size
 
 # Standard
 from enum import Enum
+from typing import Callable
+import functools
 
 # __router__ !DO NOT DELETE!
 settings_router = Router()
@@ -22,255 +25,225 @@ settings_router = Router()
 
 
 # __buttons__ !DO NOT DELETE!
-@settings_router.callback_query(F.data.startswith('close'))
-async def handle_close_button_callback(callback: CallbackQuery, state: FSMContext):
+class SettingsAction(Enum):
     """
-    Handles the close button callback from the user, deleting the message and answering the callback.
+    An enumeration class to define the actions of the settings buttons.
 
-    :param callback: The CallbackQuery object from Telegram.
-    :param state: The FSM context to manage the state of the conversation.
+    Enum Values:
+        SELECT: Changes the pending selection shown in the keyboard.
+        SAVE: Stores the pending selection.
     """
-    bot_logger.info(f'Handling close callback from user {callback.message.chat.id}')
-    await callback.message.delete()
-    await callback.answer()
+    SELECT = 'select'
+    SAVE = 'save'
 
 
-class BackRoutes(Enum):
+class CloseCallback(CallbackData, prefix='close'):
     """
-    An enumeration class to define the back routes for different resources.
-
-    Enum Values:
-        MODEL: Represents the route for models.
-        SIZE: Represents the route for sizes.
+    Callback data of the close button.
     """
-    MODEL = 'models'
-    SIZE = 'sizes'
 
 
-async def _check_user_exists(callback: CallbackQuery) -> UserModel | None:
+class SettingsCallback(CallbackData, prefix='settings'):
     """
-    Checks if the user exists in the database.
-
-    :param callback: The CallbackQuery object from Telegram.
-
-    :return: The user object if exists, None otherwise.
+    Callback data of the settings buttons, it carries the whole pending selection,
+    so no state is kept between the clicks.
+
+    Attributes:
+        action (SettingsAction): What the button does.
+        model (str): The pending model value.
+        size (str): The pending size value.
+        quantity (int): The pending number of images.
     """
-    user = await db.users.get_by_id(user_id=callback.message.chat.id)
-    if not user:
-        await callback.answer(text=strs.inner_error_msg, show_alert=True)
-        return
-    return user
+    action: SettingsAction
+    model: str
+    size: str
+    quantity: int
 
 
-async def _update_user_settings(callback: CallbackQuery, key: str, value: any) -> UserModel | None:
-    """
-    Updates the user settings in the database.
+QUANTITY_LABELS = {
+    1: '1️⃣', 2: '2️⃣', 3: '3️⃣', 4: '4️⃣', 5: '5️⃣', 6: '6️⃣'
+}
+
+MODEL_SIZES = {
+    Model.DALLE_2.value: [Size.S_256.value, Size.S_512.value, Size.S_1024.value],
+    Model.DALLE_3.value: [Size.S_1024.value, Size.S_1024_x_1792.value, Size.S_1792_x_1024.value],
+}
 
-    :param callback: The CallbackQuery object from Telegram.
-    :param key: The key to update in the user settings.
-    :param value: The new value to set for the key.
 
-    :return: The updated user object if successful, None otherwise.
+def _is_valid_selection(model: str, size: str, quantity: int) -> bool:
     """
-    user = await _check_user_exists(callback=callback)
+    Checks that a selection received from a button is one the bot offers.
 
-    setattr(user.settings, key, value)
-    await db.settings.update(user.settings)
+    :param model: The model value.
+    :param size: The size value.
+    :param quantity: The number of images.
 
-    return user
+    :return: True if the selection is valid.
+    """
+    return size in MODEL_SIZES.get(model, ()) and quantity in QUANTITY_LABELS
 
 
-async def _create_button_list(
-        items: list[any], user_settings_value: any,
-        callback_prefix: str, max_items_per_row: int
+def _create_button_list(
+        items: dict[any, str], user_settings_value: any,
+        callback_data_factory: Callable[[any], CallbackData], max_items_per_row: int
 ) -> list:
     """
     Creates a list of inline buttons for the user settings.
 
-    :param items: The list of items to create buttons for.
+    :param items: The mapping of setting values to button labels.
     :param user_settings_value: The current value of the user setting.
-    :param callback_prefix: The prefix for the callback data.
+    :param callback_data_factory: Builds the callback data for a setting value.
     :param max_items_per_row: The maximum number of items per row for buttons.
 
     :return: The list of inline buttons.
     """
     button_list = []
     row = []
-    for item in items:
+    for value, label in items.items():
         if len(row) == max_items_per_row:
             button_list.append(row)
             row = []
-        if isinstance(item, Enum):
-            text = item.value if item.value != user_settings_value else item.value + ' ' + '✔️'
-            callback_data = item.value
-        else:
-            text = item if item != user_settings_value else item + ' ' + '✔️'
-            callback_data = item
-        row.append(InlineKeyboardButton(text=text, callback_data=f'{callback_prefix} {callback_data}'))
+        text = label if value != user_settings_value else label + ' ' + '✔️'
+        row.append(InlineKeyboardButton(text=text, callback_data=callback_data_factory(value).pack()))
     button_list.append(row)
     return button_list
 
 
-async def _get_back_close_buttons(back_to: BackRoutes | None = None, show_back_to: bool = True) -> list:
+# Keyboards only depend on the pending selection, so every variant is built once and shared.
+# The cache is bounded because the selection comes from the stored settings.
+@functools.lru_cache(maxsize=64)
+def _build_settings_keyboard(model: str, size: str, quantity: int) -> InlineKeyboardMarkup:
     """
-    Gets the back and close inline buttons.
+    Build the settings keyboard: a row of models, a row of sizes of the model, the quantities,
+    and the save and close buttons.
 
-    :param back_to: The route to go back to.
-    :param show_back_to: Boolean value to indicate whether to show the back button or not.
-    :return: The list of back and close inline buttons.
+    :param model: The pending model.
+    :param size: The pending size.
+    :param quantity: The pending quantity.
+
+    :return: The Inline Keyboard Markup.
     """
-    button_list = [[InlineKeyboardButton(text='Закрыть ❌', callback_data='close')]]
-    if show_back_to:
-        button_list.insert(0, [InlineKeyboardButton(text='⬅️ Назад', callback_data=f'back_to {back_to.value}')])
-    return button_list
+    def select(**changes) -> SettingsCallback:
+        selection = {'model': model, 'size': size, 'quantity': quantity, **changes}
+        if selection['size'] not in MODEL_SIZES[selection['model']]:
+            selection['size'] = MODEL_SIZES[selection['model']][0]
+        return SettingsCallback(action=SettingsAction.SELECT, **selection)
+
+    button_list = _create_button_list(
+        items={value: value for value in MODEL_SIZES}, user_settings_value=model,
+        callback_data_factory=lambda value: select(model=value), max_items_per_row=2
+    )
+    button_list += _create_button_list(
+        items={value: value for value in MODEL_SIZES[model]}, user_settings_value=size,
+        callback_data_factory=lambda value: select(size=value), max_items_per_row=3
+    )
+    button_list += _create_button_list(
+        items=QUANTITY_LABELS, user_settings_value=quantity,
+        callback_data_factory=lambda value: select(quantity=value), max_items_per_row=3
+    )
+    button_list.append([
+        InlineKeyboardButton(text='Сохранить ✅', callback_data=SettingsCallback(
+            action=SettingsAction.SAVE, model=model, size=size, quantity=quantity
+        ).pack()),
+        InlineKeyboardButton(text='Закрыть ❌', callback_data=CloseCallback().pack()),
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=button_list)
 
 
-@settings_router.callback_query(F.data.startswith('back_to'))
-async def handle_back_to_button_callback(callback: CallbackQuery, state: FSMContext):
+def _precompute_keyboards():
     """
-    Handle back_to button callbacks to go back to previous settings.
-
-    :param callback: The Callback Query object.
-    :param state: The FSM Context.
+    Build every keyboard variant of the valid selections.
     """
-    bot_logger.info(f'Handling back_to callback from user {callback.message.chat.id}')
-    data = callback.data.split()
-    route = data[1]
-
-    user = await _check_user_exists(callback=callback)
-
-    text, keyboard = '', None
-    match route:
-        case BackRoutes.MODEL.value:
-            text, keyboard = strs.choose_model_msg, await get_choose_model_inline_keyboard(user=user)
-        case BackRoutes.SIZE.value:
-            text, keyboard = strs.choose_size_msg, await get_choose_size_inline_keyboard(
-                user=user, model=user.settings.model
-            )
-
-    await callback.message.edit_text(text=text, reply_markup=keyboard)
-    await callback.answer()
+    for model, sizes in MODEL_SIZES.items():
+        for size in sizes:
+            for quantity in QUANTITY_LABELS:
+                _build_settings_keyboard(model, size, quantity)
 
 
-async def get_choose_quantity_keyboard(user: UserModel) -> InlineKeyboardMarkup:
+async def get_settings_inline_keyboard(settings: SettingsModel) -> InlineKeyboardMarkup:
     """
-    Get the inline keyboard for choosing quantity.
+    Get the settings keyboard of the stored settings.
 
-    :param user: The User Model object.
+    :param settings: The settings of the user.
 
     :return: The Inline Keyboard Markup.
     """
-    nums = {
-        1: '1️⃣', 2: '2️⃣', 3: '3️⃣', 4: '4️⃣', 5: '5️⃣', 6: '6️⃣'
-    }
-    button_list = await _create_button_list(
-        items=[nums[i] for i in range(1, 6 + 1)], user_settings_value=nums[user.settings.quantity],
-        callback_prefix='choose_quantity', max_items_per_row=3
-    )
-    button_list += await _get_back_close_buttons(back_to=BackRoutes.SIZE)
-
-    @settings_router.callback_query(F.data.startswith('choose_quantity'))
-    async def handle_choose_quantity_button_callback(callback: CallbackQuery, state: FSMContext):
-        """
-        Handle choose quantity button callbacks.
-
-        :param callback: The Callback Query object.
-        :param state: The FSM Context.
-        """
-        bot_logger.info(f'Handling choose_quantity a button callback from user {callback.message.chat.id}')
-        data = callback.data.split()
-        quantity = [key for key in nums.keys() if nums[key] == data[1]][0]
+    model = settings.model if settings.model in MODEL_SIZES else Model.DALLE_2.value
+    size = settings.size if settings.size in MODEL_SIZES[model] else MODEL_SIZES[model][0]
+    quantity = settings.quantity if settings.quantity in QUANTITY_LABELS else 1
+    return _build_settings_keyboard(model, size, quantity)
 
-        user = await _update_user_settings(callback=callback, key='quantity', value=quantity)
 
-        await callback.message.edit_text(
-            text=strs.choose_model_msg,
-            reply_markup=await get_choose_model_inline_keyboard(user=user)
-        )
+_precompute_keyboards()
 
-        await callback.answer()
 
-    return InlineKeyboardMarkup(inline_keyboard=button_list)
-
-
-async def get_choose_size_inline_keyboard(user: UserModel, model: str) -> InlineKeyboardMarkup:
+@settings_router.callback_query(CloseCallback.filter())
+async def handle_close_button_callback(callback: CallbackQuery, state: FSMContext):
     """
-      Get the inline keyboard for choosing size.
-
-      :param user: The User Model object.
-      :param model: The selected model.
+    Handles the close button callback from the user, deleting the message and answering the callback.
 
-      :return: The Inline Keyboard Markup.
-      """
-    sizes = [Size.S_256, Size.S_512, Size.S_1024]
-    if model == Model.DALLE_3.value:
-        sizes = [Size.S_1024, Size.S_1024_x_1792, Size.S_1792_x_1024]
+    :param callback: The CallbackQuery object from Telegram.
+    :param state: The FSM context to manage the state of the conversation.
+    """
+    bot_logger.info(f'Handling close callback from user {callback.message.chat.id}')
+    await callback.message.delete()
+    await callback.answer()
 
-    button_list = await _create_button_list(
-        items=sizes, user_settings_value=user.settings.size,
-        callback_prefix='choose_size', max_items_per_row=3
-    )
-    button_list += await _get_back_close_buttons(back_to=BackRoutes.MODEL)
 
-    @settings_router.callback_query(F.data.startswith('choose_size'))
-    async def handle_choose_size_button_callback(callback: CallbackQuery, state: FSMContext):
-        """
-          Handle choose size button callbacks.
+@settings_router.callback_query(SettingsCallback.filter(F.action == SettingsAction.SELECT))
+async def handle_select_button_callback(
+        callback: CallbackQuery, callback_data: SettingsCallback, state: FSMContext
+):
+    """
+    Handle the model, size and quantity buttons by showing the new pending selection.
 
-          :param callback: The Callback Query object.
-          :param state: The FSM Context.
-        """
-        bot_logger.info(f'Handling choose_size a button callback from user {callback.message.chat.id}')
-        data = callback.data.split()
-        size = data[1]
+    Neither the database nor the message text is touched, only the keyboard is replaced.
 
-        user = await _update_user_settings(callback=callback, key='size', value=size)
+    :param callback: The Callback Query object.
+    :param callback_data: The parsed settings button data.
+    :param state: The FSM Context.
+    """
+    bot_logger.info(f'Handling settings select callback from user {callback.message.chat.id}')
 
-        await callback.message.edit_text(
-            text=strs.choose_quantity_msg,
-            reply_markup=await get_choose_quantity_keyboard(user=user))
-        await callback.answer()
+    if not _is_valid_selection(callback_data.model, callback_data.size, callback_data.quantity):
+        await callback.answer(text=strs.inner_error_msg, show_alert=True)
+        return
 
-    return InlineKeyboardMarkup(inline_keyboard=button_list)
+    keyboard = _build_settings_keyboard(callback_data.model, callback_data.size, callback_data.quantity)
+    # Clicking the selected value leaves the keyboard as it is, Telegram rejects such edits
+    if callback.message.reply_markup != keyboard:
+        await callback.message.edit_reply_markup(reply_markup=keyboard)
+    await callback.answer()
 
 
-async def get_choose_model_inline_keyboard(user: UserModel) -> InlineKeyboardMarkup:
+@settings_router.callback_query(SettingsCallback.filter(F.action == SettingsAction.SAVE))
+async def handle_save_button_callback(
+        callback: CallbackQuery, callback_data: SettingsCallback, state: FSMContext
+):
     """
-    Get the inline keyboard for choosing model.
-
-    :param user: The User Model object.
+    Handle the save button by storing the pending selection with a single write.
 
-    :return: The Inline Keyboard Markup.
+    :param callback: The Callback Query object.
+    :param callback_data: The parsed settings button data.
+    :param state: The FSM Context.
     """
-    models = [model.value for model in Model]
-    button_list = await _create_button_list(
-        items=models, user_settings_value=user.settings.model,
-        callback_prefix='choose_model', max_items_per_row=2
-    )
-    button_list += await _get_back_close_buttons(show_back_to=False)
+    bot_logger.info(f'Handling settings save callback from user {callback.message.chat.id}')
 
-    @settings_router.callback_query(F.data.startswith('choose_model'))
-    async def handle_model_button_callback(callback: CallbackQuery, state: FSMContext):
-        """
-        Handle choose model button callbacks.
-
-        :param callback: The Callback Query object.
-        :param state: The FSM Context.
-        """
-        bot_logger.info(f'Handling choose_model model button callback from user {callback.message.chat.id}')
-        data = callback.data.split()
-        model = data[1]
-
-        user = await _update_user_settings(callback=callback, key='model', value=model)
-
-        await callback.message.edit_text(
-            text=strs.choose_size_msg,
-            reply_markup=await get_choose_size_inline_keyboard(
-                user=user, model=user.settings.model
-            ))
-        await callback.answer()
+    if not _is_valid_selection(callback_data.model, callback_data.size, callback_data.quantity):
+        await callback.answer(text=strs.inner_error_msg, show_alert=True)
+        return
 
-    return InlineKeyboardMarkup(inline_keyboard=button_list)
+    await db.settings.update(SettingsModel.create(
+        user_id=callback.message.chat.id, model=callback_data.model,
+        size=callback_data.size, quantity=callback_data.quantity
+    ))
+    await callback.message.edit_text(
+        text=strs.settings_saved_msg.format(
+            model=callback_data.model, size=callback_data.size, quantity=callback_data.quantity
+        ),
+        reply_markup=None
+    )
+    await callback.answer()
 
 
 # __chat__ !DO NOT DELETE!
@@ -290,8 +263,6 @@ async def handle_settings_command(message: Message, state: FSMContext):
         return
 
     await message.answer(
-        text=strs.choose_model_msg,
-        reply_markup=await get_choose_model_inline_keyboard(
-            user=user
-        )
+        text=strs.settings_msg,
+        reply_markup=await get_settings_inline_keyboard(settings=user.settings)
     )
@@ -0,0 +1,427 @@
+# Third-party
+import aiofiles
+import aiohttp
+
+# Standard
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import time
+import asyncio
+import hashlib
+import json
+import os
+
+# Project
+import config as cf
+from logger import storage_logger
+from metrics import Gauge, Counter as MetricCounter
+
+
+@dataclass
+class CachedResult:
+    """
+    A cached generation result.
+
+    Attributes:
+    images (list[str]): SHA-256 digests of the stored image files.
+    file_ids (list[str]): Telegram file IDs of the images, empty until they were sent once.
+    used_at (float): Unix time of the last use, drives LRU eviction.
+    """
+    images: list[str] = field(default_factory=list)
+    file_ids: list[str] = field(default_factory=list)
+    used_at: float = field(default_factory=time)
+
+
+class ImageCache:
+    """
+    Cache of generation results keyed on the normalized request, with content-addressed image files.
+
+    Images are stored once under `<path>/images/<sha[:2]>/<sha>.png` no matter how many results
+    reference them, and the index of results is kept in `<path>/index.json`. Downloaded images are tracked
+    until they are cached by `add` or removed by `discard`, so every file on disk is accounted for.
+
+    Attributes:
+    path (Path): The storage directory.
+    max_bytes (int): Disk budget for image files, least recently used results are evicted first.
+    hits (int): Number of lookups that found a result.
+    misses (int): Number of lookups that did not.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        """
+        Initialize the cache. The index is loaded lazily on first use.
+
+        Args:
+        path (Path): The storage directory.
+        max_bytes (int): Disk budget for image files.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.__index_path = self.path / 'index.json'
+        self.__results: dict[str, CachedResult] | None = None
+        self.__sizes: dict[str, int] = {}
+        self.__downloads: Counter[str] = Counter()
+        self.__lock = asyncio.Lock()
+        self.__session: aiohttp.ClientSession | None = None
+
+    @staticmethod
+    def make_key(prompt: str, model: str, size: str, quantity: int) -> str:
+        """
+        Build the cache key of a generation request.
+
+        The prompt is case-folded and its whitespace collapsed, so trivially different prompts share a result.
+
+        Args:
+        prompt (str): The prompt text.
+        model (str): The model value.
+        size (str): The size value.
+        quantity (int): The number of images.
+
+        Returns:
+        str: The hex SHA-256 digest of the normalized request.
+        """
+        normalized = ' '.join(prompt.split()).casefold()
+        return hashlib.sha256(f'{model}\n{size}\n{quantity}\n{normalized}'.encode()).hexdigest()
+
+    def image_path(self, digest: str) -> Path:
+        """
+        Get the path of a stored image.
+
+        Args:
+        digest (str): The SHA-256 digest of the image.
+
+        Returns:
+        Path: The path of the image file.
+        """
+        return self.path / 'images' / digest[:2] / f'{digest}.png'
+
+    @property
+    def total_bytes(self) -> int:
+        """
+        Size of all stored images in bytes.
+        """
+        return sum(self.__sizes.values())
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+        dict: Number of results and images, stored bytes, hits and misses.
+        """
+        return {
+            'results': len(self.__results or {}),
+            'images': len(self.__sizes),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def __load_index(self):
+        """
+        Read the index and image sizes from disk. Runs in a worker thread.
+        """
+        results = {}
+        if self.__index_path.exists():
+            try:
+                raw = json.loads(self.__index_path.read_text())
+                results = {key: CachedResult(**value) for key, value in raw.items()}
+            except (ValueError, TypeError):
+                storage_logger.error('Image cache index is corrupted, starting with an empty cache')
+
+        sizes = {}
+        for result in results.values():
+            for digest in result.images:
+                path = self.image_path(digest)
+                if path.exists():
+                    sizes[digest] = path.stat().st_size
+        # Drop results whose files were removed by hand
+        self.__results = {key: result for key, result in results.items() if all(d in sizes for d in result.images)}
+        referenced = {digest for result in self.__results.values() for digest in result.images}
+        self.__sizes = {digest: size for digest, size in sizes.items() if digest in referenced}
+
+        # Remove images and partial downloads left by an interrupted generation
+        untracked = [path for path in self.path.glob('images/*/*.png') if path.stem not in self.__sizes]
+        for path in untracked + list(self.path.glob('download-*.tmp')):
+            path.unlink(missing_ok=True)
+        if untracked:
+            storage_logger.warning(f'Removed {len(untracked)} untracked images')
+
+    def __write_index(self, data: str):
+        """
+        Atomically replace the index file. Runs in a worker thread.
+
+        Args:
+        data (str): The serialized index.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.__index_path.with_suffix('.tmp')
+        tmp_path.write_text(data)
+        os.replace(tmp_path, self.__index_path)
+
+    async def __ensure_loaded(self):
+        """
+        Load the index on first use.
+        """
+        if self.__results is None:
+            await asyncio.to_thread(self.__load_index)
+            storage_logger.info(f'Image cache loaded: {self.stats()}')
+
+    async def __save(self):
+        """
+        Persist the index.
+        """
+        data = json.dumps({key: vars(result) for key, result in self.__results.items()})
+        await asyncio.to_thread(self.__write_index, data)
+
+    async def __get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the HTTP session used for downloads, creating it on first use.
+
+        Returns:
+        aiohttp.ClientSession: The shared session, its connections are pooled and kept alive.
+        """
+        if self.__session is None or self.__session.closed:
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=cf.image_cache['download_connections']),
+                timeout=aiohttp.ClientTimeout(total=cf.image_cache['download_timeout'])
+            )
+        return self.__session
+
+    async def __download(self, url: str) -> tuple[str, int]:
+        """
+        Stream an image into content-addressed storage, holding a single chunk in memory.
+
+        Args:
+        url (str): The image URL.
+
+        Returns:
+        tuple[str, int]: The SHA-256 digest and the size in bytes of the image.
+        """
+        session = await self.__get_session()
+        await asyncio.to_thread(self.path.mkdir, parents=True, exist_ok=True)
+        tmp_path = self.path / f'download-{os.urandom(8).hex()}.tmp'
+        digest = hashlib.sha256()
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                async with aiofiles.open(tmp_path, 'wb') as file:
+                    async for chunk in response.content.iter_chunked(cf.image_cache['chunk_size']):
+                        digest.update(chunk)
+                        await file.write(chunk)
+
+            hex_digest = digest.hexdigest()
+            return hex_digest, await asyncio.to_thread(self.__store_download, tmp_path, hex_digest)
+        finally:
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+    def __store_download(self, tmp_path: Path, digest: str) -> int:
+        """
+        Move a finished download to its content-addressed path. Runs in a worker thread.
+
+        Args:
+        tmp_path (Path): The temporary file of the download.
+        digest (str): The SHA-256 digest of the image.
+
+        Returns:
+        int: The size of the stored image in bytes.
+        """
+        path = self.image_path(digest)
+        if path.exists():
+            tmp_path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        return path.stat().st_size
+
+    async def get(self, key: str) -> CachedResult | None:
+        """
+        Look up a cached result and mark it as recently used.
+
+        Args:
+        key (str): The key built by `make_key`.
+
+        Returns:
+        CachedResult | None: The cached result or None on a miss.
+        """
+        async with self.__lock:
+            await self.__ensure_loaded()
+            result = self.__results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            result.used_at = time()
+            return result
+
+    async def download(self, urls: list[str]) -> list[tuple[str, int]] | None:
+        """
+        Download images into the storage concurrently, they are not part of the cache until `add`.
+
+        The caller must pass the images to `add` or `discard`.
+
+        Args:
+        urls (list[str]): The image URLs returned by OpenAI.
+
+        Returns:
+        list[tuple[str, int]] | None: The digests and sizes of the images or None if a download failed.
+        """
+        async with self.__lock:
+            # Loading the index removes untracked files, it must not see the new ones
+            await self.__ensure_loaded()
+        results = await asyncio.gather(*[self.__download(url) for url in urls], return_exceptions=True)
+        images = [result for result in results if not isinstance(result, BaseException)]
+        self.__downloads.update(digest for digest, _ in images)
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await self.discard(images)
+            if not isinstance(errors[0], (aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+                raise errors[0]
+            storage_logger.error(f'Failed to download images: {errors[0]}')
+            return None
+        return images
+
+    def __release(self, images: list[tuple[str, int]]):
+        """
+        Stop tracking downloaded images.
+
+        Args:
+        images (list[tuple[str, int]]): The digests and sizes returned by `download`.
+        """
+        for digest, _ in images:
+            self.__downloads[digest] -= 1
+            if self.__downloads[digest] <= 0:
+                del self.__downloads[digest]
+
+    async def discard(self, images: list[tuple[str, int]]):
+        """
+        Remove downloaded images that will not be cached, e.g. of a partial result.
+
+        Files shared with a cached result or another pending download are kept.
+
+        Args:
+        images (list[tuple[str, int]]): The digests and sizes returned by `download`.
+        """
+        if not images:
+            return
+        async with self.__lock:
+            self.__release(images)
+            unused = {
+                digest for digest, _ in images if digest not in self.__sizes and digest not in self.__downloads
+            }
+            await asyncio.to_thread(self.__remove_files, list(unused))
+        storage_logger.info(f'Discarded {len(unused)} downloaded images')
+
+    async def add(self, key: str, images: list[tuple[str, int]], file_ids: list[str] | None = None) -> CachedResult:
+        """
+        Cache a result of downloaded images.
+
+        Args:
+        key (str): The key built by `make_key`.
+        images (list[tuple[str, int]]): The digests and sizes returned by `download`.
+        file_ids (list[str] | None): Telegram file IDs if the images were already sent.
+
+        Returns:
+        CachedResult: The cached result.
+        """
+        async with self.__lock:
+            await self.__ensure_loaded()
+            self.__release(images)
+            self.__sizes.update(images)
+            result = CachedResult(images=[digest for digest, _ in images], file_ids=list(file_ids or []))
+            self.__results[key] = result
+            await self.__evict()
+            await self.__save()
+        storage_logger.info(f'Cached {len(images)} images for {key}')
+        return result
+
+    async def set_file_ids(self, key: str, file_ids: list[str]):
+        """
+        Record the Telegram file IDs of a cached result.
+
+        Args:
+        key (str): The key built by `make_key`.
+        file_ids (list[str]): The file IDs, in the order of the images.
+        """
+        async with self.__lock:
+            await self.__ensure_loaded()
+            result = self.__results.get(key)
+            if result is not None and file_ids:
+                result.file_ids = list(file_ids)
+                await self.__save()
+
+    async def __evict(self) -> int:
+        """
+        Drop least recently used results until the stored images fit into the disk budget.
+
+        Returns:
+        int: The number of dropped results.
+        """
+        evicted = 0
+        for key in sorted(self.__results, key=lambda k: self.__results[k].used_at):
+            if self.total_bytes <= self.max_bytes:
+                break
+            del self.__results[key]
+            evicted += 1
+            referenced = {digest for result in self.__results.values() for digest in result.images}
+            orphans = [digest for digest in self.__sizes if digest not in referenced]
+            for digest in orphans:
+                del self.__sizes[digest]
+            # Files of pending downloads are still being sent, `discard` removes them if they stay uncached
+            await asyncio.to_thread(
+                self.__remove_files, [digest for digest in orphans if digest not in self.__downloads]
+            )
+        if evicted:
+            storage_logger.warning(f'Evicted {evicted} cached results, {self.total_bytes} bytes stored')
+        return evicted
+
+    def __remove_files(self, digests: list[str]):
+        """
+        Remove image files. Runs in a worker thread.
+
+        Args:
+        digests (list[str]): The digests of the images to remove.
+        """
+        for digest in digests:
+            self.image_path(digest).unlink(missing_ok=True)
+
+    async def prune(self) -> int:
+        """
+        Enforce the disk budget.
+
+        Returns:
+        int: The number of dropped results.
+        """
+        async with self.__lock:
+            await self.__ensure_loaded()
+            evicted = await self.__evict()
+            if evicted:
+                await self.__save()
+            return evicted
+
+    async def close(self):
+        """
+        Close the HTTP session.
+        """
+        if self.__session is not None:
+            await self.__session.close()
+
+
+# Cache of generation results stored in the project storage directory
+image_cache = ImageCache(path=cf.project['storage'], max_bytes=cf.image_cache['max_bytes'])
+
+# Export the image cache size and counters
+Gauge(
+    'image_cache', 'Image cache results, images and stored bytes.', ('stat',),
+    callback=lambda: {(key,): image_cache.stats()[key] for key in ('results', 'images', 'bytes')}
+)
+for _stat in ('hits', 'misses'):
+    MetricCounter(
+        f'image_cache_{_stat}_total', f'Image cache {_stat}.',
+        callback=lambda stat=_stat: {(): image_cache.stats()[stat]}
+    )
@@ -0,0 +1,108 @@
+# Standard
+from typing import Awaitable, Callable
+import asyncio
+
+# Project
+from logger import bot_logger
+from metrics import Gauge
+
+
+class JobQueue:
+    """
+    Worker pool running persisted jobs outside of the update handlers.
+
+    Jobs are identified by the ID of their database record, the record itself is the source of truth,
+    so jobs interrupted by a shutdown can be enqueued again on startup.
+
+    Attributes:
+    name (str): The name of the queue used in logs and metrics.
+    handler (Callable[[int], Awaitable]): Runs a job by its ID.
+    workers (int): Number of jobs run at once.
+    """
+
+    def __init__(self, name: str, handler: Callable[[int], Awaitable], workers: int):
+        """
+        Initialize the queue. Workers are started by `start`.
+
+        Args:
+        name (str): The name of the queue used in logs and metrics.
+        handler (Callable[[int], Awaitable]): Runs a job by its ID.
+        workers (int): Number of jobs run at once.
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.__queue: asyncio.Queue[int] | None = None
+        self.__tasks: list[asyncio.Task] = []
+        self.__active = 0
+
+        Gauge(
+            f'{name}_jobs', f'Pending and active {name} jobs.', ('state',),
+            callback=lambda: {('pending',): self.pending, ('active',): self.__active}
+        )
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of jobs waiting for a worker.
+        """
+        return self.__queue.qsize() if self.__queue else 0
+
+    def enqueue(self, job_id: int):
+        """
+        Schedule a job.
+
+        Args:
+        job_id (int): The ID of the job record.
+        """
+        if self.__queue is None:
+            raise RuntimeError(f'{self.name} job queue is not started')
+        self.__queue.put_nowait(job_id)
+
+    async def __work(self):
+        """
+        Run jobs until cancelled.
+        """
+        while True:
+            job_id = await self.__queue.get()
+            self.__active += 1
+            try:
+                await self.handler(job_id)
+            except Exception as e:
+                bot_logger.error(f'{self.name} job {job_id} failed: {e}')
+            finally:
+                self.__active -= 1
+                self.__queue.task_done()
+
+    async def start(self, job_ids: list[int] = ()):
+        """
+        Start the workers.
+
+        Args:
+        job_ids (list[int]): Jobs left unfinished by a previous run, enqueued first.
+        """
+        self.__queue = asyncio.Queue()
+        for job_id in job_ids:
+            self.__queue.put_nowait(job_id)
+        self.__tasks = [asyncio.create_task(self.__work()) for _ in range(self.workers)]
+        bot_logger.info(f'{self.name} job queue started with {self.workers} workers, {len(job_ids)} jobs resumed')
+
+    async def stop(self, timeout: float):
+        """
+        Wait for the queued jobs to finish and stop the workers.
+
+        Jobs still unfinished after the timeout are cancelled and resumed on the next start.
+
+        Args:
+        timeout (float): Seconds to wait for the jobs.
+        """
+        if self.__queue is None:
+            return
+        try:
+            await asyncio.wait_for(self.__queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            bot_logger.warning(f'{self.name} job queue stopped with {self.pending + self.__active} unfinished jobs')
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
@@ -1,18 +1,73 @@
 # Standard
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from datetime import datetime, timezone
+import atexit
+import json
 import logging
 import os
+import queue
+import random
+import sys
 
 # Project
 import config as cf
 
+# Attributes every LogRecord has, anything else was passed as a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format the record with its structured fields.
+
+        Args:
+        - record: The record to format
+
+        Returns:
+        - JSON line
+        """
+        data = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': f'{record.filename}:{record.lineno}',
+            'message': record.getMessage(),
+        }
+        data.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a share of DEBUG records, records of other levels always pass.
+
+    Attributes:
+    - rate: Share of debug records kept, from 0 to 1
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
 
 class Logger:
     """
-    Class for logging messages to a file and console.
+    Class for logging messages to a rotating JSON file and console.
+
+    Records are put on a queue by the calling code and written by a background listener thread,
+    so logging never blocks the event loop on file or console I/O.
 
     Attributes:
-    - name: Name of the logger
-    - logging_path: Path to the log file
+    - log: The underlying logging.Logger
+    - listener: Thread writing the queued records
     """
 
     def __init__(self, name, logging_path: str):
@@ -23,63 +78,106 @@ class Logger:
         - name: Name of the logger
         - logging_path: Path to the log file
         """
-        self.__logging_path = logging_path
         self.log = logging.getLogger(name)  # Unique logger per instance
-        self.log.setLevel(logging.INFO)
-
-        # Create file handler which logs messages to the specified file
-        file_handler = logging.FileHandler(logging_path)
-        file_handler.setLevel(logging.INFO)
-
-        # Create formatter and add it to the handlers
-        formatter = logging.Formatter('%(asctime)s,%(msecs)d %(levelname)-8s [%(filename)s:%(lineno)d] %(message)s',
-                                      datefmt='%Y-%m-%d:%H:%M:%S')
-        file_handler.setFormatter(formatter)
-
-        # Add the handlers to the logger
-        self.log.addHandler(file_handler)
-
-    def clear_log_file(self):
+        self.log.setLevel(cf.logging['levels'].get(name, cf.logging['level']).upper())
+        self.log.propagate = False
+
+        # Create file handler which rotates the specified file
+        if cf.logging['rotation'] == 'time':
+            file_handler = TimedRotatingFileHandler(
+                logging_path, when=cf.logging['when'], backupCount=cf.logging['backup_count'], encoding='utf-8'
+            )
+        else:
+            file_handler = RotatingFileHandler(
+                logging_path, maxBytes=cf.logging['max_bytes'], backupCount=cf.logging['backup_count'],
+                encoding='utf-8'
+            )
+        file_handler.setFormatter(JsonFormatter())
+        handlers = [file_handler]
+
+        if cf.logging['console']:
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(logging.Formatter('%(message)s'))
+            handlers.append(console_handler)
+
+        # Hand records over to the listener thread
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(rate=cf.logging['debug_sample_rate']))
+        self.log.addHandler(queue_handler)
+
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        _listeners.append(self.listener)
+        _loggers.append(self)
+
+    def rotate(self):
         """
-        Clear the content of the log file by opening it in write mode.
+        Force rotation of the log file unless it is empty.
+        """
+        for handler in self.listener.handlers:
+            if isinstance(handler, (RotatingFileHandler, TimedRotatingFileHandler)):
+                # The listener thread may be writing, the handler lock serializes the rollover with it
+                handler.acquire()
+                try:
+                    if os.path.exists(handler.baseFilename) and os.path.getsize(handler.baseFilename):
+                        handler.doRollover()
+                finally:
+                    handler.release()
+
+    def debug(self, msg: str, /, **fields):
+        """
+        Log a debug message, only a sampled share of debug messages is kept.
 
-        Returns:
-        - Empty string if successful
+        Args:
+        - msg: Message to log
+        - fields: Structured fields added to the record
         """
-        if self.__logging_path:
-            with open(self.__logging_path, "w") as f:
-                f.write("")
-            return ""
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(msg, extra=_extra(fields), stacklevel=2)
 
-    def info(self, msg: str):
+    def info(self, msg: str, /, **fields):
         """
-        Log an info message and print it to the console.
+        Log an info message.
 
         Args:
         - msg: Message to log
+        - fields: Structured fields added to the record
         """
-        print(msg)  # Show in console
-        self.log.info(msg)
+        self.log.info(msg, extra=_extra(fields), stacklevel=2)
 
-    def warning(self, msg: str):
+    def warning(self, msg: str, /, **fields):
         """
-        Log a warning message and print it to the console.
+        Log a warning message.
 
         Args:
         - msg: Message to log
+        - fields: Structured fields added to the record
         """
-        print(msg)  # Show in console
-        self.log.warning(msg)
+        self.log.warning(msg, extra=_extra(fields), stacklevel=2)
 
-    def error(self, msg: str):
+    def error(self, msg: str, /, **fields):
         """
-        Log an error message and print it to the console.
+        Log an error message.
 
         Args:
         - msg: Message to log
+        - fields: Structured fields added to the record
         """
-        print(msg)  # Show in console
-        self.log.error(msg)
+        self.log.error(msg, extra=_extra(fields), stacklevel=2)
+
+
+def _extra(fields: dict) -> dict:
+    """
+    Make structured fields safe to pass as `extra`, logging raises KeyError on a field named like a record attribute.
+
+    Args:
+    - fields: Structured fields of a log call
+
+    Returns:
+    - Fields with reserved names prefixed by `field_`
+    """
+    return {f'field_{key}' if key in _RECORD_ATTRIBUTES else key: value for key, value in fields.items()}
 
 
 def create_log_folder() -> str:
@@ -95,21 +193,40 @@ def create_log_folder() -> str:
     return path
 
 
+def rotate_logs():
+    """
+    Force rotation of the log files of all loggers.
+    """
+    for logger in _loggers:
+        logger.rotate()
+
+
+def stop_logging():
+    """
+    Flush queued records and stop all listener threads.
+    """
+    while _listeners:
+        _listeners.pop().stop()
+
+
+_listeners: list[QueueListener] = []
+_loggers: list[Logger] = []
+atexit.register(stop_logging)
+
 # Create loggers for different components
 logging_folder = create_log_folder()
 
 # Logger for the bot
 bot_logger = Logger(name='bot', logging_path=os.path.join(logging_folder, 'bot_log.log'))
-bot_logger.clear_log_file()
 
 # Logger for the database
 database_logger = Logger(name='database', logging_path=os.path.join(logging_folder, 'database_log.log'))
-database_logger.clear_log_file()
 
 # Logger for the server
 server_logger = Logger(name='server', logging_path=os.path.join(logging_folder, 'server_log.log'))
-server_logger.clear_log_file()
 
 # Logger for the gpt
 gpt_logger = Logger(name='gpt', logging_path=os.path.join(logging_folder, 'gpt_log.log'))
-gpt_logger.clear_log_file()
+
+# Logger for the image storage
+storage_logger = Logger(name='storage', logging_path=os.path.join(logging_folder, 'storage_log.log'))
@@ -0,0 +1,122 @@
+# Third-party
+from aiogram.fsm.storage.base import BaseStorage
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+# Standard
+from datetime import date, timedelta
+from typing import Awaitable, Callable
+import asyncio
+
+# Project
+import config as cf
+from database import db
+from image_cache import image_cache
+from logger import bot_logger, rotate_logs
+from metrics import maintenance_duration, maintenance_errors
+
+
+class Maintenance:
+    """
+    Periodic maintenance jobs run on the application scheduler.
+
+    APScheduler never starts a job while its previous run is active and coalesces missed runs into one,
+    and a shared lock lets only one maintenance job run at a time. Blocking work is done in worker threads
+    or by the database driver, so the jobs do not stall the bot loop.
+
+    Attributes:
+    scheduler (AsyncIOScheduler): The scheduler the jobs are registered on.
+    """
+
+    def __init__(self, scheduler: AsyncIOScheduler):
+        """
+        Initialize the maintenance jobs.
+
+        Args:
+        scheduler (AsyncIOScheduler): The scheduler the jobs are registered on.
+        """
+        self.scheduler = scheduler
+        self.__lock = asyncio.Lock()
+
+    async def __run(self, name: str, job: Callable[[], Awaitable]):
+        """
+        Run a job under the shared lock and record its duration.
+
+        Args:
+        name (str): The job name used in logs and metrics.
+        job (Callable[[], Awaitable]): The job coroutine factory.
+        """
+        async with self.__lock:
+            with maintenance_duration.time(job=name):
+                try:
+                    result = await job()
+                except Exception as e:
+                    maintenance_errors.inc(job=name)
+                    bot_logger.error(f'Maintenance job {name} failed: {e}')
+                    return
+        bot_logger.info(f'Maintenance job {name} finished', result=result)
+
+    def add(self, name: str, job: Callable[[], Awaitable], interval: int):
+        """
+        Register a job running every interval.
+
+        Args:
+        name (str): The job name used in logs and metrics.
+        job (Callable[[], Awaitable]): The job coroutine factory.
+        interval (int): Seconds between the runs, 0 disables the job.
+        """
+        if interval <= 0:
+            return
+        self.scheduler.add_job(
+            self.__run, 'interval', args=(name, job), seconds=interval, id=f'maintenance_{name}',
+            max_instances=1, coalesce=True, misfire_grace_time=interval,
+        )
+
+
+async def prune_fsm_states(storage: BaseStorage) -> int | None:
+    """
+    Delete expired FSM states of storages that do not expire them by themselves.
+
+    Args:
+    storage (BaseStorage): The dispatcher storage.
+
+    Returns:
+    int | None: The number of deleted states, None if the storage has no pruning.
+    """
+    prune = getattr(storage, 'prune', None)
+    return await prune() if prune else None
+
+
+async def compact_database():
+    """
+    Compact the database once it is connected.
+    """
+    if db.ready.is_set():
+        await db.compact()
+
+
+async def refresh_rollups():
+    """
+    Rebuild the analytics rollups of the recent days once the database is connected.
+    """
+    if db.ready.is_set():
+        await db.stats.refresh(since=date.today() - timedelta(days=cf.maintenance['rollup_days'] - 1))
+
+
+def register_maintenance_jobs(scheduler: AsyncIOScheduler, storage: BaseStorage) -> Maintenance:
+    """
+    Register the periodic maintenance jobs with the intervals of config.maintenance.
+
+    Args:
+    scheduler (AsyncIOScheduler): The application scheduler.
+    storage (BaseStorage): The FSM storage of the dispatcher.
+
+    Returns:
+    Maintenance: The registered jobs.
+    """
+    maintenance = Maintenance(scheduler=scheduler)
+    maintenance.add('image_cache_prune', image_cache.prune, cf.maintenance['image_cache_prune'])
+    maintenance.add('fsm_prune', lambda: prune_fsm_states(storage), cf.maintenance['fsm_prune'])
+    maintenance.add('compact', compact_database, cf.maintenance['compact'])
+    maintenance.add('log_rotate', lambda: asyncio.to_thread(rotate_logs), cf.maintenance['log_rotate'])
+    maintenance.add('rollup_refresh', refresh_rollups, cf.maintenance['rollup_refresh'])
+    return maintenance
@@ -0,0 +1,278 @@
+# Standard
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable
+import bisect
+
+# Latency buckets in seconds, from cache hits up to slow DALL-E 3 generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry: list['_Metric'] = []
+
+
+def _escape(value) -> str:
+    """
+    Escape a label value for the Prometheus text format.
+
+    Args:
+    value: The label value.
+
+    Returns:
+    str: The escaped value.
+    """
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    """
+    Format a label set.
+
+    Args:
+    names (tuple): The label names.
+    values (tuple): The label values.
+    extra (str): An additional preformatted label, e.g. the histogram bucket.
+
+    Returns:
+    str: The label set in braces or an empty string.
+    """
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric(ABC):
+    """
+    Base class of the metrics, registers itself for export.
+
+    Attributes:
+    name (str): The metric name.
+    documentation (str): The help text.
+    labelnames (tuple): Names of the labels.
+    """
+    type_ = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        """
+        Get the label values in the declared order.
+
+        Args:
+        labels (dict): The label values by name.
+
+        Returns:
+        tuple: The label values.
+        """
+        return tuple(labels[name] for name in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """
+        Format the samples of the metric.
+
+        Returns:
+        list[str]: The sample lines.
+        """
+
+    def render(self) -> str:
+        """
+        Render the metric in the Prometheus text format.
+
+        Returns:
+        str: The exposition lines.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_}']
+        return '\n'.join(lines + self._samples())
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing value, either increased directly or read from a callback on export.
+    """
+    type_ = 'counter'
+
+    def __init__(
+            self, name: str, documentation: str, labelnames: tuple = (),
+            callback: Callable[[], dict[tuple, float]] | None = None
+    ):
+        """
+        Initialize the counter.
+
+        Args:
+        name (str): The metric name, ending with '_total'.
+        documentation (str): The help text.
+        labelnames (tuple): Names of the labels.
+        callback (Callable | None): Returns the current totals by label values tuple on every export,
+            e.g. of counters kept by another object.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = {}
+        self.callback = callback
+
+    def inc(self, amount: float = 1.0, **labels):
+        """
+        Increase the counter.
+
+        Args:
+        amount (float): The increment.
+        labels: The label values.
+        """
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        values = self.callback() if self.callback else self.values
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+            for key, value in values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, either set directly or read from a callback on export.
+    """
+    type_ = 'gauge'
+
+    def __init__(
+            self, name: str, documentation: str, labelnames: tuple = (),
+            callback: Callable[[], dict[tuple, float]] | None = None
+    ):
+        """
+        Initialize the gauge.
+
+        Args:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (tuple): Names of the labels.
+        callback (Callable | None): Returns the current values by label values tuple on every export.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        """
+        Set the gauge.
+
+        Args:
+        value (float): The new value.
+        labels: The label values.
+        """
+        self.values[self._key(labels)] = value
+
+    def _samples(self) -> list[str]:
+        values = self.callback() if self.callback else self.values
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Attributes:
+    buckets (tuple): Upper bounds of the buckets.
+    """
+    type_ = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: dict[tuple, list[int]] = {}
+        self.sums: dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        """
+        Record an observation.
+
+        Args:
+        value (float): The observed value.
+        labels: The label values.
+        """
+        key = self._key(labels)
+        if key not in self.counts:
+            self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+        self.counts[key][bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the wrapped block in seconds.
+
+        Args:
+        labels: The label values.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="{}"'.format('+Inf' if bound == float('inf') else repr(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {self.sums[key]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+def render() -> str:
+    """
+    Render all registered metrics in the Prometheus text format.
+
+    Returns:
+    str: The exposition body.
+    """
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+# Metrics shared across the project
+handler_latency = Histogram(
+    'bot_handler_latency_seconds', 'Time spent in update handlers.', ('router', 'event')
+)
+handler_errors = Counter(
+    'bot_handler_errors_total', 'Update handlers that raised an exception.', ('router', 'event')
+)
+db_query_latency = Histogram(
+    'db_query_latency_seconds', 'Time spent in Database methods.', ('method',)
+)
+openai_latency = Histogram(
+    'openai_request_latency_seconds', 'Latency of OpenAI image requests.', ('model', 'size', 'outcome')
+)
+openai_requests = Counter(
+    'openai_requests_total', 'OpenAI image requests by outcome.', ('model', 'size', 'outcome')
+)
+image_pipeline_latency = Histogram(
+    'image_pipeline_latency_seconds', 'Time spent per stage of delivering generated images.', ('stage',)
+)
+maintenance_duration = Histogram(
+    'maintenance_job_duration_seconds', 'Duration of the periodic maintenance jobs.', ('job',)
+)
+maintenance_errors = Counter(
+    'maintenance_job_errors_total', 'Maintenance jobs that raised an exception.', ('job',)
+)
+broadcast_messages = Counter(
+    'broadcast_messages_total', 'Broadcast messages by outcome.', ('outcome',)
+)
+broadcast_flood_waits = Counter(
+    'broadcast_flood_waits_total', 'Flood waits requested by Telegram during broadcasts.'
+)
+rate_limit_rejected = Counter(
+    'rate_limit_rejected_total', 'Updates rejected by the rate limiter.', ('scope', 'command_class')
+)
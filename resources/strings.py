@@ -1,5 +1,7 @@
 # Extra messages
 decline_msg = '<b>Отмена операции!</b>'
+rate_limit_msg = 'Слишком много запросов, попробуйте чуть позже ⏳'
+not_ready_msg = 'Бот запускается, попробуйте через минуту ⏳'
 inner_error_msg = '<b>Внутреняя ошибка!</b>\n\nПопробуйте воспользоваться чат-ботом позже 😵'
 
 # Basic messages
@@ -10,14 +12,28 @@ start_msg = ('<b>Добро пожаловать!</b> 👋\n\n'
 help_msg = ('<b>📜 Доступные команды:</b>\n\n'
                 '<i>/help</i> - показать список доступных команд 📋\n\n'
                 '<i>/generate</i> - сгенерировать изображение с помощью DALL-E 🤖 \n\n'
-                '<i>/settings</i> - настройка параметров генерации изображения ⚙️\n\n')
+                '<i>/settings</i> - настройка параметров генерации изображения ⚙️\n\n'
+                '<i>/history</i> - история генераций 🗂️\n\n')
 
 # Generate messages
 send_prompt_msg = '<b>Введите текст для генерации ✏️</b>'
 send_prompt_error_msg = '<b>Неверный ввод данных!</b>\n\nОтправьте текст еще раз 🔄'
 generating_msg = '<i>Подождите окончание генерации ⌛</i>'
+queue_position_msg = '<i>Ваш запрос в очереди: {position} ⏳</i>'
+generation_done_msg = '<b>Готово ✅</b>\n\nНовая генерация: <i>/generate</i>'
+generation_partial_msg = 'Не все изображения удалось сгенерировать: получено {sent} из {quantity} 😕'
+generation_not_found_msg = 'Генерация не найдена 🤷'
+
+# History messages
+history_msg = '<b>История генераций 🗂️</b>\n\nНажмите на номер, чтобы отправить изображения снова\n\n'
+history_empty_msg = '<b>История пуста</b>\n\nГенерация: <i>/generate</i>'
 
 # Settings messages
-choose_model_msg = '<b>Выберите модель 🤖</b>\n\nГенерация: <i>/generate</i>'
-choose_size_msg = '<b>Выберите размер изображения 🖼️</b>\n\nГенерация: <i>/generate</i>'
-choose_quantity_msg = '<b>Выберите количество 🔢</b>\n\nГенерация: <i>/generate</i>'
+settings_msg = ('<b>Настройки генерации ⚙️</b>\n\n'
+                '🤖 Модель, 🖼️ размер изображения и 🔢 количество выбираются сверху вниз.\n\n'
+                'Нажмите <i>Сохранить</i>, чтобы применить выбор')
+settings_saved_msg = ('<b>Настройки сохранены ✅</b>\n\n'
+                      '<b>Модель:</b> {model}\n'
+                      '<b>Размер изображения:</b> {size}\n'
+                      '<b>Количество:</b> {quantity}\n\n'
+                      'Генерация: <i>/generate</i>')
@@ -1,5 +1,6 @@
 # Importing necessary modules and classes from the package
-from .panel import start_panel
+from .panel import start_panel, stop_panel
+from .webhook import wait_pending_updates, validate_webhook_config
 
 # List of classes, methods and modules that will be accessible when importing the package
-__all__ = ['start_panel']
+__all__ = ['start_panel', 'stop_panel', 'wait_pending_updates', 'validate_webhook_config']
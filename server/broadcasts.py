@@ -0,0 +1,62 @@
+# Third-party
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from fastapi.templating import Jinja2Templates
+from starlette.responses import RedirectResponse
+
+# Standard
+from pathlib import Path
+
+# Project
+from broadcast import broadcast_jobs, validate_broadcast_text, MAX_TEXT_LENGTH
+from database import db, BroadcastModel, BroadcastStatus
+from logger import server_logger
+from .dependencies import require_admin, require_database, get_csrf_token, require_csrf_token
+
+# Broadcasts message every user, so every page requires the admin credentials
+broadcasts_router = APIRouter(dependencies=[Depends(require_admin), Depends(require_database)])
+templates = Jinja2Templates(directory=Path(__file__).parent / 'templates')
+
+# Number of broadcasts listed on the page
+RECENT_BROADCASTS = 20
+
+
+@broadcasts_router.get('/broadcasts')
+async def broadcasts_page(request: Request):
+    """
+    Renders the broadcast form and the progress and throughput of the recent broadcasts.
+    """
+    return templates.TemplateResponse('broadcasts.html', {
+        'request': request,
+        'broadcasts': await db.broadcasts.get_recent(limit=RECENT_BROADCASTS),
+        'active_statuses': (BroadcastStatus.QUEUED.value, BroadcastStatus.RUNNING.value),
+        'max_length': MAX_TEXT_LENGTH,
+        'csrf_token': get_csrf_token(request),
+    })
+
+
+@broadcasts_router.post('/broadcasts', dependencies=[Depends(require_csrf_token)])
+async def create_broadcast(text: str = Form(...), admin: str = Depends(require_admin)):
+    """
+    Queues a broadcast of the HTML text to all users.
+    """
+    text = text.strip()
+    try:
+        validate_broadcast_text(text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    broadcast = await db.broadcasts.insert(BroadcastModel.create(text=text, total=await db.users.count()))
+    broadcast_jobs.enqueue(broadcast.id)
+    server_logger.info(f'Broadcast {broadcast.id} is queued by {admin} for {broadcast.total} users')
+    return RedirectResponse('/broadcasts', status_code=303)
+
+
+@broadcasts_router.post('/broadcasts/{broadcast_id}/cancel', dependencies=[Depends(require_csrf_token)])
+async def cancel_broadcast(broadcast_id: int, admin: str = Depends(require_admin)):
+    """
+    Cancels a queued or running broadcast.
+    """
+    if not await db.broadcasts.cancel(broadcast_id):
+        raise HTTPException(status_code=404, detail='No active broadcast with this ID')
+    server_logger.info(f'Broadcast {broadcast_id} is cancelled by {admin}')
+    return RedirectResponse('/broadcasts', status_code=303)
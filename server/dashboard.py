@@ -0,0 +1,64 @@
+# Third-party
+from fastapi import APIRouter, Depends, Request
+from fastapi.templating import Jinja2Templates
+
+# Standard
+from datetime import date, timedelta
+from pathlib import Path
+
+# Project
+import config as cf
+from database import db, LATENCY_BUCKETS
+from .dependencies import require_admin, require_database
+
+# Usage analytics are visible to the admin only
+dashboard_router = APIRouter(dependencies=[Depends(require_admin), Depends(require_database)])
+templates = Jinja2Templates(directory=Path(__file__).parent / 'templates')
+
+
+def percentile(counts: list[int], q: float) -> float | None:
+    """
+    Estimate a percentile from a latency histogram by linear interpolation inside its bucket.
+
+    Args:
+    counts (list[int]): Counts per bucket of LATENCY_BUCKETS.
+    q (float): The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+    float | None: The latency in seconds or None for an empty histogram.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+            upper = LATENCY_BUCKETS[index]
+            if upper == float('inf'):
+                return lower
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return LATENCY_BUCKETS[-2]
+
+
+@dashboard_router.get('/dashboard')
+async def dashboard_page(request: Request):
+    """
+    Renders the analytics dashboard from the rollup tables.
+    """
+    since = date.today() - timedelta(days=cf.server['dashboard_days'] - 1)
+    daily = await db.stats.get_daily(since=since)
+    by_model = await db.stats.get_by_model(since=since)
+    latency = {
+        model: {'p50': percentile(counts, 0.5), 'p95': percentile(counts, 0.95)}
+        for model, counts in (await db.stats.get_latency_histograms(since=since)).items()
+    }
+    return templates.TemplateResponse('dashboard.html', {
+        'request': request,
+        'days': cf.server['dashboard_days'],
+        'daily': daily,
+        'by_model': by_model,
+        'latency': latency,
+    })
@@ -0,0 +1,71 @@
+# Third-party
+from fastapi import Depends, Form, HTTPException, Request
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+
+# Standard
+import secrets
+
+# Project
+from database import db
+import config as cf
+
+security = HTTPBasic()
+
+
+def require_database():
+    """
+    Reject the request while the database is not connected, the engine is not bound before that.
+
+    Raises:
+    HTTPException: 503 if the database is not ready.
+    """
+    if not db.ready.is_set():
+        raise HTTPException(status_code=503, detail='Database is starting')
+
+
+def require_admin(credentials: HTTPBasicCredentials = Depends(security)) -> str:
+    """
+    Check the HTTP Basic credentials against PANEL_USERNAME and PANEL_PASSWORD.
+
+    Admin pages are disabled while the credentials are not configured.
+
+    Returns:
+    str: The admin username.
+
+    Raises:
+    HTTPException: 401 for wrong credentials, 503 if no credentials are configured.
+    """
+    username, password = cf.server['username'], cf.server['password']
+    if not username or not password:
+        raise HTTPException(status_code=503, detail='Set PANEL_USERNAME and PANEL_PASSWORD to enable admin pages')
+    valid_username = secrets.compare_digest(credentials.username.encode(), username.encode())
+    valid_password = secrets.compare_digest(credentials.password.encode(), password.encode())
+    if not (valid_username and valid_password):
+        raise HTTPException(status_code=401, detail='Wrong credentials', headers={'WWW-Authenticate': 'Basic'})
+    return credentials.username
+
+
+def get_csrf_token(request: Request) -> str:
+    """
+    Get the CSRF token of the session, creating it on first use.
+
+    Browsers resend HTTP Basic credentials with cross-site forms, so every admin form carries this token.
+
+    Returns:
+    str: The token to put into the forms.
+    """
+    if 'csrf_token' not in request.session:
+        request.session['csrf_token'] = secrets.token_urlsafe(32)
+    return request.session['csrf_token']
+
+
+def require_csrf_token(request: Request, csrf_token: str = Form('')):
+    """
+    Check the CSRF token of a submitted form.
+
+    Raises:
+    HTTPException: 403 if the token does not match the session.
+    """
+    expected = request.session.get('csrf_token')
+    if not expected or not secrets.compare_digest(csrf_token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail='Invalid CSRF token, reload the page')
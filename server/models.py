@@ -2,7 +2,7 @@
 from sqladmin import ModelView
 
 # Project
-from database import UserModel, SettingsModel
+from database import UserModel, SettingsModel, GenerationModel
 
 
 class UserView(ModelView, model=UserModel):
@@ -74,3 +74,55 @@ class SettingsView(ModelView, model=SettingsModel):
         SettingsModel.model,
         SettingsModel.size,
     ]
+
+
+class GenerationView(ModelView, model=GenerationModel):
+    """
+    View class for Generation model.
+
+    Attributes:
+    name (str): Name of the view ('Генерация').
+    name_plural (str): Plural name of the view ('Генерации').
+    column_labels (dict): Mapping of model columns to labels.
+    column_list (list): List of columns to display in the view.
+    column_sortable_list (list): List of sortable columns.
+    column_searchable_list (list): List of searchable columns.
+    column_default_sort (list): Default sorting of the view.
+    """
+    name = 'Генерация'
+    name_plural = 'Генерации'
+    column_labels = {
+        GenerationModel.id: 'ID',
+        GenerationModel.user_id: 'ID пользователя',
+        GenerationModel.prompt: 'Запрос',
+        GenerationModel.model: 'Модель',
+        GenerationModel.size: 'Размер',
+        GenerationModel.quantity: 'Количество',
+        GenerationModel.status: 'Статус',
+        GenerationModel.latency: 'Время генерации, с',
+        GenerationModel.file_ids: 'ID файлов',
+        GenerationModel.created_at: 'Дата создания',
+    }
+    column_list = [
+        GenerationModel.id,
+        GenerationModel.user_id,
+        GenerationModel.prompt,
+        GenerationModel.model,
+        GenerationModel.size,
+        GenerationModel.quantity,
+        GenerationModel.status,
+        GenerationModel.latency,
+        GenerationModel.created_at,
+    ]
+    column_sortable_list = [
+        GenerationModel.id,
+        GenerationModel.user_id,
+        GenerationModel.status,
+        GenerationModel.latency,
+        GenerationModel.created_at,
+    ]
+    column_searchable_list = [
+        GenerationModel.prompt,
+        GenerationModel.status,
+    ]
+    column_default_sort = [(GenerationModel.created_at, True)]
@@ -1,22 +1,32 @@
 # Third-party
-from fastapi import FastAPI, Request
-from fastapi.security import HTTPBasic
+from fastapi import Depends, FastAPI, Request
 from sqladmin import Admin
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, PlainTextResponse, JSONResponse
+from uvicorn import Config, Server
 
 # Project
 from logger import server_logger
 import config as cf
+import metrics
 from database import db
-from .models import UserView, SettingsView
+from .models import UserView, SettingsView, GenerationView
+from .broadcasts import broadcasts_router
+from .dashboard import dashboard_router
+from .dependencies import require_admin
+from .webhook import webhook_router
 
 app = FastAPI()
 app.add_middleware(SessionMiddleware, secret_key=cf.server['secret_key'])
-security = HTTPBasic()
 
-admin = Admin(app=app, engine=db.engine)
-[admin.add_view(view) for view in [UserView, SettingsView]]
+app.include_router(dashboard_router)
+app.include_router(broadcasts_router)
+if cf.bot['mode'] == 'webhook':
+    app.include_router(webhook_router)
+
+# Own session maker, sqladmin reconfigures it, bound once the database engine is constructed
+admin = Admin(app=app, session_maker=db.create_session_maker())
+[admin.add_view(view) for view in [UserView, SettingsView, GenerationView]]
 
 
 @app.get('/')
@@ -35,6 +45,24 @@ async def admin_page(request: Request):
     return await admin.index(request)
 
 
+@app.get('/metrics', dependencies=[Depends(require_admin)])
+async def metrics_page(request: Request):
+    """
+    Exports the bot metrics in the Prometheus text format, scraped with the admin credentials.
+    """
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/ready')
+async def ready_page(request: Request):
+    """
+    Reports whether the database is connected, 503 while the bot is starting.
+    """
+    if db.ready.is_set():
+        return JSONResponse({'database': 'ready'})
+    return JSONResponse({'database': 'starting'}, status_code=503)
+
+
 @app.on_event("startup")
 async def start_server():
     """
@@ -43,15 +71,31 @@ async def start_server():
     server_logger.info(f'Server started at http://{cf.server["host"]}:{cf.server["port"]}')
 
 
+class PanelServer(Server):
+    """
+    Uvicorn server leaving the signals to start.py, which stops the bot and the panel together.
+    """
+
+    def install_signal_handlers(self):
+        pass
+
+
+panel_server = PanelServer(config=Config(
+    app=app,
+    host='0.0.0.0',  # Do not change host, because it's running locally in docker container, not host machine
+    port=int(cf.server['port'] or 8081)
+))
+
+
 async def start_panel():
     """
-    Configures and starts the server.
+    Starts the server, returns once `stop_panel` is called.
+    """
+    await panel_server.serve()
+
+
+def stop_panel():
+    """
+    Asks the server to finish the running requests and stop.
     """
-    from uvicorn import Config, Server
-    config = Config(
-        app=app,
-        host='0.0.0.0',  # Do not change host, because it's running locally in docker container, not host machine
-        port=int(cf.server['port'])
-    )
-    server = Server(config=config)
-    await server.serve()
+    panel_server.should_exit = True
@@ -0,0 +1,79 @@
+# Third-party
+from aiogram.types import Update
+from fastapi import APIRouter, Header, Request, Response, HTTPException
+
+# Standard
+import asyncio
+import hmac
+import re
+
+# Project
+from bot import bot, dispatcher
+from logger import server_logger
+import config as cf
+
+webhook_router = APIRouter()
+
+# Characters Telegram accepts in a webhook secret token
+SECRET_TOKEN = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+# Bounds the number of updates processed at once, Telegram waits for a free slot before getting a response
+_semaphore = asyncio.Semaphore(cf.bot['webhook_concurrency'])
+_tasks: set[asyncio.Task] = set()
+
+
+def validate_webhook_config():
+    """
+    Check the webhook configuration before the webhook is set, without a secret every update would be rejected.
+
+    Raises:
+    ValueError: If WEBHOOK_URL is not an HTTPS URL or WEBHOOK_SECRET is missing or not accepted by Telegram.
+    """
+    if not (cf.bot['webhook_url'] or '').startswith('https://'):
+        raise ValueError('Webhook mode requires WEBHOOK_URL, the public HTTPS base URL of the panel')
+    if not SECRET_TOKEN.fullmatch(cf.bot['webhook_secret'] or ''):
+        raise ValueError('Webhook mode requires WEBHOOK_SECRET of 1-256 characters A-Z, a-z, 0-9, _ and -')
+
+
+async def _process_update(update: Update):
+    """
+    Feed an update to the dispatcher and release its slot.
+
+    Args:
+    update (Update): The incoming Telegram update.
+    """
+    try:
+        await dispatcher.feed_update(bot=bot, update=update)
+    except Exception as e:
+        server_logger.error(f'Failed to process update {update.update_id}: {e}')
+    finally:
+        _semaphore.release()
+
+
+@webhook_router.post(cf.bot['webhook_path'])
+async def receive_update(
+        request: Request,
+        secret_token: str | None = Header(default=None, alias='X-Telegram-Bot-Api-Secret-Token')
+):
+    """
+    Receives Telegram updates in webhook mode.
+
+    The update is acknowledged as soon as it is scheduled, so slow handlers do not make Telegram resend it.
+    """
+    if not cf.bot['webhook_secret'] or not hmac.compare_digest(secret_token or '', cf.bot['webhook_secret']):
+        raise HTTPException(status_code=403)
+
+    update = Update.model_validate(await request.json(), context={'bot': bot})
+    await _semaphore.acquire()
+    task = asyncio.create_task(_process_update(update))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return Response(status_code=200)
+
+
+async def wait_pending_updates():
+    """
+    Wait until all scheduled updates are processed.
+    """
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
@@ -2,44 +2,182 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # Standard
+from contextlib import suppress
 import asyncio
+import signal
+import sys
 
 # Project
 from bot import bot, dispatcher
-from handlers import all_routers
-from logger import bot_logger
-from server import start_panel
+from broadcast import broadcast_jobs
+from database import db, SchemaVersionError
+from image_cache import image_cache
+from handlers import all_routers, generation_jobs
+from logger import bot_logger, database_logger
+from maintenance import register_maintenance_jobs
+from server import start_panel, stop_panel, wait_pending_updates, validate_webhook_config
+from throttling import rate_limit_backend
+import config as cf
 
 dispatcher.include_routers(*all_routers)
 
+# Set by the first SIGINT or SIGTERM or by a fatal startup error
+shutdown = asyncio.Event()
+_shutdown_task: asyncio.Task | None = None
+# Exit status of the process, non-zero after a fatal startup error
+_exit_code = 0
+
 
 async def start_bot():
     """
-    Start the bot and configure polling with allowed updates.
+    Start the bot and configure polling or the webhook with allowed updates.
     """
-    await bot.delete_webhook(drop_pending_updates=True)
+    allowed_updates = [
+        'message', 'callback_query'
+    ]  # Add needed router updates
+
+    if cf.bot['mode'] == 'webhook':
+        # Updates are received by the panel, see server/webhook.py
+        await bot.set_webhook(
+            url=cf.bot['webhook_url'].rstrip('/') + cf.bot['webhook_path'],
+            secret_token=cf.bot['webhook_secret'],
+            allowed_updates=allowed_updates,
+            drop_pending_updates=cf.bot['drop_pending_updates'],
+        )
+        bot_logger.info('Bot started in webhook mode!')
+        return
+
+    await bot.delete_webhook(drop_pending_updates=cf.bot['drop_pending_updates'])
+    if shutdown.is_set():
+        return
 
     bot_logger.info('Bot started!')
+    # Signals are handled by `request_shutdown`, which stops the panel too
     await dispatcher.start_polling(
         bot,
-        allowed_updates=[
-            'message', 'callback_query'
-        ]  # Add needed router updates
+        allowed_updates=allowed_updates,
+        handle_signals=False
     )
 
 
+async def prepare_database():
+    """
+    Connect to the database in the background and resume the generations and broadcasts interrupted
+    by the previous shutdown.
+
+    Updates are answered with a 'starting' message until the database is ready. An outdated schema
+    never becomes ready, so it stops the application with a non-zero exit status.
+    """
+    global _exit_code
+    try:
+        await db.connect()
+    except SchemaVersionError as e:
+        database_logger.error(str(e))
+        _exit_code = 1
+        request_shutdown('Database schema is outdated')
+        return
+    for job_id in await db.generations.get_unfinished():
+        generation_jobs.enqueue(job_id)
+    for job_id in await db.broadcasts.get_unfinished():
+        broadcast_jobs.enqueue(job_id)
+
+
 async def run_app():
     """
-    Run the bot application by starting the bot and the panel.
+    Run the bot application by starting the bot and the panel while the database connects.
+
+    Returns after `stop_app` stopped the bot and the panel, once the pending work is finished
+    and the resources are released.
     """
-    await asyncio.gather(
-        start_bot(),
-        start_panel()
-    )
+    # Workers wait for jobs, which are only enqueued once the database is ready
+    await generation_jobs.start()
+    await broadcast_jobs.start()
+    database = asyncio.create_task(prepare_database())
+    try:
+        await asyncio.gather(
+            start_bot(),
+            start_panel()
+        )
+    finally:
+        # The database may still be unreachable at shutdown
+        database.cancel()
+        await asyncio.wait([database])
+        if not database.cancelled() and database.exception():
+            database_logger.error(f'Database startup failed: {database.exception()}')
+        await wait_pending_updates()
+        await generation_jobs.stop(timeout=cf.generation['shutdown_timeout'])
+        # Broadcasts keep their progress, an unfinished one continues on the next start
+        await broadcast_jobs.stop(timeout=cf.broadcast['shutdown_timeout'])
+        await dispatcher.storage.close()
+        await image_cache.close()
+        await rate_limit_backend.close()
+        await db.disconnect()
 
 
-if __name__ == '__main__':
+async def stop_app():
+    """
+    Stop receiving updates: stop polling and the panel, so `run_app` finishes.
+    """
+    if cf.bot['mode'] != 'webhook':
+        with suppress(RuntimeError):  # Polling is not started yet
+            await dispatcher.stop_polling()
+    stop_panel()
+
+
+def request_shutdown(reason: str):
+    """
+    Stop the application once, on SIGINT and SIGTERM or on a fatal startup error.
+
+    Args:
+    reason (str): Why the application stops, e.g. the received signal.
+    """
+    global _shutdown_task
+    if shutdown.is_set():
+        return
+    shutdown.set()
+    bot_logger.warning(f'{reason}, shutting down')
+    _shutdown_task = asyncio.create_task(stop_app())
+
+
+def check_bot_config():
+    """
+    Check the bot mode and, in webhook mode, the webhook configuration.
+
+    Raises:
+    ValueError: If the configuration cannot work.
+    """
+    if cf.bot['mode'] not in ('polling', 'webhook'):
+        raise ValueError(f"Unknown BOT_MODE {cf.bot['mode']!r}, expected 'polling' or 'webhook'")
+    if cf.bot['mode'] == 'webhook':
+        validate_webhook_config()
+
+
+async def main() -> int:
+    """
+    Run the application and the maintenance jobs until SIGINT or SIGTERM.
+
+    Returns:
+    int: The exit status of the process.
+    """
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, request_shutdown, f'Received {sig.name}')
+
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(run_app)
+    register_maintenance_jobs(scheduler, storage=dispatcher.storage)
     scheduler.start()
-    asyncio.get_event_loop().run_forever()
+    try:
+        await run_app()
+    finally:
+        scheduler.shutdown(wait=False)
+    bot_logger.info('Bot stopped')
+    return _exit_code
+
+
+if __name__ == '__main__':
+    try:
+        check_bot_config()
+    except ValueError as e:
+        bot_logger.error(str(e))
+        sys.exit(1)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,7 @@
+# Standard
+import os
+
+# Modules read the configuration on import
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ.setdefault('BOT_TOKEN', '1:test')
+os.environ.setdefault('LOG_CONSOLE', '0')
@@ -0,0 +1,216 @@
+# Third-party
+from aiohttp import web
+from openai import AsyncOpenAI, APITimeoutError, BadRequestError, InternalServerError
+import pytest
+
+# Standard
+from time import perf_counter
+import asyncio
+
+# Project
+import config as cf
+import gpt
+from gpt import CircuitBreaker, CircuitOpenError
+
+URLS = ['https://example.com/image.png']
+IMAGES = {'created': 1700000000, 'data': [{'url': url} for url in URLS]}
+
+
+class FakeOpenAI:
+    """
+    Local HTTP server answering the image generation endpoint with the given responses in order.
+
+    Attributes:
+    responses (list): (status, body, headers, delay) of every request, the last one repeats.
+    requests (int): Number of received requests.
+    """
+
+    def __init__(self, *responses: tuple[int, dict, dict, float]):
+        self.responses = list(responses)
+        self.requests = 0
+        self.__runner: web.AppRunner | None = None
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        status, body, headers, delay = self.responses[min(self.requests, len(self.responses) - 1)]
+        self.requests += 1
+        await asyncio.sleep(delay)
+        return web.json_response(body, status=status, headers=headers)
+
+    async def __aenter__(self) -> str:
+        app = web.Application()
+        app.router.add_post('/v1/images/generations', self.__handle)
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f'http://127.0.0.1:{port}/v1'
+
+    async def __aexit__(self, *exc_info):
+        await self.__runner.cleanup()
+
+
+def ok(delay: float = 0.0) -> tuple:
+    return 200, IMAGES, {}, delay
+
+
+def error(status: int, headers: dict | None = None) -> tuple:
+    return status, {'error': {'message': 'fake error', 'type': 'fake'}}, headers or {}, 0.0
+
+
+@pytest.fixture(autouse=True)
+def api_config(monkeypatch):
+    """
+    Fast retries, short timeouts and a fresh breaker for every test.
+    """
+    monkeypatch.setitem(cf.api, 'max_retries', 2)
+    monkeypatch.setitem(cf.api, 'backoff_base', 0.0)
+    monkeypatch.setitem(cf.api, 'backoff_max', 5.0)
+    monkeypatch.setitem(cf.api, 'timeouts', {'dall-e-2': 0.3})
+    monkeypatch.setattr(gpt, '_breaker', CircuitBreaker(threshold=3, reset_timeout=0.3))
+
+
+def run(server: FakeOpenAI, scenario):
+    """
+    Run a scenario against the fake server with a client pointed at it.
+
+    Args:
+    server (FakeOpenAI): The fake server.
+    scenario: Coroutine function run once the server is up.
+    """
+    async def main():
+        async with server as url:
+            gpt._client = AsyncOpenAI(api_key='test', base_url=url, max_retries=0)
+            try:
+                return await scenario()
+            finally:
+                await gpt._client.close()
+
+    return asyncio.run(main())
+
+
+async def request() -> list[str]:
+    response = await gpt._request_dalle(prompt='cat', size='256x256', model='dall-e-2', quantity=1)
+    return [image['url'] for image in response['data']]
+
+
+def test_retries_server_errors():
+    server = FakeOpenAI(error(500), error(503), ok())
+    assert run(server, request) == URLS
+    assert server.requests == 3
+    assert gpt._breaker.state == 'closed'
+
+
+def test_gives_up_after_max_retries():
+    server = FakeOpenAI(error(500))
+    with pytest.raises(InternalServerError):
+        run(server, request)
+    assert server.requests == cf.api['max_retries'] + 1
+
+
+def test_honors_retry_after():
+    server = FakeOpenAI(error(429, {'retry-after': '0.5'}), ok())
+    started_at = perf_counter()
+    assert run(server, request) == URLS
+    # Backoff without the header would not wait at all, backoff_base is 0
+    assert perf_counter() - started_at >= 0.5
+    assert server.requests == 2
+
+
+def test_does_not_retry_client_errors():
+    server = FakeOpenAI(error(400), ok())
+    with pytest.raises(BadRequestError):
+        run(server, request)
+    assert server.requests == 1
+    assert gpt._breaker.state == 'closed'
+
+
+def test_times_out_and_retries():
+    server = FakeOpenAI(ok(delay=1.0), ok())
+    assert run(server, request) == URLS
+    assert server.requests == 2
+
+
+def test_timeout_after_max_retries():
+    server = FakeOpenAI(ok(delay=1.0))
+    with pytest.raises(APITimeoutError):
+        run(server, request)
+    assert server.requests == cf.api['max_retries'] + 1
+
+
+def test_breaker_opens_rejects_and_closes_after_probe(monkeypatch):
+    monkeypatch.setitem(cf.api, 'max_retries', 0)
+    server = FakeOpenAI(error(500), error(500), error(500), ok())
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(InternalServerError):
+                await request()
+        assert gpt._breaker.state == 'open'
+        with pytest.raises(CircuitOpenError):
+            await request()
+        assert server.requests == 3
+
+        await asyncio.sleep(0.35)
+        assert gpt._breaker.state == 'half_open'
+        assert await request() == URLS
+        assert gpt._breaker.state == 'closed'
+
+    run(server, scenario)
+
+
+def test_failed_probe_reopens_breaker(monkeypatch):
+    monkeypatch.setitem(cf.api, 'max_retries', 0)
+    server = FakeOpenAI(error(500))
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(InternalServerError):
+                await request()
+        await asyncio.sleep(0.35)
+        with pytest.raises(InternalServerError):
+            await request()
+        assert gpt._breaker.state == 'open'
+
+    run(server, scenario)
+
+
+def test_single_probe_in_half_open_state(monkeypatch):
+    monkeypatch.setitem(cf.api, 'max_retries', 0)
+    server = FakeOpenAI(error(500), error(500), error(500), ok(delay=0.1))
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(InternalServerError):
+                await request()
+        await asyncio.sleep(0.35)
+        probe = asyncio.create_task(request())
+        await asyncio.sleep(0.02)
+        with pytest.raises(CircuitOpenError):
+            await request()
+        assert await probe == URLS
+        assert gpt._breaker.state == 'closed'
+
+    run(server, scenario)
+
+
+def test_cancelled_probe_releases_breaker(monkeypatch):
+    monkeypatch.setitem(cf.api, 'max_retries', 0)
+    server = FakeOpenAI(error(500), error(500), error(500), ok(delay=1.0), ok())
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(InternalServerError):
+                await request()
+        await asyncio.sleep(0.35)
+        probe = asyncio.create_task(request())
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert gpt._breaker.state == 'half_open'
+        assert await request() == URLS
+        assert gpt._breaker.state == 'closed'
+
+    run(server, scenario)
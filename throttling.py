@@ -0,0 +1,162 @@
+# Standard
+from math import ceil
+from time import monotonic, time
+
+# Project
+import config as cf
+from logger import bot_logger
+
+
+class MemoryBucketBackend:
+    """
+    Token buckets kept in process memory.
+
+    Attributes:
+    max_keys (int): Number of buckets that triggers dropping the refilled ones.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.__buckets: dict[str, tuple[float, float, float, float]] = {}
+
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> bool:
+        """
+        Take tokens from a bucket.
+
+        Args:
+        key (str): The bucket key.
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens.
+        cost (float): Tokens to take, negative to give tokens back.
+
+        Returns:
+        bool: True if the bucket had enough tokens.
+        """
+        now = monotonic()
+        tokens, updated_at, _, _ = self.__buckets.get(key, (capacity, now, rate, capacity))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens = min(capacity, tokens - cost)
+        self.__buckets[key] = (tokens, now, rate, capacity)
+
+        if len(self.__buckets) > self.max_keys:
+            self.prune()
+        return allowed
+
+    async def refund(self, key: str, rate: float, capacity: float, cost: float = 1.0):
+        """
+        Give back tokens taken by `consume`, e.g. when a later limit rejected the request.
+
+        Args:
+        key (str): The bucket key.
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens.
+        cost (float): Tokens to give back.
+        """
+        await self.consume(key, rate, capacity, cost=-cost)
+
+    def prune(self) -> int:
+        """
+        Drop buckets that refilled completely, they behave like missing ones.
+
+        Returns:
+        int: The number of dropped buckets.
+        """
+        now = monotonic()
+        full = [
+            key for key, (tokens, updated_at, rate, capacity) in self.__buckets.items()
+            if tokens + (now - updated_at) * rate >= capacity
+        ]
+        for key in full:
+            del self.__buckets[key]
+        return len(full)
+
+    async def close(self):
+        pass
+
+
+class RedisBucketBackend:
+    """
+    Token buckets kept in Redis, shared by all bot processes.
+    """
+
+    # Refill and take tokens atomically, the key expires once the bucket would be full again
+    _SCRIPT = '''
+        local rate, capacity, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+        local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(data[1]) or capacity
+        local ts = tonumber(data[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        local allowed = 0
+        if tokens >= cost then
+            tokens = math.min(capacity, tokens - cost)
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+        return allowed
+    '''
+
+    def __init__(self, url: str):
+        """
+        Initialize the backend.
+
+        Args:
+        url (str): The Redis URL.
+        """
+        # Optional dependency, only needed for multi-process deployments
+        from redis.asyncio import Redis
+        self.__redis = Redis.from_url(url)
+        self.__script = self.__redis.register_script(self._SCRIPT)
+
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> bool:
+        """
+        Take tokens from a bucket.
+
+        Args:
+        key (str): The bucket key.
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens.
+        cost (float): Tokens to take, negative to give tokens back.
+
+        Returns:
+        bool: True if the bucket had enough tokens.
+        """
+        ttl = ceil(capacity / rate) + 1
+        allowed = await self.__script(keys=[f'rate_limit:{key}'], args=[rate, capacity, time(), cost, ttl])
+        return bool(allowed)
+
+    async def refund(self, key: str, rate: float, capacity: float, cost: float = 1.0):
+        """
+        Give back tokens taken by `consume`, e.g. when a later limit rejected the request.
+
+        Args:
+        key (str): The bucket key.
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens.
+        cost (float): Tokens to give back.
+        """
+        await self.consume(key, rate, capacity, cost=-cost)
+
+    async def close(self):
+        await self.__redis.aclose()
+
+
+def create_backend() -> MemoryBucketBackend | RedisBucketBackend:
+    """
+    Create the token bucket backend selected in the configuration.
+
+    Returns:
+    MemoryBucketBackend | RedisBucketBackend: The backend.
+    """
+    if cf.rate_limit['backend'] == 'redis':
+        backend = RedisBucketBackend(url=cf.rate_limit['redis_url'])
+    else:
+        backend = MemoryBucketBackend()
+    bot_logger.info(f'Using {type(backend).__name__} for rate limits')
+    return backend
+
+
+# Backend shared by the rate limiting middleware
+rate_limit_backend = create_backend()